@@ -145,12 +145,16 @@ FINALIZER_CHECKPOINT_SCRIPT = "/usr/share/distro_const/finalizer_checkpoint.py"
 # <build_area>/build_data/tmp, <build_area>/build_data/boot_archive,
 # <build_area>/media, and <build_area>/logs
 #
+# <build_area>/catalog_cache is kept across builds.  It remembers the
+# packages found in the repository catalogs.
+#
 BUILD_DATA = "/build_data"
 PKG_IMAGE = BUILD_DATA + "/pkg_image"
 TMP = BUILD_DATA + "/tmp"
 BOOT_ARCHIVE = BUILD_DATA + "/boot_archive"
 MEDIA = "/media"
 LOGS = "/logs"
+CATALOG_CACHE = "/catalog_cache"
 
 # boot archive definitions
 BA_NAME = "boot_archive"
@@ -36,6 +36,8 @@ import osol_install.distro_const.dc_utils as dcu
 import osol_install.transfer_mod as tm 
 from osol_install.install_utils import dir_size
 from osol_install.ManifestRead import ManifestRead
+from osol_install.transfer_publishers import PUB_ORIGIN, PUB_MIRROR, \
+    write_publisher_spec, read_publisher_results
 
 from osol_install.distro_const.dc_defs import DEFAULT_MAIN_URL, \
     DEFAULT_MAIN_AUTHNAME, DEFAULT_MIRROR_URL, \
@@ -45,7 +47,7 @@ from osol_install.distro_const.dc_defs import DEFAULT_MAIN_URL, \
     POST_INSTALL_ADD_AUTH_URL, POST_INSTALL_ADD_URL_TO_AUTHNAME, \
     POST_INSTALL_ADD_URL_TO_MIRROR_URL, STOP_ON_ERR, \
     ADD_AUTH_URL_TO_MIRROR_URL, IMAGE_INFO_FILE, \
-    IMAGE_INFO_IMAGE_SIZE_KEYWORD
+    IMAGE_INFO_IMAGE_SIZE_KEYWORD, TMP, CATALOG_CACHE
 
 from osol_install.transfer_defs import TM_ATTR_MECHANISM, \
     TM_PERFORM_IPS, TM_IPS_ACTION, TM_IPS_INIT, TM_IPS_PKG_URL, \
@@ -54,9 +56,10 @@ from osol_install.transfer_defs import TM_ATTR_MECHANISM, \
     TM_IPS_ALT_AUTH, TM_IPS_SET_AUTH, TM_IPS_ALT_URL, TM_IPS_PREF_FLAG, \
     TM_IPS_PREFERRED_AUTH, TM_IPS_MIRROR_FLAG, TM_IPS_REFRESH_CATALOG, \
     TM_IPS_PKGS, TM_IPS_GENERATE_SEARCH_INDEX, \
-    TM_IPS_UNSET_MIRROR, TM_IPS_PURGE_HIST, TM_IPS_SET_MIRROR, \
+    TM_IPS_UNSET_MIRROR, TM_IPS_PURGE_HIST, \
     TM_IPS_RETRIEVE, TM_IPS_UNINSTALL, TM_IPS_REPO_CONTENTS_VERIFY, \
-    TM_PYTHON_LOG_HANDLER
+    TM_IPS_SET_PUBLISHERS, TM_IPS_PUBLISHER_SPEC, TM_IPS_PUBLISHER_RESULTS, \
+    TM_IPS_CATALOG_CACHE, TM_E_IPS_REFRESH_FAILED, TM_PYTHON_LOG_HANDLER
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 def create_image_info(mntpt):
@@ -191,6 +194,59 @@ def ips_set_auth(alt_url, alt_auth, mntpt, mirr_cmd=None, pref_flag=None,
         tm_argslist.extend([(TM_IPS_REFRESH_CATALOG, "true")])
     return (tm.tm_perform_transfer(tm_argslist))
 
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def ips_set_publishers(settings, mntpt, tmp_dir, refresh_flag=None):
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    """Set the origins and mirrors of several publishers on the
+    specified mount point with a single TM_IPS_SET_PUBLISHERS call.
+
+    Input:
+            settings: list of (publisher, keyword, url) tuples, keyword
+                being PUB_ORIGIN or PUB_MIRROR.
+            mntpt: Mount point for the pkg image area.
+            tmp_dir: temporary directory to use
+            refresh_flag: indicate whether the catalogs should be
+                refreshed once all the publishers are set.
+    Returns:
+            List of (publisher, status) pairs, status being the
+            return code for that publisher.
+
+    """
+
+    spec_file = tmp_dir + "/publishers%s" % str(os.getpid())
+    results_file = spec_file + ".results"
+    try:
+        write_publisher_spec(spec_file, settings)
+    except IOError:
+        print("Unable to create " + spec_file, file=sys.stderr)
+        status = -1
+    else:
+        tm_argslist = [
+                      (TM_ATTR_MECHANISM, TM_PERFORM_IPS),
+                      (TM_IPS_ACTION, TM_IPS_SET_PUBLISHERS),
+                      (TM_IPS_PUBLISHER_SPEC, spec_file),
+                      (TM_IPS_PUBLISHER_RESULTS, results_file),
+                      (TM_IPS_INIT_MNTPT, mntpt),
+                      (TM_PYTHON_LOG_HANDLER, DC_LOG)]
+        if refresh_flag:
+            tm_argslist.extend([(TM_IPS_REFRESH_CATALOG, "true")])
+        status = tm.tm_perform_transfer(tm_argslist)
+
+    try:
+        results = read_publisher_results(results_file)
+    except IOError:
+        # No publisher was set, they all share the status of the call.
+        results = []
+        for pub, keyword, url in settings:
+            if (pub, status) not in results:
+                results.append((pub, status))
+    for name in (spec_file, results_file):
+        try:
+            os.unlink(name)
+        except OSError:
+            pass
+    return results
+
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 def ips_validate_auth(url, auth, mntpt, mirr_cmd=None, pref_flag=None):
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
@@ -222,7 +278,7 @@ def ips_validate_auth(url, auth, mntpt, mirr_cmd=None, pref_flag=None):
                                 pref_flag=False, refresh_flag=True))
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-def ips_contents_verify(file_name, mntpt):
+def ips_contents_verify(file_name, mntpt, cache_dir=None):
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
     """Verifies that the packages listed in the designated file are in
     the IPS repository associated with the pkg image area.
@@ -230,17 +286,22 @@ def ips_contents_verify(file_name, mntpt):
     Inputs:
             file_name: file containing the list of pkgs to verify
             mntpt: Mount point for the pkg image area.
+            cache_dir: directory of the catalog cache, which remembers
+                the packages found by earlier builds.
 
     Returns:
             Return code from the tm_perform_transfer call.
 
     """
 
-    return tm.tm_perform_transfer([(TM_ATTR_MECHANISM, TM_PERFORM_IPS),
+    tm_argslist = [(TM_ATTR_MECHANISM, TM_PERFORM_IPS),
         (TM_IPS_ACTION, TM_IPS_REPO_CONTENTS_VERIFY),
         (TM_IPS_PKGS, file_name),
         (TM_IPS_INIT_MNTPT, mntpt),
-        (TM_PYTHON_LOG_HANDLER, DC_LOG)])
+        (TM_PYTHON_LOG_HANDLER, DC_LOG)]
+    if cache_dir is not None:
+        tm_argslist.append((TM_IPS_CATALOG_CACHE, cache_dir))
+    return tm.tm_perform_transfer(tm_argslist)
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 def ips_pkg_op(file_name, mntpt, ips_pkg_op, generate_ips_index):
@@ -420,39 +481,54 @@ if __name__ == "__main__":
     # Keep a list of authorities to cleanup at the end.
     UNSET_AUTH_LIST.append(PKG_AUTH)
 
-    # If the user specified any mirrors for the default publisher,
-    # set them in the IPS image using the pkg set-publisher -m command.
+    # Collect the mirrors of the default publisher, and the alternate
+    # publishers (authorities) with their mirrors.  They are all set
+    # in one call, which refreshes the catalogs once at the end to
+    # make sure they are valid.
+    PUB_SETTINGS = []
+    PUB_MIRRORS = {PKG_AUTH: []}
+
     MIRROR_URL_LIST = dcu.get_manifest_list(MANIFEST_SERVER_OBJ,
                                             DEFAULT_MIRROR_URL)
     for mirror_url in MIRROR_URL_LIST:
         print("\tMirror repository: " + mirror_url, file=sys.stderr)
-        STATUS = ips_set_auth(mirror_url, PKG_AUTH, PKG_IMG_MNT_PT,
-                              mirr_cmd=TM_IPS_SET_MIRROR, refresh_flag=True)
-        if STATUS != TM_E_SUCCESS:
-            print("Unable to set the IPS image mirror", file=sys.stderr)
-            if QUIT_ON_PKG_FAILURE == 'true':
-                raise Exception(sys.argv[0] +
-                                  ": Unable to set the IPS image mirror")
+        PUB_SETTINGS.append((PKG_AUTH, PUB_MIRROR, mirror_url))
+        PUB_MIRRORS[PKG_AUTH].append(mirror_url)
 
-        # Keep a list of mirrors to cleanup at the end.
-        UNSET_MIRROR_LIST.append((mirror_url, PKG_AUTH))
-
-    # If an alternate publisher (authorities) is specified, set
-    # the publisher and refresh to make sure it's valid.
     ADD_REPO_URL_LIST = dcu.get_manifest_list(MANIFEST_SERVER_OBJ,
                                               ADD_AUTH_MAIN_URL)
     for alt_url in ADD_REPO_URL_LIST:
-        # There can be multiple alternate authorities
-        # Do a set-publisher for each one.
         alt_auth = dcu.get_manifest_value(MANIFEST_SERVER_OBJ,
                                           ADD_AUTH_URL_TO_AUTHNAME % alt_url)
         if alt_auth is None:
             continue
         print("Setting alternate publisher: " + alt_auth, file=sys.stderr)
         print("\tOrigin repository: " + alt_url, file=sys.stderr)
-        STATUS = ips_set_auth(alt_url, alt_auth, PKG_IMG_MNT_PT,
-                              refresh_flag=False)
-        if STATUS != TM_E_SUCCESS:
+        PUB_SETTINGS.append((alt_auth, PUB_ORIGIN, alt_url))
+        PUB_MIRRORS.setdefault(alt_auth, [])
+
+        mirror_url_list = dcu.get_manifest_list(
+            MANIFEST_SERVER_OBJ,
+            ADD_AUTH_URL_TO_MIRROR_URL % alt_url)
+        for alt_url_mirror in mirror_url_list:
+            print("\tMirror repository: " + alt_url_mirror, file=sys.stderr)
+            PUB_SETTINGS.append((alt_auth, PUB_MIRROR, alt_url_mirror))
+            PUB_MIRRORS[alt_auth].append(alt_url_mirror)
+
+    if PUB_SETTINGS:
+        PUB_RESULTS = ips_set_publishers(PUB_SETTINGS, PKG_IMG_MNT_PT,
+                                         TMP_DIR, refresh_flag=True)
+    else:
+        PUB_RESULTS = []
+
+    for pub, STATUS in PUB_RESULTS:
+        if pub == PKG_AUTH:
+            if STATUS != TM_E_SUCCESS:
+                print("Unable to set the IPS image mirror", file=sys.stderr)
+                if QUIT_ON_PKG_FAILURE == 'true':
+                    raise Exception(sys.argv[0] +
+                                      ": Unable to set the IPS image mirror")
+        elif STATUS not in (TM_E_SUCCESS, TM_E_IPS_REFRESH_FAILED):
             print("Unable to set alternate publisher " + \
                                  "for IPS image", file=sys.stderr)
             if QUIT_ON_PKG_FAILURE == 'true':
@@ -463,32 +539,23 @@ if __name__ == "__main__":
                 # If the set-auth fails, sometimes
                 # the publisher still is listed
                 # and we need to unset it.
-                ips_unset_auth(alt_auth, PKG_IMG_MNT_PT)
+                ips_unset_auth(pub, PKG_IMG_MNT_PT)
                 continue
-
-        # Add onto the list of authorities to cleanup at the end
-        UNSET_AUTH_LIST.append(alt_auth)
-
-        # Now set the mirrors if any are specified.
-        mirror_url_list = dcu.get_manifest_list(
-            MANIFEST_SERVER_OBJ,
-            ADD_AUTH_URL_TO_MIRROR_URL % alt_url)
-        for alt_url_mirror in mirror_url_list:
-            print("\tMirror repository: " + alt_url_mirror, file=sys.stderr)
-            STATUS = ips_set_auth(alt_url_mirror,
-                                  alt_auth,
-                                  PKG_IMG_MNT_PT,
-                                  mirr_cmd=TM_IPS_SET_MIRROR,
-                                  refresh_flag=True)
+        else:
             if STATUS != TM_E_SUCCESS:
-                print("Unable to set alternate publisher " + \
-                                     "mirror for IPS image", file=sys.stderr)
+                print("Unable to refresh alternate publisher " + \
+                                     pub + " for IPS image", file=sys.stderr)
                 if QUIT_ON_PKG_FAILURE == 'true':
                     raise Exception(sys.argv[0] +
-                                      ": Unable to set the alternate " +
-                                      "publisher mirror for IPS image")
+                                      ": Unable to refresh the alternate " +
+                                      "publisher for IPS image")
 
-            UNSET_MIRROR_LIST.append((alt_url_mirror, alt_auth))
+            # Add onto the list of authorities to cleanup at the end
+            UNSET_AUTH_LIST.append(pub)
+
+        # Keep a list of mirrors to cleanup at the end.
+        for mirror_url in PUB_MIRRORS[pub]:
+            UNSET_MIRROR_LIST.append((mirror_url, pub))
 
     # Read the package list from the manifest and verify
     # the packages are in the repository(s)
@@ -507,7 +574,13 @@ if __name__ == "__main__":
     PKGFILE.close()
 
     print("Verifying the contents of the IPS repository", file=sys.stderr)
-    STATUS = ips_contents_verify(PKG_FILE_NAME, PKG_IMG_MNT_PT)
+    # The catalog cache lives in the build area, next to build_data
+    # which is emptied by every build.
+    if TMP_DIR.endswith(TMP):
+        CACHE_DIR = TMP_DIR[:-len(TMP)] + CATALOG_CACHE
+    else:
+        CACHE_DIR = None
+    STATUS = ips_contents_verify(PKG_FILE_NAME, PKG_IMG_MNT_PT, CACHE_DIR)
     if STATUS and QUIT_ON_PKG_FAILURE == 'true':
         os.unlink(PKG_FILE_NAME)
         raise Exception(sys.argv[0] + ": Unable to verify the " +
@@ -616,22 +689,15 @@ if __name__ == "__main__":
         raise Exception(sys.argv[0] + ": Unable to cleanup installation " +
                           "mirrors")
 
-    # If there are any default mirrors specified, set them.
+    # Set any default mirrors, and any additional repositories with
+    # their mirrors, in one call.  The catalogs aren't refreshed.
+    FUTURE_SETTINGS = []
     FUTURE_MIRROR_URL_LIST = dcu.get_manifest_list(MANIFEST_SERVER_OBJ,
         POST_INSTALL_DEFAULT_MIRROR_URL)
     for future_url in FUTURE_MIRROR_URL_LIST:
         print("\tMirror repository: " + future_url, file=sys.stderr)
+        FUTURE_SETTINGS.append((FUTURE_AUTH, PUB_MIRROR, future_url))
 
-        STATUS = ips_set_auth(future_url, FUTURE_AUTH, PKG_IMG_MNT_PT,
-                              mirr_cmd=TM_IPS_SET_MIRROR)
-        if STATUS != TM_E_SUCCESS:
-            print("Unable to set the future IPS image mirror", file=sys.stderr)
-            if QUIT_ON_PKG_FAILURE == 'true':
-                dcu.cleanup_dir(VALIDATE_MNTPT)
-                raise Exception(sys.argv[0] + ": Unable to set the " +
-                                  "future IPS image mirror")
-
-    # If there are any additional repositories and mirrors, set them.
     FUTURE_ADD_REPO_URL_LIST = dcu.get_manifest_list(MANIFEST_SERVER_OBJ,
         POST_INSTALL_ADD_AUTH_URL)
     for future_alt_url in FUTURE_ADD_REPO_URL_LIST:
@@ -642,42 +708,43 @@ if __name__ == "__main__":
         print("Setting post-install alternate publisher: " + \
                              future_alt_auth, file=sys.stderr)
         print("\tOrigin repository: " + future_alt_url, file=sys.stderr)
- 
-        STATUS = ips_set_auth(future_alt_url, future_alt_auth, PKG_IMG_MNT_PT)
-        if STATUS != TM_E_SUCCESS:
-            if QUIT_ON_PKG_FAILURE == 'true':
-                print("Unable to set future alternate " + \
-                                     "publisher for IPS image", file=sys.stderr)
-                dcu.cleanup_dir(VALIDATE_MNTPT)
-                raise Exception(sys.argv[0] + ": Unable to set future " +
-                                  "alternate publisher for IPS image")
-            else:
-                # If the set-auth fails, sometimes
-                # the publisher still is listed
-                # and we need to unset it.
-                ips_unset_auth(future_alt_auth, PKG_IMG_MNT_PT)
-                continue
+        FUTURE_SETTINGS.append((future_alt_auth, PUB_ORIGIN, future_alt_url))
 
-        # Now set the mirrors if any are specified.
         future_add_mirror_url_list = dcu.get_manifest_list(
             MANIFEST_SERVER_OBJ,
             POST_INSTALL_ADD_URL_TO_MIRROR_URL % future_alt_url)
         for future_add_mirror_url in future_add_mirror_url_list:
             print("\tMirror repository: " + \
                                  future_add_mirror_url, file=sys.stderr)
+            FUTURE_SETTINGS.append((future_alt_auth, PUB_MIRROR,
+                                    future_add_mirror_url))
 
-            STATUS = ips_set_auth(future_add_mirror_url,
-                                  future_alt_auth,
-                                  PKG_IMG_MNT_PT,
-                                  mirr_cmd=TM_IPS_SET_MIRROR)
-            if STATUS != TM_E_SUCCESS:
-                print("Unable to set future alternate " + \
-                                     "publisher mirror for IPS image", file=sys.stderr)
-                if QUIT_ON_PKG_FAILURE == 'true':
-                    dcu.cleanup_dir(VALIDATE_MNTPT)
-                    raise Exception(sys.argv[0] + ": Unable to set future " +
-                                      "alternate publisher mirror for IPS " +
-                                      "image")
+    if FUTURE_SETTINGS:
+        FUTURE_RESULTS = ips_set_publishers(FUTURE_SETTINGS, PKG_IMG_MNT_PT,
+                                            TMP_DIR)
+    else:
+        FUTURE_RESULTS = []
+
+    for pub, STATUS in FUTURE_RESULTS:
+        if STATUS == TM_E_SUCCESS:
+            continue
+        if pub == FUTURE_AUTH:
+            print("Unable to set the future IPS image mirror", file=sys.stderr)
+            if QUIT_ON_PKG_FAILURE == 'true':
+                dcu.cleanup_dir(VALIDATE_MNTPT)
+                raise Exception(sys.argv[0] + ": Unable to set the " +
+                                  "future IPS image mirror")
+        elif QUIT_ON_PKG_FAILURE == 'true':
+            print("Unable to set future alternate " + \
+                                 "publisher for IPS image", file=sys.stderr)
+            dcu.cleanup_dir(VALIDATE_MNTPT)
+            raise Exception(sys.argv[0] + ": Unable to set future " +
+                              "alternate publisher for IPS image")
+        else:
+            # If the set-auth fails, sometimes
+            # the publisher still is listed
+            # and we need to unset it.
+            ips_unset_auth(pub, PKG_IMG_MNT_PT)
     dcu.cleanup_dir(VALIDATE_MNTPT)
 
     # purge the package history in the IPS image.
@@ -29,6 +29,8 @@ ENParser.py - Enhanced Nodepath Parser module
 # =============================================================================
 # =============================================================================
 
+import functools
+import re
 import sys
 
 # =============================================================================
@@ -361,6 +363,13 @@ __STATE_TABLE[__ST_EXSL].special_non_err_dict['/'] = __ST_EXSL
 __STATE_TABLE[__ST_EXSL].normal_char_next_state = __ST_N0
 
 
+# Runs of characters which aren't special.  Outside of quotes, such a run
+# goes into the same name, valpath or value string in one step.
+__NORMAL_RUN = re.compile("[^" + re.escape(__SPECIAL_CHARS) + "]+")
+
+# Maximum number of nodepaths compile_nodepath() keeps parsed.
+NODEPATH_CACHE_SIZE = 512
+
 # Error messages
 __MSG_BKT_MISMATCH = "Mismatching brackets in path token"
 __MSG_BKT_ORDER = "] before [ in path token"
@@ -432,6 +441,174 @@ def parse_nodepath(nodepath):
 
 	See module header for parsing syntax.
 
+	Runs the state machine above, but a character at a time only for
+	the special characters.  A run of other characters, and everything
+	up to the closing quote of a quoted value, is taken in one step.
+	The results, errors included, are those of the character by
+	character __parse_nodepath_bychar().
+
+	Args:
+	  nodepath: nodepath to parse
+
+	Returns:
+	  A list of parsed tokens as ENTokens
+
+	Raises:
+	  ParserError: Mismatching brackets in path token
+	  ParserError: ] before [ in path token
+	  ParserError: Path cannot start with a /
+	  ParserError: Quote mistmatch in path token
+	  ParserError: Error parsing path token
+
+	"""
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    parsed_tokens = []
+
+    curr_state = __ST_START
+    new_state = __ST_ERR
+    curr_char_idx = 0
+
+    # The quote character of the quoted value being read, if any.
+    quote = None
+    bracket_active = False
+
+    name = ""
+    values = []
+    valpaths = []
+    token_in_progress = False
+
+    error_msg = None
+
+    nodepath = nodepath.strip()
+    nodepath_len = len(nodepath)
+
+    # Special case: empty string
+    if (nodepath_len == 0):
+        return parsed_tokens
+
+    while (curr_char_idx < nodepath_len):
+        curr_char = nodepath[curr_char_idx]
+
+        # Inside quotes, all characters up to the closing quote go into
+        # the value.
+        if ((quote is not None) and (curr_char != quote)):
+            next_idx = nodepath.find(quote, curr_char_idx)
+            if (next_idx < 0):
+                next_idx = nodepath_len
+            values[-1] += nodepath[curr_char_idx:next_idx]
+            curr_state = new_state = __ST_V
+            curr_char_idx = next_idx
+            continue
+
+        # Run of non-special characters.  The first one decides the
+        # state; the states it can lead to, other than the error
+        # state, keep the rest of the run.
+        if (curr_char not in __SPECIAL_CHARS):
+            run = __NORMAL_RUN.match(nodepath, curr_char_idx).group()
+            new_state = __STATE_TABLE[curr_state].normal_char_next_state
+
+            if (new_state == __ST_N0):
+                name = run
+                values = []
+                valpaths = []
+                token_in_progress = True
+                if (len(run) > 1):
+                    new_state = __ST_N
+            elif (new_state == __ST_N):
+                name += run
+            elif (new_state == __ST_P):
+                valpaths[-1] += run
+            elif (new_state == __ST_V):
+                values[-1] += run
+            else:
+                print("Error parsing nodepath", file=sys.stderr)
+                print(("At index %d, remaining string:%s" % (
+                    curr_char_idx, nodepath[curr_char_idx:])), file=sys.stderr)
+                new_state = __ST_ERR
+                break
+
+            curr_state = new_state
+            curr_char_idx += len(run)
+            continue
+
+        # Special character.
+        new_state = __STATE_TABLE[curr_state].special_non_err_dict.get(
+            curr_char, __ST_ERR)
+
+        if (new_state == __ST_P0):
+            bracket_active = True
+            valpaths.append("")
+
+        # Only "/" can be part of a valpath.
+        elif (new_state == __ST_P):
+            valpaths[-1] += curr_char
+
+        elif (new_state == __ST_V0):
+            values.append("")
+
+        elif (new_state == __ST_DQON) or (new_state == __ST_SQON):
+            quote = curr_char
+
+        elif (new_state == __ST_DQOFF) or (new_state == __ST_SQOFF):
+            quote = None
+
+        elif (new_state == __ST_CBKT):
+            if (bracket_active):
+                bracket_active = False
+            else:
+                error_msg = __MSG_BKT_ORDER
+                new_state = __ST_ERR
+
+        elif (new_state == __ST_TCMPL):
+            parsed_tokens.append(ENToken(name, valpaths, values))
+            token_in_progress = False
+
+        elif (new_state == __ST_ERR):
+            print("Error parsing nodepath", file=sys.stderr)
+            print(("At index %d, remaining string:%s" % (
+                curr_char_idx, nodepath[curr_char_idx:])), file=sys.stderr)
+
+        elif (new_state  == __ST_STSL):
+            error_msg = __MSG_STARTING_SLASH
+            new_state = __ST_ERR
+
+        # Nothing to do for __ST_EXSL: extra slashes are eaten.
+
+        if (new_state == __ST_ERR):
+            break
+
+        curr_state = new_state
+        curr_char_idx += 1
+
+    # Handle errors.
+    if (new_state == __ST_ERR):
+        if (error_msg is None):
+            error_msg = __MSG_PARSER_ERROR
+        raise ParserError(error_msg)
+
+    if (quote is not None):
+        raise ParserError(__MSG_QUOTE_MISMATCH)
+
+    if (bracket_active):
+        raise ParserError(__MSG_BKT_MISMATCH)
+
+    if (token_in_progress):
+        parsed_tokens.append(ENToken(name, valpaths, values))
+
+    return parsed_tokens
+
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def __parse_nodepath_bychar(nodepath):
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    """Parse a token as returned from parse_path_into_tokens(), one
+	character at a time.
+
+	The reference implementation of parse_nodepath(), which must
+	give the same results.  Used only to test it.
+
+	See module header for parsing syntax.
+
 	Args:
 	  nodepath: nodepath to parse
 
@@ -595,3 +772,44 @@ def parse_nodepath(nodepath):
 
     # Done!
     return parsed_tokens
+
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+@functools.lru_cache(maxsize=NODEPATH_CACHE_SIZE)
+def compile_nodepath(nodepath):
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    """Parse a nodepath as parse_nodepath() does, remembering the result.
+
+	The most recently used NODEPATH_CACHE_SIZE nodepaths are kept,
+	keyed by the nodepath string.  As the same result is handed to
+	every caller, it is immutable: a tuple of ENTokens whose valpaths
+	and values are tuples too.  Callers must not change the tokens.
+
+	Args:
+	  nodepath: nodepath to parse
+
+	Returns:
+	  A tuple of parsed tokens as ENTokens
+
+	Raises:
+	  ParserError: see parse_nodepath().  Errors are not cached.
+
+	"""
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    return tuple([ENToken(token.name, tuple(token.valpaths),
+                          tuple(token.values))
+                  for token in parse_nodepath(nodepath)])
+
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def nodepath_cache_info():
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    """Return the counters of the compile_nodepath() cache.
+
+	Returns:
+	  A named tuple of the hits, misses, maxsize and currsize of the
+	  cache.
+
+	"""
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    return compile_nodepath.cache_info()
@@ -23,7 +23,7 @@
 # =============================================================================
 # =============================================================================
 """
-TreeAcc.py - XML DOM tree access and manipulation module
+TreeAcc.py - XML tree access and manipulation module
 """
 # =============================================================================
 # =============================================================================
@@ -31,12 +31,13 @@ TreeAcc.py - XML DOM tree access and manipulation module
 import errno
 
 from xml.dom import Node
-from xml.dom import minidom
 from xml.dom import DOMException
 from xml.parsers.expat import ExpatError
 from osol_install.ENParser import ENToken
-from osol_install.ENParser import parse_nodepath
+from osol_install.ENParser import compile_nodepath
 from osol_install.ENParser import ParserError
+from osol_install.TreeAccBackend import BACKENDS
+from osol_install.TreeAccBackend import DEFAULT_BACKEND
 
 # =============================================================================
 # Error handling.
@@ -82,14 +83,22 @@ class TreeAccNode:
 
     Methods of the TreeAcc class give and take TreeAccNode objects as
     arguments.  TreeAccNode objects provide easy access to elements in a
-    DOM tree as well as those elements' attributes.  They also provide their
+    XML tree as well as those elements' attributes.  They also provide their
     node's path from the root.
 
     Currently only elements and attributes are supported.
 
+    A TreeAcc hands out a single TreeAccNode per element, and per
+    attribute of an element, for as long as the tree lives.  The value,
+    attributes and path of such a node are read from the tree when first
+    asked for, and read again after the tree changes them.
+
     """
 # =============================================================================
 
+    __slots__ = ("__name", "__type", "__value", "__attr_dict",
+                 "__element_node", "__tree", "__path")
+
     # Classbound constants
 
     # Specify this node represents an attribute or an element.
@@ -117,9 +126,10 @@ class TreeAccNode:
                 is no value.
 
           attr_dict: For elements, dictionary of attribute name-value
-                pairs.  Ignored for ATTRIBUTEs.
+                pairs.  If None, the attributes are read from the tree
+                when first asked for.  Ignored for ATTRIBUTEs.
 
-          element_node: The corresponding DOM tree element node
+          element_node: The corresponding element of the tree backend
                 represented.  For ELEMENTs, "element_node" corresponds
                 directly to the path piece represented by the "name"
                 arg.  For ATTRIBUTEs, "element_node" corresponds to the
@@ -155,13 +165,13 @@ class TreeAccNode:
             self.__value = ""
         else:
             self.__value = value
-        self.__attr_dict = attr_dict
-        self.__element_node = element_node
-        self.__tree = tree
         if (node_type == TreeAccNode.ATTRIBUTE):
-            self.__path = self.__path_to_parent(name)
+            self.__attr_dict = None
         else:
-            self.__path = self.__path_to_parent()
+            self.__attr_dict = attr_dict
+        self.__element_node = element_node
+        self.__tree = tree
+        self.__path = None
 
 
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
@@ -181,10 +191,14 @@ class TreeAccNode:
 
         """
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+        # Nodes handed out by a tree are unique per element and
+        # attribute.
+        if (self is other):
+            return True
         try:
-            # Unique nodes will have unique DOM node and type
+            # Unique nodes will have unique element and type
             # combinations.
-            rval = ((self.__element_node == other.get_element_node()) and
+            rval = ((self.__element_node is other.get_element_node()) and
                     (self.is_element() == other.is_element()))
         except AttributeError:
             rval = False
@@ -211,6 +225,14 @@ class TreeAccNode:
         return (not self.__eq__(other))
 
 
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def __hash__(self):
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+        """ Hash consistent with ==, so that nodes can go in sets. """
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+        return hash((id(self.__element_node), self.is_element()))
+
+
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
     # Accessor methods
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
@@ -220,14 +242,23 @@ class TreeAccNode:
 
     def get_path(self):
         """ Return the path from the root to this node. """
+        if (self.__path is None):
+            if (self.__type == TreeAccNode.ATTRIBUTE):
+                self.__path = self.__path_to_parent(self.__name)
+            else:
+                self.__path = self.__path_to_parent()
         return self.__path
 
     def get_value(self):
         """ Return the string value of this node. """
+        if (self.__value is None):
+            self.__value = self.__read_value()
         return self.__value
 
     def get_attr_dict(self):
         """ Return the attributes as name-value pairs. """
+        if (self.__attr_dict is None):
+            self.__attr_dict = self.__read_attr_dict()
         return self.__attr_dict
 
     def get_tree(self):
@@ -235,7 +266,7 @@ class TreeAccNode:
         return self.__tree
 
     def get_element_node(self):
-        """ Return the corresponding DOM element of this node. """
+        """ Return the corresponding backend element of this node. """
         return self.__element_node
 
     def is_leaf(self):
@@ -252,7 +283,7 @@ class TreeAccNode:
 
         if (self.is_attr()):
             return True
-        return (self.__element_node.getElementsByTagName("*").length == 0)
+        return (not self.__tree.backend.has_children(self.__element_node))
 
     def is_attr(self):
         """ Return True or False that this node represents an ATTRIBUTE. """
@@ -263,6 +294,103 @@ class TreeAccNode:
         return (self.__type == TreeAccNode.ELEMENT)
 
 
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def _clear_cache(self):
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+        """ Forget the value and attributes of this node.  They are read
+        from the tree again when next asked for.  Used by TreeAcc when
+        the tree changes them.
+
+        Args: None
+
+        Returns: N/A
+
+        Raises: None
+
+        """
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+        self.__value = None
+        self.__attr_dict = None
+
+
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def __read_value(self):
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+        """ Private method.  Read the value of this node from the tree.
+
+        The value of an element is the text directly inside the element.
+        (Text broken up by child elements is more for HTML where, say
+        bolded parts of a string are in their own elements.  Not
+        applicable here.)
+
+        Args: None
+
+        Returns:
+          The string value of the element or attribute.  "" if there is
+                no value.
+
+        Raises: None
+
+        """
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+        backend = self.__tree.backend
+        if (self.__type == TreeAccNode.ATTRIBUTE):
+            value = backend.get_attribute(self.__element_node, self.__name)
+            if (value is None):
+                return ""
+            return value
+
+        value = backend.text(self.__element_node).strip()
+
+        # Strip off any enveloping double or single quotes.  Such
+        # quotes may surround element values in the manifest in order
+        # to treat space characters as normal characters.  It is
+        # undesirable for the enveloping quotes to be treated as part
+        # of the string, for example, during comparisons.
+        #
+        # Note: this quote stripping isn't needed for strings stored as
+        # attribute node values as such values already have their
+        # enveloping single- or double quotes stripped off.
+        #
+        if ((len(value) > 2) and (value[0] == value[-1]) and
+            ((value[0] == "\"") or (value[0] == "'"))):
+	
+            # Remove middle escaped quote chars for comparison.
+            non_esc = value.replace(("\\" + value[0]), "")
+
+            # if have more than the two quotes on the ends, keep all
+            # as this is a list and quotes are needed..
+            if (non_esc.count(non_esc[0]) == 2):
+                return value[1:-1]
+
+        return value
+
+
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def __read_attr_dict(self):
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+        """ Private method.  Read the attributes of this node from the
+        tree.  An ATTRIBUTE has only itself.
+
+        Args: None
+
+        Returns:
+          dictionary of attributes.  Can be empty.
+
+        Raises: None
+
+        """
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+        attr_dict = {}
+        if (self.__type == TreeAccNode.ATTRIBUTE):
+            attr_dict[self.__name] = self.get_value()
+        else:
+            for name, value in self.__tree.backend.attributes(
+                self.__element_node):
+                attr_dict[name] = value.strip()
+        return attr_dict
+
+
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
     def __path_to_parent(self, attr_string=None):
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
@@ -283,16 +411,18 @@ class TreeAccNode:
         """
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
         path = ""
+        backend = self.__tree.backend
         curr_node = self.__element_node
 
-        while ((curr_node is not None) and
-               (curr_node.nodeType != Node.DOCUMENT_NODE) and
-               (curr_node.parentNode.nodeType != Node.DOCUMENT_NODE)):
+        # The root element is left out.
+        parent = backend.parent(curr_node)
+        while (parent is not None):
             if (path != ""):
-                path = curr_node.nodeName + "/" + path
+                path = backend.name(curr_node) + "/" + path
             else:
-                path = curr_node.nodeName
-            curr_node = curr_node.parentNode
+                path = backend.name(curr_node)
+            curr_node = parent
+            parent = backend.parent(curr_node)
 
         # Attribute name goes last in string if applicable.
         if (attr_string is not None):
@@ -325,10 +455,10 @@ class TreeAccNode:
             is_leaf = 'T'
         ret_string = ("Name:%s, element:%c, attr:%c, leaf:%c" %
                       (self.__name, is_element, is_attr, is_leaf))
-        ret_string += "\n    Value:" + self.__value
-        ret_string += "\n    Path:" + self.__path
+        ret_string += "\n    Value:" + self.get_value()
+        ret_string += "\n    Path:" + self.get_path()
         ret_string += "\n    Attributes:"
-        for key, value in self.__attr_dict.items():
+        for key, value in self.get_attr_dict().items():
             ret_string += "\n        " + key + ": " + value
         return ret_string
 
@@ -352,7 +482,7 @@ class TreeAcc:
 # =============================================================================
     """ Tree Access class.
 
-    An abstraction layer representing a DOM tree.  Tree traversals are done
+    An abstraction layer representing an XML tree.  Tree traversals are done
     with paths.  Similar to Unix pathnames, branches are separated by "/".
     Each branch represents an element by name or an attribute by name (last
     branch only). Parent nodes can be represented by ".."
@@ -370,8 +500,8 @@ class TreeAcc:
     middle, add new elements and attributes, replace values of existing
     elements and attributes, and saving the tree in an XML document.
 
-    The underlying DOM tree is created when an instance of this class is
-    instantiated.
+    The underlying tree is created when an instance of this class is
+    instantiated, in one of the backends of TreeAccBackend.
 
     """
 # =============================================================================
@@ -388,142 +518,169 @@ class TreeAcc:
 
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
     @staticmethod
-    def __create_attr_dict(element_node):
+    def __pathlist_has_dots(path_tokens):
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-        """Create attributes dictionary from a DOM element node
+        """ Private method.  Checks the name of each path piece, and returns
+            True if at least one is ".."
 
         Args:
-          element_node: DOM node to return attributes of.
+          path_tokens: list of ENTokens to check
 
         Returns:
-          dictionary of attributes.  Can be empty.
+          True: at least one piece is named ".."
+          False: otherwise
 
         Raises: None
 
         """
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-        attr_dict = {}
-        attr_map = element_node.attributes
-        for i in range(attr_map.length):
-            attr_node = attr_map.item(i)
-            attr_dict[attr_node.nodeName] = attr_node.nodeValue.strip()
-        return attr_dict
+        for ptoken in path_tokens:
+            if (ptoken.name == ".."):
+                return True
+        return False
 
 
+    # Instance methods
+	
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-    @staticmethod
-    def __get_element_value(element_node):
+    def __init__(self, xml_file, backend=None):
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-        """ Private method.  Return the value associated with a given element.
-
-        Operates on a DOM element node to traverse its children looking for
-        a text node containing its value.  Assume there is only one child
-        text node.  (Multiple text nodes are more for HTML where, say bolded
-        parts of a string are in their own text nodes.  Not applicable here.)
+        """ Constructor.  Given an xml file, creates the tree and
+        its TreeAcc representation.
 
         Args:
-          element_node: The node to get the associated value.
+          xml_file: XML file name.  No default.
 
-        Returns:
-          The string value of the element.  Returns None if there is no value.
+          backend: Name of the tree backend to keep the tree in, one of
+            TreeAccBackend.BACKENDS.  Defaults to
+            TreeAccBackend.DEFAULT_BACKEND.
 
-        Raises: None
+        Raises:
+          InvalidArgError: Unknown backend
+          TreeAccError: Error opening xml file
+          TreeAccError: Error parsing xml file
 
         """
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-        value = ""
-        for child in element_node.childNodes:
-            if (child.nodeType == Node.TEXT_NODE):
-                value = value + child.nodeValue
+        if (backend is None):
+            backend = DEFAULT_BACKEND
+        if (backend not in BACKENDS):
+            raise InvalidArgError("TreeAcc init: unknown backend %s" %
+                                  backend)
 
-        value = value.strip()
+        # Read file into memory.
+        try:
+            self.backend = BACKENDS[backend](xml_file.strip())
+        except IOError as err:
+            raise TreeAccError("Error opening xml file %s: %s" %
+                                (xml_file.strip(), errno.errorcode[err.errno]))
+        except (DOMException, ExpatError) as err:
+            raise TreeAccError("Error parsing xml file %s" %
+                                 (xml_file.strip()))
 
-        # Strip off any enveloping double or single quotes.  Such
-        # quotes may surround element values in the manifest in order
-        # to treat space characters as normal characters.  It is
-        # undesirable for the enveloping quotes to be treated as part
-        # of the string, for example, during comparisons.
-        #
-        # Note: this quote stripping isn't needed for strings stored as
-        # attribute node values as such values already have their
-        # enveloping single- or double quotes stripped off.
-        #
-        if ((len(value) > 2) and (value[0] == value[-1]) and
-            ((value[0] == "\"") or (value[0] == "'"))):
-	
-            # Remove middle escaped quote chars for comparison.
-            non_esc = value.replace(("\\" + value[0]), "")
+        # Save the document and its root element.
+        self.treedoc = self.backend.document
+        self.treeroot = self.backend.root
 
-            # if have more than the two quotes on the ends, keep all
-            # as this is a list and quotes are needed..
-            if (non_esc.count(non_esc[0]) == 2):
-                return value[1:-1]
+        # The TreeAccNodes handed out, one per element and one per
+        # attribute of an element.  See __element_ta_node() and
+        # __attr_ta_node().
+        self.__element_ta_nodes = {}
+        self.__attr_ta_nodes = {}
 
-        return value
+        # Create a TreeAccNode representation of the root element.
+        # It will be used as a default for find_node() and other methods
+        self.treeroot_ta_node = self.__element_ta_node(self.treeroot)
+
+        # Index of the elements by path, a tuple of element
+        # names starting with the root's.  Each entry lists the elements
+        # with that path in document order.  Entries are filled in as
+        # searches from the root need them; see __index_entry().
+        self.__path_index = {}
 
 
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-    @staticmethod
-    def __pathlist_has_dots(path_tokens):
+    def __element_ta_node(self, element_node):
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-        """ Private method.  Checks the name of each path piece, and returns
-            True if at least one is ".."
+        """ Private method.  Return the TreeAccNode of an element,
+        creating it the first time.  Its value and attributes are read
+        when first asked for.
 
         Args:
-          path_tokens: list of ENTokens to check
+          element_node: backend element.
 
         Returns:
-          True: at least one piece is named ".."
-          False: otherwise
+          The TreeAccNode of the element.
 
         Raises: None
 
         """
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-        for ptoken in path_tokens:
-            if (ptoken.name == ".."):
-                return True
-        return False
+        ta_node = self.__element_ta_nodes.get(element_node)
+        if (ta_node is None):
+            ta_node = TreeAccNode(self.backend.name(element_node),
+                                  TreeAccNode.ELEMENT, None, None,
+                                  element_node, self)
+            ta_node._clear_cache()
+            self.__element_ta_nodes[element_node] = ta_node
+        return ta_node
 
 
-    # Instance methods
-	
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-    def __init__(self, xml_file):
+    def __attr_ta_node(self, element_node, name):
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-        """ Constructor.  Given an xml file, creates the DOM tree and
-        its TreeAcc representation.
+        """ Private method.  Return the TreeAccNode of an attribute of an
+        element, creating it the first time.  Its value is read when
+        first asked for.
 
         Args:
-          xml_file: XML file name.  No default.
+          element_node: backend element carrying the attribute.
 
-        Raises:
-          TreeAccError: Error opening xml file
-          TreeAccError: Error parsing xml file
+          name: name of the attribute.
+
+        Returns:
+          The TreeAccNode of the attribute.
+
+        Raises: None
 
         """
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+        key = (element_node, name)
+        ta_node = self.__attr_ta_nodes.get(key)
+        if (ta_node is None):
+            ta_node = TreeAccNode(name, TreeAccNode.ATTRIBUTE, "", None,
+                                  element_node, self)
+            ta_node._clear_cache()
+            self.__attr_ta_nodes[key] = ta_node
+        return ta_node
 
-        # Read file into memory.
-        try:
-            self.treedoc = minidom.parse(xml_file.strip())
-        except IOError as err:
-            raise TreeAccError("Error opening xml file %s: %s" %
-                                (xml_file.strip(), errno.errorcode[err.errno]))
-        except (DOMException, ExpatError) as err:
-            raise TreeAccError("Error parsing xml file %s" %
-                                 (xml_file.strip()))
 
-        # Save root document element.
-        self.treeroot = self.treedoc.documentElement
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def __clear_cached(self, element_node, name=None):
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+        """ Private method.  Have the TreeAccNodes of an element, and of
+        one of its attributes if a name is given, read their values
+        and attributes again.  To be called after they change.
 
-        # Create a TreeAccNode representation of the root element.
-        # It will be used as a default for find_node() and other methods
-        value = TreeAcc.__get_element_value(self.treeroot)
-        attrs = TreeAcc.__create_attr_dict(self.treeroot)
-        self.treeroot_ta_node = TreeAccNode(self.treeroot.nodeName,
-                                            TreeAccNode.ELEMENT, value, attrs,
-                                            self.treeroot, self)
+        Args:
+          element_node: backend element which changed.
+
+          name: name of the attribute of the element which changed, or
+                None if only the element changed.
+
+        Returns: N/A
+
+        Raises: None
+
+        """
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+        ta_node = self.__element_ta_nodes.get(element_node)
+        if (ta_node is not None):
+            ta_node._clear_cache()
+        if (name is not None):
+            ta_node = self.__attr_ta_nodes.get((element_node, name))
+            if (ta_node is not None):
+                ta_node._clear_cache()
 
 
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
@@ -560,7 +717,7 @@ class TreeAcc:
         """
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
         try:
-            return self.__find_node_w_pathlist(parse_nodepath(path),
+            return self.__find_node_w_pathlist(compile_nodepath(path),
                                                starting_ta_node)
         except ParserError as err:
             raise BadNodepathError("Error parsing nodepath: " + str(err))
@@ -573,9 +730,10 @@ class TreeAcc:
             path_tokens
 
         Args:
-          path_tokens: Specifies nodes to search for.  This is a list of
+          path_tokens: Specifies nodes to search for.  This is a tuple of
           ENTokens, a parsed starting-node-to-destination node path
-          of element and attribute names and values.  A list for a
+          of element and attribute names and values, as returned by
+          compile_nodepath().  It is not changed.  A tuple for a
           search starting from the root does not have to start with
           the root node; if not given, it is implied.  No default.
 
@@ -610,22 +768,29 @@ class TreeAcc:
             # have to be provided as part of the pathname.  If it
             # is not at the beginning of element 0 (whether alone
             # or part of a more complicated element-0 string,
-            # prepend just the name to path_tokens.
+            # prepend just the name to path_tokens.  The tokens may
+            # be shared through the nodepath cache, so prepend to a
+            # new tuple rather than in place.
 
             root_name = starting_ta_node.get_name()
             if ((len(path_tokens) == 0) or
                 (path_tokens[0].name != root_name)):
-                path_tokens.insert(0, ENToken(root_name))
+                path_tokens = (ENToken(root_name),) + tuple(path_tokens)
 
             # Note whether ".." is part of the path.
             pathlist_has_dots = self.__pathlist_has_dots(path_tokens)
 
-            # Actual searching uses DOM tree elements.
+            # Actual searching uses backend elements.
             # No searching on an attribute is necessary here, since
-            # beginning will always be the root element.
-            self.__search_node(starting_ta_node.get_element_node(),
-                               Node.ELEMENT_NODE, path_tokens,
-                               found_nodes, None)
+            # beginning will always be the root element.  Paths
+            # without ".." are looked up in the path index instead of
+            # walking down the tree.
+            if ((not pathlist_has_dots) and (len(path_tokens) > 1)):
+                self.__search_index(path_tokens, found_nodes)
+            else:
+                self.__search_node(starting_ta_node.get_element_node(),
+                                   Node.ELEMENT_NODE, path_tokens,
+                                   found_nodes, None)
 
         # Start in the middle of the tree.
         else:
@@ -636,7 +801,7 @@ class TreeAcc:
 
             # Get rid of leading "..".  If run out of tokens,
             # append the element ended up at and return
-            start_node = self.__do_dots(path_tokens,
+            start_node, path_tokens = self.__do_dots(path_tokens,
                                         starting_ta_node.get_element_node(),
                                         found_nodes, None)
             if (len(path_tokens) == 0):
@@ -652,9 +817,8 @@ class TreeAcc:
 
             # pylint gets confused and thinks curr_node is a list.
             # pylint: disable-msg=E1103
-            for child in start_node.childNodes:
-                if ((child.nodeType == Node.ELEMENT_NODE) and
-                    (child.nodeName == path_tokens[0].name)):
+            for child in self.backend.children(start_node):
+                if (self.backend.name(child) == path_tokens[0].name):
                     self.__search_node(child,
                                        Node.ELEMENT_NODE, path_tokens,
                                        found_nodes, None)
@@ -672,26 +836,18 @@ class TreeAcc:
         # it searches for it through each of the parent's children.
         #
         # Check for and remove duplicates if ".." specified in the path.
-        # There is no need to do this otherwise, and this checking can
-        # be compute intensive if there are many nodes to check.
-        # Chances are, though, that paths with ".." in them will be few
-        # and far between, and that they will be for starting mid-tree
-        # searches and so won't return many nodes.
+        # There is no need to do this otherwise.  The last find of each
+        # node is kept.  Finds of the same node are the same
+        # TreeAccNode, so a set tells them apart.
         if (pathlist_has_dots):
-            i = len(found_nodes) - 1
-            while (i > 0):	# Don't need to check element 0
-
-                # Search backwards looking for duplicates.
-                check_node = found_nodes[i]
-                count = found_nodes.count(check_node)
-
-                # Remove count-1 nodes
-                j = 1
-                while (j < count):
-                    # This removes the lower indexed dup.
-                    found_nodes.remove(check_node)
-                    j += 1
-                i -= count	# Decr one beyond number removed
+            seen = set()
+            unique_nodes = []
+            for check_node in reversed(found_nodes):
+                if (check_node not in seen):
+                    seen.add(check_node)
+                    unique_nodes.append(check_node)
+            unique_nodes.reverse()
+            found_nodes = unique_nodes
 
         return found_nodes
 
@@ -703,7 +859,7 @@ class TreeAcc:
         """ Private recursive workhorse method used to search the tree.
 
         Args:
-          curr_node: Current DOM node being checked.  Supports checking
+          curr_node: Current element being checked.  Supports checking
                 only for elements and attributes.
 
         node_type: Node.ELEMENT_NODE or Node.ATTRIBUTE_NODE (unvalidated)
@@ -751,15 +907,13 @@ class TreeAcc:
             # Eat any next tokens with ".."
             # If run out of tokens, append the element ended up at,
             # conditionally on search_value, then return.
-            curr_node = self.__do_dots(path_tokens, curr_node,
-                                       found_nodes, search_value)
+            curr_node, path_tokens = self.__do_dots(path_tokens, curr_node,
+                                                    found_nodes, search_value)
             if (len(path_tokens) == 0):
                 return
 
             num_nodes_at_start = len(found_nodes)
-            for child in curr_node.childNodes:
-                if (child.nodeType != Node.ELEMENT_NODE):
-                    continue
+            for child in self.backend.children(curr_node):
                 self.__search_node(child, Node.ELEMENT_NODE,
                                    path_tokens, found_nodes, search_value)
 
@@ -777,29 +931,138 @@ class TreeAcc:
 
         elif (node_type == Node.ELEMENT_NODE):
 
-            value = self.__get_element_value(curr_node)
+            ta_node = self.__element_ta_node(curr_node)
 
             # Save if want all values, or if want a
             # specific value and node value matches.
-            if ((search_value is None) or (search_value == value)):
-                attrs = TreeAcc.__create_attr_dict(curr_node)
-                found_nodes.append(TreeAccNode(name, TreeAccNode.ELEMENT,
-                                               value, attrs, curr_node, self))
+            if ((search_value is None) or
+                (search_value == ta_node.get_value())):
+                found_nodes.append(ta_node)
 
         else:	# Node.ATTRIBUTE_NODE
-            attr_node = curr_node.getAttributeNode(name)
+            attr_value = self.backend.get_attribute(curr_node, name)
 
             # Save if all found nodes are desired, or if a specific
             # value is desired and node value matches.
             if ((search_value is None) or
-                (search_value == attr_node.nodeValue)):
+                (search_value == attr_value)):
 
                 # Append match to found_nodes.
-                attr_dict = {}
-                attr_dict[name] = attr_node.nodeValue
-                found_nodes.append(TreeAccNode(name,
-                                   TreeAccNode.ATTRIBUTE, attr_node.nodeValue,
-                                   attr_dict, curr_node, self))
+                found_nodes.append(self.__attr_ta_node(curr_node, name))
+
+
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def __index_entry(self, names):
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+        """ Private method.  Return the path index entry of names: the
+        list of the elements with that path, in document order.
+        Missing entries are built from the entry of the parent path.
+
+        Args:
+          names: tuple of element names, starting with the root's.
+
+        Returns:
+          list of elements.  Can be empty.  Must not be changed
+                by the caller.
+
+        Raises: None
+
+        """
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+        entry = self.__path_index.get(names)
+        if (entry is not None):
+            return entry
+
+        if (len(names) == 1):
+            if (names[0] == self.backend.name(self.treeroot)):
+                entry = [self.treeroot]
+            else:
+                entry = []
+        else:
+            # Siblings are next to each other in document order, and
+            # the parents are in document order already.
+            name = names[-1]
+            entry = []
+            for parent in self.__index_entry(names[:-1]):
+                for child in self.backend.children(parent):
+                    if (self.backend.name(child) == name):
+                        entry.append(child)
+        self.__path_index[names] = entry
+        return entry
+
+
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def __search_index(self, path_tokens, found_nodes):
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+        """ Private method.  Search from the root with the path index.
+
+        Finds the same nodes in the same order as __search_node() does
+        from the root.  The candidates for each token are the index
+        entry of the names up to it; those under a parent which didn't
+        match, or not matching the values of the token, are left out.
+        As with __search_node(), the last token names an attribute of
+        the parents which have no matching child element of that name.
+
+        Args:
+          path_tokens: path ENTokens starting with the root element's.
+                At least two, none of them "..".
+
+          found_nodes: list of TreeAccNodes, one per found node.
+
+        Returns: N/A
+          Appends found nodes to the list passed in as found_nodes
+
+        Raises: None
+
+        """
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+        names = tuple([token.name for token in path_tokens])
+        parent_of = self.backend.parent
+
+        # Elements matching each token in turn.  Until a token gives
+        # values to check, every element of the index entry matches.
+        parents = []
+        matches = []
+        narrowed = False
+        for depth in range(len(path_tokens)):
+            token = path_tokens[depth]
+            entry = self.__index_entry(names[:depth + 1])
+            if ((not narrowed) and (len(token.values) == 0)):
+                matches = entry
+            else:
+                if (narrowed):
+                    parent_set = set(parents)
+                    entry = [node for node in entry
+                             if (parent_of(node) in parent_set)]
+                matches = [node for node in entry
+                           if (self.__match(token, node,
+                                            TreeAccNode.ELEMENT) is not None)]
+                narrowed = True
+            if (depth < len(path_tokens) - 1):
+                if (len(matches) == 0):
+                    return
+                parents = matches
+
+        # Keep the order of __search_node(): for each parent, either
+        # its matching children or its matching attribute.
+        name = names[-1]
+        with_children = set([parent_of(node) for node in matches])
+        if (len(with_children) == len(parents)):
+            for node in matches:
+                found_nodes.append(self.get_treeaccnode_from_element(node))
+            return
+
+        children = {}
+        for node in matches:
+            children.setdefault(parent_of(node), []).append(node)
+        for parent in parents:
+            if (parent in children):
+                for node in children[parent]:
+                    found_nodes.append(
+                        self.get_treeaccnode_from_element(node))
+            elif (self.__match(path_tokens[-1], parent,
+                               TreeAccNode.ATTRIBUTE) is not None):
+                found_nodes.append(self.__attr_ta_node(parent, name))
 
 
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
@@ -844,22 +1107,24 @@ class TreeAcc:
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
         # Current node name must match the name in the token.
-        # Get value for later.
         if (node_type == TreeAccNode.ELEMENT):
-            if (curr_node.nodeName != token.name):
+            if (self.backend.name(curr_node) != token.name):
                 return None
-            chk_value = self.__get_element_value(curr_node)
         else:
-            attr_node = curr_node.getAttributeNode(token.name)
-            if (attr_node is None):
+            attr_value = self.backend.get_attribute(curr_node, token.name)
+            if (attr_value is None):
                 return None
-            chk_value = attr_node.nodeValue
 
         # At least one value was specified.
         if (len(token.values) != 0):
 
             # No valpath specified.  Check value against this node.
+            # The value is needed only here.
             if (len(token.valpaths) == 0):
+                if (node_type == TreeAccNode.ELEMENT):
+                    chk_value = self.__element_ta_node(curr_node).get_value()
+                else:
+                    chk_value = attr_value
                 if (token.values[0] != chk_value):
                     return None
 
@@ -901,14 +1166,14 @@ class TreeAcc:
 
             cmp_match = False
             vp_matches = []
-            path_tokens = parse_nodepath(valpaths[i])
+            path_tokens = compile_nodepath(valpaths[i])
 
             # Eat any next tokens with ".."
             # If run out of tokens, append the element ended up at,
             # if its value matches values[i].
 
-            curr_node = self.__do_dots(path_tokens, curr_node,
-                                       vp_matches, values[i])
+            curr_node, path_tokens = self.__do_dots(path_tokens, curr_node,
+                                                    vp_matches, values[i])
             if (len(vp_matches) > 0):
                 cmp_match = True
                 continue
@@ -920,10 +1185,7 @@ class TreeAcc:
             if (not cmp_match):
                 # pylint gets confused and thinks curr_node is a list.
                 # pylint: disable-msg=E1103
-                for child in curr_node.childNodes:
-                    if (child.nodeType !=
-                        Node.ELEMENT_NODE):
-                        continue
+                for child in self.backend.children(curr_node):
                     self.__search_node(child, Node.ELEMENT_NODE, path_tokens,
                                        vp_matches, values[i])
 
@@ -968,9 +1230,10 @@ class TreeAcc:
         much sense to use it with attributes.
 
         Args:
-          path_tokens: list of path tokens.  Altered during execution.
+          path_tokens: sequence of path tokens.  Not changed; the tokens
+                left after the ".."s are returned instead.
 
-          curr_node: current DOM node
+          curr_node: current element
 
           found_nodes: list of found nodes.  New current node is conditionally
                 appended here if path_tokens are depleted.  (See search_value
@@ -982,47 +1245,39 @@ class TreeAcc:
                 current node's value matches this arg.
 
         Returns:
-          New DOM node arrived at after eating ".."s.
+          A tuple of the new element arrived at after eating ".."s, and
+          the path tokens left after them.
 
         Raises: None
 
         """
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-        while ((len(path_tokens) > 0) and
-               (path_tokens[0].name == "..")):
-
-            # Here we pop instead of path_tokens = path_tokens[1:]
-            # because we want the change to path_tokens to
-            # propagate to the caller.  This is because the caller
-            # will likely use the changed path to continue
-            # recursing down the tree, and it needs the dots gone.
-            #
-            # Calling pop() is different than doing
-            # path_tokens = path_tokens[1:].  The latter keeps the
-            # original list in its original state.  It also creates
-            # a new list without the first element and assigns
-            # path_tokens to it.  In this case, the original list
-            # will be intact for the caller's parent method (e.g. a
-            # previous frame of __search_node) so that it can
-            # recurse down the tree down a different path once
-            # recursion down the current path is completed.
-            path_tokens.pop(0)
-
-            if ((curr_node.parentNode is not None) and
-               (curr_node.parentNode.nodeType == Node.ELEMENT_NODE)):
-                curr_node = curr_node.parentNode
+        # The caller goes on with the tokens left after the dots, so
+        # they are returned along with the node.  path_tokens itself
+        # is left intact: it may be shared through the nodepath cache,
+        # or still be needed by a previous frame of __search_node to
+        # recurse down a different path.
+        ndots = 0
+        while ((ndots < len(path_tokens)) and
+               (path_tokens[ndots].name == "..")):
+            ndots += 1
+
+            parent = self.backend.parent(curr_node)
+            if (parent is not None):
+                curr_node = parent
+
+        if (ndots > 0):
+            path_tokens = path_tokens[ndots:]
 
         # Path tokens list exhausted.  Add current node to found_nodes.
         if (len(path_tokens) == 0):
-            value = self.__get_element_value(curr_node)
-            if ((search_value is None) or (value == search_value)):
-                attrs = TreeAcc.__create_attr_dict(curr_node)
-                found_nodes.append(TreeAccNode(curr_node.nodeName,
-                                               TreeAccNode.ELEMENT, value,
-                                               attrs, curr_node, self))
+            ta_node = self.__element_ta_node(curr_node)
+            if ((search_value is None) or
+                (ta_node.get_value() == search_value)):
+                found_nodes.append(ta_node)
 
-        # Return current DOM node in all cases.
-        return curr_node
+        # Return current element and the tokens left in all cases.
+        return curr_node, path_tokens
 
 
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
@@ -1054,7 +1309,7 @@ class TreeAcc:
 
         """
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-        path_tokens = parse_nodepath(path)
+        path_tokens = compile_nodepath(path)
 
         # Search for the target.
         matches = self.__find_node_w_pathlist(path_tokens, starting_ta_node)
@@ -1069,7 +1324,7 @@ class TreeAcc:
             raise PathNotUniqueError(("replace_value: path %s matches " +
                                         "multiple nodes") % path)
 
-        # Get the DOM element node of the one match.  If the target
+        # Get the element of the one match.  If the target
         # is an attribute, retrieve the element node that attribute is
         # associated with.
         element_node = matches[0].get_element_node()
@@ -1079,12 +1334,15 @@ class TreeAcc:
 
             # Change the attribute value.
             # The last branch of the path is the attribute name.
-            element_node.setAttribute(path_tokens[-1].name, new_value)
+            self.backend.set_attribute(element_node, path_tokens[-1].name,
+                                       new_value)
+            self.__clear_cached(element_node, path_tokens[-1].name)
 
         # Element.
         else:
             # Change the element value.
-            self.__set_element_value(element_node, new_value)
+            self.backend.set_text(element_node, new_value)
+            self.__clear_cached(element_node)
 
 
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
@@ -1145,7 +1403,7 @@ class TreeAcc:
                 raise InvalidArgError("add_node: is_unique must be True " +
                                         "when adding attributes")
 
-        path_tokens = parse_nodepath(path)
+        path_tokens = compile_nodepath(path)
         if (len(path_tokens) == 0):
             raise InvalidArgError((
                                     "add_node: provided path is empty"))
@@ -1176,12 +1434,11 @@ class TreeAcc:
             # to achieve this.
             # If there is more than one parent, reject the request.
             if (len(matches) > 1):
-                parent_element =	\
-                    matches[0].get_element_node().parentNode
+                parent_element = self.backend.parent(
+                    matches[0].get_element_node())
                 for i in range(1, len(matches)):
                     if (parent_element is not
-                        matches[i].get_element_node().
-                        parentNode):
+                        self.backend.parent(matches[i].get_element_node())):
                         raise AmbiguousParentNodeError(("add_node: " +
                                                           "multiple nodes " +
                                                           "matching %s " +
@@ -1221,26 +1478,31 @@ class TreeAcc:
             # No conflicts.  Do it.
             parent_element = matches[0].get_element_node()
 
-        # Add the new node and return a new TreeAccNode.
+        # Add the new node and return its TreeAccNode.
         if (node_type == TreeAccNode.ATTRIBUTE):
             # Note: parent_element here means the (element) node
             # corresponding to the parent path.  The attribute will
             # belong to this element.
-            parent_element.setAttribute(new_name, value)
-            attr_dict = {}
-            attr_dict[new_name] = value
-            return TreeAccNode(new_name, TreeAccNode.ATTRIBUTE,
-                               value, attr_dict, parent_element, self)
+            self.backend.set_attribute(parent_element, new_name, value)
+            self.__clear_cached(parent_element, new_name)
+            return self.__attr_ta_node(parent_element, new_name)
         else:
-            # For elements, add a new element node, and a new text
-            # node to hold its value if a value is given.
-            new_element = self.treedoc.createElement(new_name)
-            parent_element.appendChild(new_element)
-            if (value is not None):
-                new_text = self.treedoc.createTextNode(value)
-                new_element.appendChild(new_text)
-            return TreeAccNode(new_name, TreeAccNode.ELEMENT, value,
-                               {}, new_element, self)
+            # For elements, add a new element, holding its value if a
+            # value is given.
+            new_element = self.backend.add_element(parent_element,
+                                                   new_name, value)
+
+            # The index entry of the new element's path is missing it
+            # now.  Drop it to have it built again when next needed.
+            # Element values and attributes aren't indexed.
+            parent_path = []
+            curr_node = parent_element
+            while (curr_node is not None):
+                parent_path.insert(0, self.backend.name(curr_node))
+                curr_node = self.backend.parent(curr_node)
+            self.__path_index.pop(tuple(parent_path) + (new_name,), None)
+            self.__clear_cached(parent_element)
+            return self.__element_ta_node(new_element)
 
 
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
@@ -1248,7 +1510,7 @@ class TreeAcc:
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
         """ Return an object to pass repeatedly to walk_tree()
 
-        Passing the same object to walk_tree() facilitates a DOM
+        Passing the same object to walk_tree() facilitates a
         tree walk. Holds state of the walk.
 
         Args: None
@@ -1281,13 +1543,13 @@ class TreeAcc:
         """
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
         # Filter out non-element nodes
-        if (curr_node.nodeType != Node.ELEMENT_NODE):
+        if (not self.backend.is_element(curr_node)):
             return
 
         # Return current node and then iterate through children.
         yield curr_node
 
-        for child in curr_node.childNodes:
+        for child in self.backend.children(curr_node):
             for child_gen in self.__get_tree_walker_worker(child):
                 yield child_gen
 
@@ -1295,7 +1557,7 @@ class TreeAcc:
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
     def walk_tree(self, tree_walker):
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-        """ Walks the DOM tree.
+        """ Walks the tree.
 
         Args:
           walker object returned by get_tree_walker.  This arg gets
@@ -1324,7 +1586,7 @@ class TreeAcc:
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
     def save_tree(self, out_file):
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-        """ Save the DOM tree to an XML file
+        """ Save the tree to an XML file
 
         Args:
           out_file: File to write the XML to.  Any existing file
@@ -1351,20 +1613,19 @@ class TreeAcc:
         # DTD, then reconstruct the DOCTYPE field and write it out at
         # the top of the output file.
         # (This is essential for loading DTD attribute defaults later.)
-        if ((self.treedoc.doctype is not None) and
-            (self.treedoc.doctype.name is not None) and
-            (self.treedoc.doctype.systemId is not None) and
-            (self.treedoc.doctype.systemId.endswith(".dtd"))):
+        doctype_name, doctype_system_id = self.backend.doctype()
+        if ((doctype_name is not None) and
+            (doctype_system_id is not None) and
+            (doctype_system_id.endswith(".dtd"))):
             doctype_str = "<!DOCTYPE %s SYSTEM \"%s\">\n" % \
-                (self.treedoc.doctype.name, self.treedoc.doctype.systemId)
+                (doctype_name, doctype_system_id)
             fp.write(doctype_str)
 
         # Write the data.
         # Pylint bug: See http://www.logilab.org/ticket/8764
         # pylint: disable-msg=C0321
         try:
-            fp.write(self.treeroot.toprettyxml(
-                     indent="", newl=""))
+            self.backend.write(fp)
             fp.write("\n")
         except IOError as err:
             raise FileSaveError(errno.errorcode[err.errno])
@@ -1380,57 +1641,52 @@ class TreeAcc:
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
     def get_treeaccnode_from_element(self, element_node):
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-        """ Create a TreeAccNode from a DOM element node.
+        """ Create a TreeAccNode from a backend element.
 
         Args:
-          element_node: DOM node to convert.
-            Only element nodes are supported.
+          element_node: backend node to convert.
+            Only elements are supported.
 
         Returns:
-          TreeAccNode corresponding to the given DOM element node
-          None: Given node is not a DOM element node.
+          TreeAccNode corresponding to the given element
+          None: Given node is not an element.
 
         Raises: None
 
         """
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
         # Not a supported node.
-        if (element_node.nodeType != Node.ELEMENT_NODE):
+        if (not self.backend.is_element(element_node)):
             return None
 
-        # Build the TreeAccNode to return and return it
-        name = element_node.nodeName
-        value = TreeAcc.__get_element_value(element_node)
-        attrs = TreeAcc.__create_attr_dict(element_node)
-        return TreeAccNode(name, TreeAccNode.ELEMENT, value, attrs,
-                           element_node, self)
+        return self.__element_ta_node(element_node)
 
 
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
     def get_treeaccnode_clust_fm_elem(self, element_node):
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-        """ Return a list of TreeAccNodes from a DOM element node.
+        """ Return a list of TreeAccNodes from a backend element.
 
         List of TreeAccNodes includes the TreeAccNode of the element
         node itself (always the first node in the returned list),
         plus any attribute nodes it carries.
 
         Args:
-          element_node: DOM node to convert.
-            Only element nodes are supported.
+          element_node: backend node to convert.
+            Only elements are supported.
 
         Returns:
-          The first node in the returned list corresponds to the DOM
+          The first node in the returned list corresponds to the
             element itself.  Subsequent nodes correspond to any
               attribute nodes below it.
-          None: Given node is not a DOM element node.
+          None: Given node is not an element.
 
         Raises: None
 
         """
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
         # Not a supported node.
-        if (element_node.nodeType != Node.ELEMENT_NODE):
+        if (not self.backend.is_element(element_node)):
             return None
 
         retlist = []
@@ -1441,40 +1697,16 @@ class TreeAcc:
         # Build TreeAccNodes for any attributes.
         try:
             for attr, attrvalue in list(elem_attr_dict.items()):
-                attr_attr_dict = {}
-                attr_attr_dict[attr] = attrvalue
-                retlist.append(TreeAccNode(attr,
-                               TreeAccNode.ATTRIBUTE, attrvalue,
-                               attr_attr_dict, element_node, self))
+                ta_node = self.__attr_ta_node(element_node, attr)
+
+                # The attribute dictionary holds values stripped of
+                # spaces, while searches give them as they are.
+                if (ta_node.get_value() != attrvalue):
+                    ta_node = TreeAccNode(attr, TreeAccNode.ATTRIBUTE,
+                                          attrvalue, None, element_node,
+                                          self)
+                retlist.append(ta_node)
         except StopIteration:
             pass
 
         return retlist
-
-    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-    def __set_element_value(self, element_node, new_value):
-    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-        """ Private method.  Set the value associated with a given element.
-
-        Operates on a DOM element node to traverse its children looking for
-        a text node containing its value.  Assume there is only one child
-        text node.  Changes the value of the text node.  Add a text node and
-        set its value, in case a text node doesn't already exist.
-
-        Args:
-          element_node: The node to set the associated value.
-
-          new_value: The new value to set.
-
-          Returns: N/A
-
-        Raises: None
-
-        """
-    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-        for child in element_node.childNodes:
-            if (child.nodeType == Node.TEXT_NODE):
-                child.nodeValue = new_value
-                return
-        new_text = self.treedoc.createTextNode(new_value)
-        element_node.appendChild(new_text)
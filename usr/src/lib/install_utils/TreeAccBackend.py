@@ -0,0 +1,383 @@
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+# Copyright (c) 2010, Oracle and/or its affiliates. All rights reserved.
+
+
+# =============================================================================
+# =============================================================================
+"""
+TreeAccBackend.py - XML tree backends of the TreeAcc module
+
+TreeAcc keeps its XML tree in one of these backends, and goes through the
+backend for every access to it.  The backends hand out their own element
+objects, which TreeAcc stores in its TreeAccNodes.
+
+    DOMBackend: xml.dom.minidom.  Each element, text and attribute is a
+        DOM node.
+
+    ElementTreeBackend: xml.etree.ElementTree, much lighter in memory and
+        faster to load and search.  The tree is built with expat set up
+        as minidom sets it up, so that element and attribute names,
+        attribute order, text and saved output are the same as with
+        DOMBackend.  The one exception: CDATA sections become plain
+        text.
+"""
+# =============================================================================
+# =============================================================================
+
+from xml.dom import Node
+from xml.dom import minidom
+from xml.etree import ElementTree
+from xml.parsers import expat
+
+# Names of the backends, as given to TreeAcc()
+DOM_BACKEND = "dom"
+ELEMENTTREE_BACKEND = "elementtree"
+
+# Backend used when TreeAcc() isn't given one
+DEFAULT_BACKEND = ELEMENTTREE_BACKEND
+
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def _escape(data):
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    """ Escape text or an attribute value as minidom writes it. """
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    return data.replace("&", "&amp;").replace("<", "&lt;"). \
+        replace("\"", "&quot;").replace(">", "&gt;")
+
+
+# =============================================================================
+class DOMBackend(object):
+# =============================================================================
+    """ XML tree backend on xml.dom.minidom.
+
+    Elements are DOM element nodes.
+
+    """
+# =============================================================================
+
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def __init__(self, xml_file):
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+        """ Constructor.  Parse xml_file into a DOM tree.
+
+        Args:
+          xml_file: XML file name.
+
+        Raises:
+          IOError: Error opening xml file
+          DOMException, ExpatError: Error parsing xml file
+
+        """
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+        self.document = minidom.parse(xml_file)
+        self.root = self.document.documentElement
+
+    @staticmethod
+    def is_element(node):
+        """ Return True if node is an element. """
+        return (node.nodeType == Node.ELEMENT_NODE)
+
+    @staticmethod
+    def name(element):
+        """ Return the name of element. """
+        return element.nodeName
+
+    @staticmethod
+    def parent(element):
+        """ Return the parent element of element, None for the root. """
+        parent = element.parentNode
+        if ((parent is None) or (parent.nodeType != Node.ELEMENT_NODE)):
+            return None
+        return parent
+
+    @staticmethod
+    def children(element):
+        """ Return the list of the child elements of element. """
+        return [child for child in element.childNodes
+                if (child.nodeType == Node.ELEMENT_NODE)]
+
+    @staticmethod
+    def has_children(element):
+        """ Return True if element has child elements. """
+        for child in element.childNodes:
+            if (child.nodeType == Node.ELEMENT_NODE):
+                return True
+        return False
+
+    @staticmethod
+    def text(element):
+        """ Return the text directly inside element, unstripped. """
+        value = ""
+        for child in element.childNodes:
+            if (child.nodeType == Node.TEXT_NODE):
+                value = value + child.nodeValue
+        return value
+
+    @staticmethod
+    def attributes(element):
+        """ Return the (name, value) pairs of the attributes of element. """
+        attr_map = element.attributes
+        return [(attr_map.item(i).nodeName, attr_map.item(i).nodeValue)
+                for i in range(attr_map.length)]
+
+    @staticmethod
+    def get_attribute(element, name):
+        """ Return the value of attribute name of element, or None. """
+        attr_node = element.getAttributeNode(name)
+        if (attr_node is None):
+            return None
+        return attr_node.nodeValue
+
+    @staticmethod
+    def set_attribute(element, name, value):
+        """ Set attribute name of element to value. """
+        element.setAttribute(name, value)
+
+    def set_text(self, element, value):
+        """ Set the text of element.  The first text node is changed, or
+        a text node is added if there is none.
+        """
+        for child in element.childNodes:
+            if (child.nodeType == Node.TEXT_NODE):
+                child.nodeValue = value
+                return
+        element.appendChild(self.document.createTextNode(value))
+
+    def add_element(self, parent, name, value):
+        """ Add a new last child element name to parent, holding the text
+        value unless it is None.  Returns the new element.
+        """
+        new_element = self.document.createElement(name)
+        parent.appendChild(new_element)
+        if (value is not None):
+            new_element.appendChild(self.document.createTextNode(value))
+        return new_element
+
+    def doctype(self):
+        """ Return the name and system id of the document type, or None
+        for either if missing.
+        """
+        if (self.document.doctype is None):
+            return None, None
+        return self.document.doctype.name, self.document.doctype.systemId
+
+    def write(self, out):
+        """ Write the root element and everything below it to out. """
+        out.write(self.root.toprettyxml(indent="", newl=""))
+
+
+# =============================================================================
+class ElementTreeBackend(object):
+# =============================================================================
+    """ XML tree backend on xml.etree.ElementTree.
+
+    Elements are ElementTree elements.  Comments and processing
+    instructions inside the root are kept in the tree, to be saved, but
+    are not elements.  ElementTree elements don't know their parent, so
+    the backend keeps a map of them.
+
+    """
+# =============================================================================
+
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def __init__(self, xml_file):
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+        """ Constructor.  Parse xml_file into an ElementTree.
+
+        Args:
+          xml_file: XML file name.
+
+        Raises:
+          IOError: Error opening xml file
+          ExpatError: Error parsing xml file
+
+        """
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+        self.__doctype = (None, None)
+        builder = ElementTree.TreeBuilder(insert_comments=True,
+                                          insert_pis=True)
+
+        def start(name, attrs):
+            """ Start an element, namespace declarations first as
+            minidom puts them.
+            """
+            pairs = [(attrs[i], attrs[i + 1]) for i in range(0, len(attrs), 2)]
+            decls = [pair for pair in pairs if ((pair[0] == "xmlns") or
+                                                pair[0].startswith("xmlns:"))]
+            if (decls):
+                pairs = decls + [pair for pair in pairs if pair not in decls]
+            builder.start(name, dict(pairs))
+
+        def doctype(name, system_id, public_id, has_internal_subset):
+            """ Save the document type, for save_tree(). """
+            self.__doctype = (name, system_id)
+
+        # No namespace processing: names stay as written, and namespace
+        # declarations stay attributes, as in minidom.
+        parser = expat.ParserCreate()
+        parser.buffer_text = True
+        parser.ordered_attributes = True
+        parser.specified_attributes = True
+        parser.StartElementHandler = start
+        parser.EndElementHandler = builder.end
+        parser.CharacterDataHandler = builder.data
+        parser.CommentHandler = builder.comment
+        parser.ProcessingInstructionHandler = builder.pi
+        parser.StartDoctypeDeclHandler = doctype
+        with open(xml_file, "rb") as xml_fp:
+            parser.ParseFile(xml_fp)
+        self.root = builder.close()
+        self.document = ElementTree.ElementTree(self.root)
+
+        self.__parents = {}
+        for parent in self.root.iter():
+            for child in parent:
+                self.__parents[child] = parent
+
+    @staticmethod
+    def is_element(node):
+        """ Return True if node is an element. """
+        return isinstance(node, ElementTree.Element) and \
+            isinstance(node.tag, str)
+
+    @staticmethod
+    def name(element):
+        """ Return the name of element. """
+        return element.tag
+
+    def parent(self, element):
+        """ Return the parent element of element, None for the root. """
+        return self.__parents.get(element)
+
+    @staticmethod
+    def children(element):
+        """ Return the list of the child elements of element. """
+        return [child for child in element if isinstance(child.tag, str)]
+
+    @staticmethod
+    def has_children(element):
+        """ Return True if element has child elements. """
+        for child in element:
+            if (isinstance(child.tag, str)):
+                return True
+        return False
+
+    @staticmethod
+    def text(element):
+        """ Return the text directly inside element, unstripped. """
+        if (len(element) == 0):
+            return element.text or ""
+        return (element.text or "") + \
+            "".join([child.tail or "" for child in element])
+
+    @staticmethod
+    def attributes(element):
+        """ Return the (name, value) pairs of the attributes of element. """
+        return list(element.attrib.items())
+
+    @staticmethod
+    def get_attribute(element, name):
+        """ Return the value of attribute name of element, or None. """
+        return element.get(name)
+
+    @staticmethod
+    def set_attribute(element, name, value):
+        """ Set attribute name of element to value. """
+        element.set(name, value)
+
+    @staticmethod
+    def set_text(element, value):
+        """ Set the text of element.  The first piece of text is changed,
+        or text is added at the end if there is none, as DOMBackend does
+        with text nodes.
+        """
+        if (element.text is not None):
+            element.text = value
+            return
+        for child in element:
+            if (child.tail is not None):
+                child.tail = value
+                return
+        if (len(element) == 0):
+            element.text = value
+        else:
+            element[-1].tail = value
+
+    def add_element(self, parent, name, value):
+        """ Add a new last child element name to parent, holding the text
+        value unless it is None.  Returns the new element.
+        """
+        new_element = ElementTree.SubElement(parent, name)
+        if (value is not None):
+            new_element.text = value
+        self.__parents[new_element] = parent
+        return new_element
+
+    def doctype(self):
+        """ Return the name and system id of the document type, or None
+        for either if missing.
+        """
+        return self.__doctype
+
+    def write(self, out):
+        """ Write the root element and everything below it to out, as
+        DOMBackend.write() does.
+        """
+        self.__write_node(out.write, self.root)
+
+    def __write_node(self, write, node):
+        """ Write node and everything below it with write. """
+        tag = node.tag
+        if (tag is ElementTree.Comment):
+            write("<!--%s-->" % node.text)
+            return
+        if (tag is ElementTree.ProcessingInstruction):
+            # minidom separates the target and the data with a space
+            # even if the data is empty.
+            if (" " in node.text):
+                write("<?%s?>" % node.text)
+            else:
+                write("<?%s ?>" % node.text)
+            return
+
+        write("<" + tag)
+        for name, value in node.attrib.items():
+            write(" %s=\"%s\"" % (name, _escape(value)))
+        if ((node.text is None) and (len(node) == 0)):
+            write("/>")
+            return
+        write(">")
+        if (node.text is not None):
+            write(_escape(node.text))
+        for child in node:
+            self.__write_node(write, child)
+            if (child.tail is not None):
+                write(_escape(child.tail))
+        write("</%s>" % tag)
+
+
+# Backend classes by name
+BACKENDS = {
+    DOM_BACKEND: DOMBackend,
+    ELEMENTTREE_BACKEND: ElementTreeBackend
+}
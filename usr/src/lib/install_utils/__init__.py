@@ -24,6 +24,7 @@
 """ Module body for osol_install package
 """
 
-__all__ = ["DefValProc", "ENParser", "TreeAcc", "install_utils", "finalizer",
+__all__ = ["DefValProc", "ENParser", "TreeAcc",
+    "TreeAccBackend", "install_utils", "finalizer",
     "ManifestServ", "ManifestRead", "SocketServProtocol",
     "PasswordFile", "UserattrFile"]
@@ -27,6 +27,8 @@ import os
 import stat
 import errno
 import select
+import time
+import asyncio
 import string
 from logging import DEBUG
 from logging import ERROR
@@ -35,6 +37,7 @@ from subprocess import PIPE
 from osol_install.transfer_defs import TRANSFER_ID
 import osol_install.liblogsvc as logsvc
 import random
+import re
 import crypt
 
 # =============================================================================
@@ -105,6 +108,15 @@ __SPACE_STATE_TABLE = []
 __SPACE_STATE_TABLE.insert(__QST_NONESC, __QST_NONESC_TBL)
 __SPACE_STATE_TABLE.insert(__QST_BSESC, __QST_ESC_TBL)
 
+# The pieces space_parse() splits its input into, in the order tried:
+#   group 1: a quote or double-quote escaped by a backslash
+#   group 2: a backslash and the character after it, if any, which are
+#	both kept as they are
+#   group 3: a quote or double-quote
+#   group 4: a run of other characters
+__SPACE_PIECES = re.compile(r"""\\(['"])|(\\.?)|(['"])|([^\\'"]+)""",
+                            re.DOTALL)
+
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 def __space_next_state(curr_state, curr_char):
@@ -151,6 +163,71 @@ def space_parse(input_str):
     Escaped quotes and double-quotes are added to the output but their
     escaping \ are removed.
 
+    The input is split into pieces by one compiled regular expression;
+    the results are those of the character by character
+    __space_parse_bychar().
+
+    Args:
+      input_str: string to parse.
+
+    Returns: list of parsed tokens.
+
+    Raises: N/A
+
+    """
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    pieces = []
+    outlist = []
+    squoteon = False
+    dquoteon = False
+    input_str = input_str.strip()
+
+    for esc_quote, esc_char, quote, chars in \
+        __SPACE_PIECES.findall(input_str):
+
+        # Unescaped quote, unless inside the other kind of quotes.
+        # Closing quotes end a word.
+        if ((quote == "'") and (not dquoteon)):
+            squoteon = not squoteon
+            if ((not squoteon) and pieces):
+                outlist.append("".join(pieces).strip())
+                pieces = []
+        elif ((quote == "\"") and (not squoteon)):
+            dquoteon = not dquoteon
+            if ((not dquoteon) and pieces):
+                outlist.append("".join(pieces).strip())
+                pieces = []
+
+        # Only the matching group is not empty.
+        else:
+            pieces.append(esc_quote or esc_char or quote or chars)
+
+    if ((squoteon) or (dquoteon)):
+        raise Exception("Unexpected unescaped quote found: " + input_str)
+
+    if (pieces):
+        outlist.append("".join(pieces).strip())
+
+    return (outlist)
+
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def __space_parse_bychar(input_str):
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    """ Parse an input string into words, accounting for whitespace
+        inside quoted (or double-quoted) strings, one character at a time.
+
+    The reference implementation of space_parse(), which must give the
+    same results.  Used only to test it.
+
+    Quotes and double-quotes can be escaped with a \.  Unescaped quotes
+    can be used inside double-quotes, and vice versa.
+
+    Unescaped quotes and double-quotes are removed from the output.
+
+    Escaped quotes and double-quotes are added to the output but their
+    escaping \ are removed.
+
     Args:
       input_str: string to parse.
 
@@ -313,44 +390,223 @@ def canaccess(filename, mode):
 
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-def exec_cmd_outputs_to_log(cmd, log,
-                            stdout_log_level=None, stderr_log_level=None,
-                            discard_stdout=False):
+def __terminator(pipe):
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-    """ Executes the given command and sends the stdout and stderr to log
-        files.
+    """ Return a callable terminating the process of pipe if it's still
+        running.
+    """
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def terminate():
+        """ Terminate the process, ignoring one which already exited """
+        if (pipe.poll() is None):
+            try:
+                pipe.terminate()
+            except OSError:
+                pass
+    return terminate
 
-    Args:
-      cmd: The command to execute.  The cmd is expected to have a suitable
-           format for calling Popen with shell=False, ie: the command and
-           its arguments should be in an array.
-      stdout_log_level: Logging level for the stdout of each command.  If
-               not specified, it will default to DEBUG
-      stderr_log_level: Logging level for the stderr of each command.  If
-               not specified, it will default to ERROR
-	  discard_stdout: If set to True, discard stdout
 
-    Returns:
-      The return value of the command executed.
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def __async_terminator(proc, loop):
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    """ Return a callable terminating the asyncio process proc if it's still
+        running.  The callable may be called from any thread: the process
+        is terminated from the event loop loop.
+    """
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def kill():
+        """ Terminate the process, ignoring one which already exited """
+        if (proc.returncode is None):
+            try:
+                proc.terminate()
+            except (OSError, ProcessLookupError):
+                pass
 
-    Raises: None
+    def terminate():
+        """ Schedule the termination in the event loop """
+        loop.call_soon_threadsafe(kill)
+    return terminate
 
+
+#
+# Number of bytes read from the output of a command at once.  Commands such
+# as pkg install -v or cpio print large bursts, which a bigger read takes in
+# fewer system calls.
+#
+CMD_OUTPUT_READ_SIZE = 65536
+
+
+class LineSplitter(object):
+    """ Incremental splitter of the output of a command into lines.
+
+        Lines end with a newline, a carriage return and a newline, or a
+        bare carriage return, like in the universal newlines mode of a pipe
+        opened as text.  The bytes fed are appended to a bytearray.  Each
+        complete line is decoded and returned once, and the consumed bytes
+        are removed from the front of the buffer once per feed(), so the
+        cost is linear in the size of the output however it is broken up
+        into reads.  The position up to which the buffer was searched for a
+        line end is kept, so a long line arriving in many reads isn't
+        searched again either.
+    """
+
+    # A carriage return ending the buffer may be followed by a newline,
+    # so the line it ends is only returned once the next byte is known.
+    _EOL = re.compile(b"\r\n|\r(?=.)|\n", re.DOTALL)
+
+    def __init__(self, encoding="utf-8"):
+        self.encoding = encoding
+        self._buf = bytearray()
+        self._searched = 0
+
+    def feed(self, data):
+        """ Add the bytes data.  Returns the list of the lines it
+            completed, without their line end.
+        """
+        buf = self._buf
+        buf.extend(data)
+        lines = []
+        start = 0
+        for match in self._EOL.finditer(buf, self._searched):
+            lines.append(buf[start:match.start()].decode(self.encoding,
+                                                         "replace"))
+            start = match.end()
+        if (start):
+            del buf[:start]
+        self._searched = len(buf)
+        if (buf.endswith(b"\r")):
+            self._searched -= 1
+        return lines
+
+    def flush(self):
+        """ Return the last line if it has no line end, or only a carriage
+            return, None if there is none.  The buffer is emptied.
+        """
+        if (not self._buf):
+            return None
+        if (self._buf.endswith(b"\r")):
+            del self._buf[-1:]
+        line = self._buf.decode(self.encoding, "replace")
+        del self._buf[:]
+        self._searched = 0
+        return line
+
+
+class LineRateLimiter(object):
+    """ Limit the number of lines logged per second for chatty commands.
+
+        Up to max_rate lines are let through in each one second window.
+        Past that, only one line out of every sample lines is let through
+        (none if sample is 0) and the others are counted.  The number of
+        lines suppressed in a window is reported once the window is over,
+        or when the output ends.
+    """
+
+    def __init__(self, max_rate, sample=0, clock=time.time):
+        self.max_rate = max_rate
+        self.sample = sample
+        self.clock = clock
+        self.suppressed = 0
+        self._window = None
+        self._count = 0
+        self._over = 0
+        self._dropped = 0
+
+    def admit(self):
+        """ Account for one more line.  Returns a tuple (admitted, report):
+            admitted is True if the line is to be logged, report is the
+            number of lines suppressed in the previous window if it just
+            ended, else 0.
+        """
+        now = self.clock()
+        report = 0
+        if (self._window is None or now - self._window >= 1.0):
+            report = self.report()
+            self._window = now
+            self._count = 0
+            self._over = 0
+        self._count += 1
+        if (self._count <= self.max_rate):
+            return (True, report)
+        self._over += 1
+        if (self.sample and (self._over - 1) % self.sample == 0):
+            return (True, report)
+        self._dropped += 1
+        self.suppressed += 1
+        return (False, report)
+
+    def report(self):
+        """ Return the number of lines suppressed since the last report """
+        dropped = self._dropped
+        self._dropped = 0
+        return dropped
+
+
+class CmdOutputLogger(object):
+    """ Log the lines of one output stream of a command.
+
+        The lines go to the logger log at level, or to the transfer log
+        if log is None: stdout lines are written with write_log(),
+        stderr lines with write_dbg() at the error level.  An optional
+        LineRateLimiter thins out very chatty output.
+    """
+
+    def __init__(self, log, level, is_stderr=False, limiter=None):
+        self.log = log
+        self.level = level
+        self.is_stderr = is_stderr
+        self.limiter = limiter
+        self.splitter = LineSplitter()
+
+    def write(self, line):
+        """ Log the line line """
+        if (self.log is not None):
+            self.log.log(self.level, line)
+        elif (self.is_stderr):
+            logsvc.write_dbg(TRANSFER_ID, logsvc.LS_DBGLVL_ERR, line + "\n")
+        else:
+            logsvc.write_log(TRANSFER_ID, line + "\n")
+
+    def __report(self, dropped):
+        """ Log the number of lines the limiter suppressed """
+        if (dropped):
+            self.write("... %d lines of output suppressed" % dropped)
+
+    def feed(self, data):
+        """ Log the complete lines of the bytes data """
+        for line in self.splitter.feed(data):
+            if (self.limiter is None):
+                self.write(line)
+                continue
+            admitted, dropped = self.limiter.admit()
+            self.__report(dropped)
+            if (admitted):
+                self.write(line)
+
+    def close(self):
+        """ Log the rest of the output once it ended """
+        line = self.splitter.flush()
+        if (line is not None):
+            self.write(line)
+        if (self.limiter is not None):
+            self.__report(self.limiter.report())
+
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def __cmd_output_loggers(cmd, log, stdout_log_level, stderr_log_level,
+                         max_line_rate, sample_lines):
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    """ Log the command cmd about to be executed, and return the
+        CmdOutputLogger of its stdout and stderr.
     """
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
     if (stdout_log_level is None):
         stdout_log_level = DEBUG
-	
+
     if (stderr_log_level is None):
         stderr_log_level = ERROR
 
-    #
-    # number of bytes to read at once.  There's no particular
-    # reason for picking this number, just pick a bigger
-    # value so we don't need to have multiple reads for large output
-    #
-    buf_size = 8192
-
     #
     # log CLI command to be invoked along with all parameters.
     # If the whole command is too long, print additional blank line
@@ -367,105 +623,364 @@ def exec_cmd_outputs_to_log(cmd, log,
     else:
         logsvc.write_log(TRANSFER_ID, log_msg + "\n")
 
+    #
+    # Only stdout is rate limited: the errors of a command are always
+    # logged in full.
+    #
+    limiter = None
+    if (max_line_rate):
+        limiter = LineRateLimiter(max_line_rate, sample_lines)
+
+    return (CmdOutputLogger(log, stdout_log_level, limiter=limiter),
+            CmdOutputLogger(log, stderr_log_level, is_stderr=True))
+
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def exec_cmd_outputs_to_log(cmd, log,
+                            stdout_log_level=None, stderr_log_level=None,
+                            discard_stdout=False, cancel=None,
+                            max_line_rate=None, sample_lines=0):
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    """ Executes the given command and sends the stdout and stderr to log
+        files.
+
+    Args:
+      cmd: The command to execute.  The cmd is expected to have a suitable
+           format for calling Popen with shell=False, ie: the command and
+           its arguments should be in an array.
+      stdout_log_level: Logging level for the stdout of each command.  If
+               not specified, it will default to DEBUG
+      stderr_log_level: Logging level for the stderr of each command.  If
+               not specified, it will default to ERROR
+      discard_stdout: If set to True, discard stdout
+      cancel: Optional cancellation token, such as a
+               transfer_mod.CancelToken.  The command is terminated as soon
+               as the token is cancelled.
+      max_line_rate: Optional maximum number of stdout lines logged per
+               second.  The number of lines suppressed is logged instead.
+      sample_lines: When max_line_rate is exceeded, still log one line
+               out of every sample_lines lines.  0 logs none of them.
+
+    Returns:
+      The return value of the command executed.
+
+    Raises: None
+
+    """
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    stdout_logger, stderr_logger = __cmd_output_loggers(cmd, log,
+        stdout_log_level, stderr_log_level, max_line_rate, sample_lines)
+
     pipe = Popen(cmd, stdout=PIPE, stderr=PIPE, stdin=PIPE,
-                 universal_newlines=True,
                  shell=False, close_fds=True)
-    (child_stdout, child_stderr) = (pipe.stdout, pipe.stderr)
 
-    out_fd = child_stdout.fileno()
-    err_fd = child_stderr.fileno()
+    terminate = None
+    if (cancel is not None):
+        terminate = __terminator(pipe)
+        cancel.add_callback(terminate)
 
     #
     # Some commands produce multiple output messages on the same line.
     # For those cases, we don't want to log the output we read immediately
     # because it will destroy the original formatting of the output
-    # and make it difficult to read. We use two
-    # buffers to store output or error from commands.  We will
-    # only write a log record for them when we get a trailing newline
-    # on the output/error
+    # and make it difficult to read.  The loggers only write a log record
+    # once they got a line end.  Both streams are read until they
+    # are closed, so no output is lost when one closes before the other.
     #
-    stdout_buf = ""
-    stderr_buf = ""
-    fl_cmd_finished = False
-
-    while not fl_cmd_finished:
-        ifd, ofd, efd = select.select([out_fd, err_fd], [], [])
+    out_fd = pipe.stdout.fileno()
+    readers = {out_fd: stdout_logger,
+               pipe.stderr.fileno(): stderr_logger}
 
-        if err_fd in ifd:
-            # something available from stderr of the command
-            output = os.read(err_fd, buf_size)
+    while readers:
+        ifd, ofd, efd = select.select(list(readers), [], [])
 
-            # Store the output we just read in the buffer.
-            # Examine the buffer and if it contains whole lines,
-            # extract and log them right now, so that smooth
-            # progress report from invoked command is provided.
-            stderr_buf = stderr_buf + output.decode()
+        for fd in ifd:
+            output = os.read(fd, CMD_OUTPUT_READ_SIZE)
 
+            # Process closed the stream - no more data to be read.
+            # Write the rest of the buffer
             if not output:
-                fl_cmd_finished = True
+                if fd != out_fd or not discard_stdout:
+                    readers[fd].close()
+                del readers[fd]
+            elif fd != out_fd or not discard_stdout:
+                readers[fd].feed(output)
 
-            while stderr_buf.find("\n") != -1:
-                new_line_pos = stderr_buf.find("\n")
+    pipe.stdout.close()
+    pipe.stderr.close()
+    retval = pipe.wait()
+    if (terminate is not None):
+        cancel.remove_callback(terminate)
+    return retval
 
-                if log is not None:
-                    log.log(stderr_log_level,
-                            stderr_buf[0:new_line_pos])
-                else:
-                    logsvc.write_dbg(TRANSFER_ID,
-                                 logsvc.LS_DBGLVL_ERR,
-                                 stderr_buf[0:new_line_pos + 1])
 
-                stderr_buf = stderr_buf[new_line_pos + 1:]
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+async def __pump_output(stream, logger):
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    """ Feed the asyncio stream stream to logger until it is closed.
+        logger may be None to discard the stream.
+    """
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    while True:
+        output = await stream.read(CMD_OUTPUT_READ_SIZE)
+        if not output:
+            break
+        if logger is not None:
+            logger.feed(output)
+    if logger is not None:
+        logger.close()
 
-            # Process has terminated - no more data to be read.
-            # Write the rest of the buffer
-            if fl_cmd_finished and len(stderr_buf) > 0:
-                if log is not None:
-                    log.log(stderr_log_level, stderr_buf)
-                else:
-                    logsvc.write_dbg(TRANSFER_ID,
-                                     logsvc.LS_DBGLVL_ERR,
-                                     stderr_buf + "\n")
-
-        if out_fd in ifd:
-            # something available from stdout of the command
-            output = os.read(out_fd, buf_size)
 
-            if not output:
-                fl_cmd_finished = True
-        
-            # if stdout is to be discarded, skip the logging step
-            if discard_stdout:
-                continue
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+async def exec_cmd_outputs_to_log_async(cmd, log,
+                                        stdout_log_level=None,
+                                        stderr_log_level=None,
+                                        discard_stdout=False, cancel=None,
+                                        max_line_rate=None, sample_lines=0):
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    """ Coroutine version of exec_cmd_outputs_to_log(), taking the same
+        arguments.  Awaiting several of them in one event loop pumps the
+        output of several commands concurrently from a single thread.
 
-            # Store the output we just read in the buffer.
-            # Examine the buffer and if it contains whole lines,
-            # extract and log them right now, so that smooth
-            # progress report from invoked command is provided.
-            stdout_buf = stdout_buf + output.decode()
+    Returns:
+      The return value of the command executed.
 
-            while stdout_buf.find("\n") != -1:
-                new_line_pos = stdout_buf.find("\n")
+    Raises: None
 
-                if log is not None:
-                    log.log(stdout_log_level,
-                            stdout_buf[0:new_line_pos])
-                else:
-                    logsvc.write_log(TRANSFER_ID,
-                                 stdout_buf[0:new_line_pos + 1])
+    """
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
-                stdout_buf = stdout_buf[new_line_pos + 1:]
+    stdout_logger, stderr_logger = __cmd_output_loggers(cmd, log,
+        stdout_log_level, stderr_log_level, max_line_rate, sample_lines)
+    if discard_stdout:
+        stdout_logger = None
 
-            # Process has terminated - no more data to be read.
-            # Write the rest of the buffer
-            if fl_cmd_finished and len(stdout_buf) > 0:
-                if log is not None:
-                    log.log(stdout_log_level, stdout_buf)
-                else:
-                    logsvc.write_log(TRANSFER_ID,
-                                     stdout_buf + "\n")
+    proc = await asyncio.create_subprocess_exec(*cmd, stdout=PIPE,
+                                                stderr=PIPE, stdin=PIPE,
+                                                close_fds=True)
+
+    terminate = None
+    if (cancel is not None):
+        terminate = __async_terminator(proc, asyncio.get_event_loop())
+        cancel.add_callback(terminate)
+
+    try:
+        await asyncio.gather(__pump_output(proc.stdout, stdout_logger),
+                             __pump_output(proc.stderr, stderr_logger))
+        retval = await proc.wait()
+    finally:
+        if (terminate is not None):
+            cancel.remove_callback(terminate)
+    return retval
+
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def exec_cmds_outputs_to_log(cmds, log, **kwargs):
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    """ Executes the given commands concurrently and sends their stdout and
+        stderr to log files.  The outputs are all pumped by an event loop
+        in the calling thread.
+
+    Args:
+      cmds: List of the commands to execute, each in the format expected
+           by exec_cmd_outputs_to_log().
+      log, kwargs: As for exec_cmd_outputs_to_log(), applied to each
+           command.
+
+    Returns:
+      The list of the return values of the commands, in the order of cmds.
+
+    Raises: None
+
+    """
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    async def run_all():
+        """ Run every command and wait for all of them """
+        return await asyncio.gather(*[exec_cmd_outputs_to_log_async(cmd,
+                                      log, **kwargs) for cmd in cmds])
+
+    loop = asyncio.new_event_loop()
+    try:
+        asyncio.set_event_loop(loop)
+        return list(loop.run_until_complete(run_all()))
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
+class WalkEntry(object):
+    """ A pathname found by walk_tree().
+
+    Attributes:
+      path: pathname, rooted at the directory passed to walk_tree()
+      name: last component of the pathname
+      ino: inode number
+      ftype: file type bits, as returned by stat.S_IFMT()
+      size: size in bytes, or None if the entry wasn't stat'ed
+      dev: device id, or None if the entry wasn't stat'ed
+      mode: full st_mode, or None if the entry wasn't stat'ed
+      mtime: modification time in nanoseconds, or None if the entry
+        wasn't stat'ed
+    """
+    def __init__(self, path, name, ino, ftype, size=None, dev=None,
+                 mode=None, mtime=None):
+        self.path = path
+        self.name = name
+        self.ino = ino
+        self.ftype = ftype
+        self.size = size
+        self.dev = dev
+        self.mode = mode
+        self.mtime = mtime
+
+    def is_dir(self):
+        """ True if the entry is a proper directory (not a link) """
+        return self.ftype == stat.S_IFDIR
+
+    def is_reg(self):
+        """ True if the entry is a regular file """
+        return self.ftype == stat.S_IFREG
+
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def __walk_entry(dirent, need_stat):
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    """ Build a WalkEntry from an os.scandir() DirEntry.  (Private function)
+
+    The inode number and the file type come from the directory entry
+    itself (d_ino and d_type) when possible, so no stat is done unless
+    need_stat is set or the platform doesn't provide d_type.  When a stat
+    is needed, the one cached by the DirEntry is used.
+
+    Args:
+      dirent: os.DirEntry to convert
+
+      need_stat: When True, lstat the entry to fill in size and dev
+
+    Returns: WalkEntry
+
+    Raises: OSError from lstat
 
-    return (pipe.wait())
+    """
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    if (not need_stat):
+        if (dirent.is_dir(follow_symlinks=False)):
+            ftype = stat.S_IFDIR
+        elif (dirent.is_file(follow_symlinks=False)):
+            ftype = stat.S_IFREG
+        elif (dirent.is_symlink()):
+            ftype = stat.S_IFLNK
+        else:
+            # Special file, or no d_type available.  Need to stat.
+            need_stat = True
+        if (not need_stat):
+            return WalkEntry(dirent.path, dirent.name, dirent.inode(), ftype)
+
+    stat_out = dirent.stat(follow_symlinks=False)
+    return WalkEntry(dirent.path, dirent.name, stat_out.st_ino,
+                     stat.S_IFMT(stat_out.st_mode), stat_out.st_size,
+                     stat_out.st_dev, stat_out.st_mode, stat_out.st_mtime_ns)
+
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def walk_tree(rootpath, same_fs=False, need_stat=False, onerror=None,
+              prune=None, sort_names=False):
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    """ Walk the tree under rootpath, in a single pass, with os.scandir().
+
+    Symbolic links are never followed.  A directory is returned before
+    the entries it contains.  The entries of a directory which are not
+    directories are returned first, then each subdirectory followed by
+    its contents, which is the order find(1) uses.  rootpath itself is
+    not returned.
+
+    The inode number and file type of each entry come from the directory
+    entry when the platform provides them, so walking a tree doesn't cost
+    a stat per file.  Directories are stat'ed when same_fs is set, all
+    entries are stat'ed when need_stat is set; in both cases the stat
+    cached by os.scandir() is reused.
+
+    Args:
+      rootpath: directory to walk.
+
+      same_fs: When True, don't descend into directories which are on a
+        different filesystem than rootpath.  Such directories (mount
+        points) are still returned.  This emulates nftw(..., FTW_MOUNT).
+
+      need_stat: When True, fill in size, dev, mode and mtime for every
+        entry.
+
+      onerror: Called with the OSError when a directory can't be read,
+        or an entry can't be stat'ed.  The directory or entry is skipped.
+        When None, such errors are ignored.
+
+      prune: Called with each directory WalkEntry.  When it returns True,
+        the directory is returned but not descended into.
+
+      sort_names: When True, the entries of each directory are returned
+        sorted by name, and each subdirectory is followed by its
+        contents right away.  Pathnames then come out in the order of
+        their lists of components, which makes the output of two walks
+        easy to compare.
+
+    Returns: generator of WalkEntry objects
+
+    Raises: OSError from stat'ing rootpath when same_fs is set.
+
+    """
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    root_dev = None
+    if (same_fs):
+        root_dev = os.stat(rootpath).st_dev
+
+    # Each item is an entry to return along with the directory to
+    # walk afterwards, if any.
+    stack = [(None, rootpath)]
+    while stack:
+        entry, top = stack.pop()
+        if (entry is not None):
+            yield entry
+        if (top is None):
+            continue
+
+        pending = []
+        try:
+            dir_iter = os.scandir(top)
+        except OSError as err:
+            if (onerror is not None):
+                onerror(err)
+            continue
+
+        with dir_iter:
+            for dirent in dir_iter:
+                try:
+                    is_dir = dirent.is_dir(follow_symlinks=False)
+                    entry = __walk_entry(dirent,
+                                         need_stat or (same_fs and is_dir))
+                except OSError as err:
+                    if (onerror is not None):
+                        onerror(err)
+                    continue
+
+                # Emulate nftw(..., FTW_MOUNT) for directories.
+                if ((not entry.is_dir()) or
+                    (same_fs and entry.dev != root_dev) or
+                    (prune is not None and prune(entry))):
+                    if (sort_names):
+                        pending.append((entry, None))
+                    else:
+                        yield entry
+                    continue
+                pending.append((entry, entry.path))
+
+        if (sort_names):
+            pending.sort(key=lambda item: item[0].name)
+
+        # Push in reverse so entries are visited in order.
+        pending.reverse()
+        stack.extend(pending)
 
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
@@ -544,40 +1059,40 @@ def find(rootpaths, path_type=None, raise_errors=False):
                 rlist.append(rootpath)
             continue
 
-        for path, subdirs, files in os.walk(rootpath, True,
-                                            error_handler):
+        # Nothing is under a rootpath which is not a proper directory,
+        # if path_type == "dir".  (Links to directories aren't walked.)
+        elif (not stat.S_ISDIR(stat_out.st_mode)):
+            continue
 
-            # Take the path if we're taking everything, or if
-            # path_type == dir and path is a proper directory (not link)
+        rlist.append(rootpath)
+        for entry in walk_tree(rootpath, onerror=error_handler):
+            # Take the path if we're taking everything, or if it
+            # matches the type asked for.  Links are neither
+            # directories nor files.
             if ((path_type is None) or
-                ((path_type == "dir") and
-                (stat.S_ISDIR(stat_out.st_mode)))):
-                rlist.append(path)
+                ((path_type == "dir") and entry.is_dir()) or
+                ((path_type == "file") and entry.is_reg())):
+                rlist.append(entry.path)
+    return rlist
 
-            # Only the directory is desired.
-            if (path_type == "dir"):
-                continue
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def __round_size(size):
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    """ Round a size up to the next multiple of 1024.  (Private function)
 
-            # If names listed in subdirs are not directories (e.g.
-            # they are symlinks), append them if path_type is None,
-            # like what find(1) does.  If they are dirs, then
-            # os.walk will get them on the next pass.
-            if (path_type is None):
-                for subdir in subdirs:
-                    fullname = path + "/" + subdir
-                    stat_out = os.lstat(fullname)
-                    if (not stat.S_ISDIR(stat_out.st_mode)):
-                        rlist.append(fullname)
-
-            for one_file in files:
-                fullname = path + "/" + one_file
-                # Check for a proper file if (path_type == "file")
-                if (path_type == "file"):
-                    stat_out = os.lstat(fullname)
-                    if (not stat.S_ISREG(stat_out.st_mode)):
-                        continue
-                rlist.append(fullname)
-    return rlist
+    Args:
+      size: size in bytes
+
+    Returns: rounded size in bytes
+
+    Raises: N/A
+
+    """
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    if (size % 1024 == 0):
+        return size
+    else:
+        return (((size // 1024) + 1) * 1024)
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 def file_size(filename):
@@ -609,12 +1124,26 @@ def file_size(filename):
     # here because that call follows symlinks, which is not
     # what we want to do. Use os.lstat() so symlinks are not
     # followed
-    stat = os.lstat(filename)
+    return __round_size(os.lstat(filename).st_size)
 
-    if (stat.st_size % 1024 == 0):
-        return stat.st_size
-    else:
-        return (((stat.st_size / 1024) + 1) * 1024)
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def __dir_size_error_handler(err):
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    """ Error handler for dir_size() below.  Prints the error.
+
+    Args:
+      err: OSError raised while walking the directory
+
+    Returns: None
+
+    Raises: N/A
+
+    """
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    # No need to exit because can't get size of
+    # a file/dir, just print an error and continue
+    print(("Error getting information about " + str(err.filename)),
+          file=sys.stderr)
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 def dir_size(rootpath):
@@ -654,20 +1183,11 @@ def dir_size(rootpath):
         # This indicates the root directory is not valid
         raise Exception(rootpath + "is not valid")
 
-    for root, subdirs, files in os.walk(rootpath):
-        # There's no need to distinguish between directories and
-        # files in the size calculation, merge the subdirs list
-        # and files list to make rest of the code simpler.
-        for filename in (files + subdirs):
-            abs_filename = root + "/" + filename
-            try:
-                size += file_size(abs_filename)
-            except OSError:
-                # No need to exit because can't get size of
-                # a file/dir, just print an error and continue
-                print(("Error getting information about "
-                     + abs_filename), file=sys.stderr)
-                continue
+    # There's no need to distinguish between directories and
+    # files in the size calculation.
+    for entry in walk_tree(rootpath, need_stat=True,
+                           onerror=__dir_size_error_handler):
+        size += __round_size(entry.size)
 
     return (size)
 
@@ -0,0 +1,102 @@
+#!/usr/bin/python
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+# Copyright (c) 2010, Oracle and/or its affiliates. All rights reserved.
+#
+# Compare the cost of splitting the output of a chatty command into log
+# lines the way exec_cmd_outputs_to_log() used to (string slicing at every
+# newline) with install_utils.LineSplitter, then time the logging of the
+# output of several such commands, one after the other and concurrently.
+#
+# usage: bench_cmd_output.py [<lines> [<commands>]]
+#
+import sys
+import time
+
+from osol_install.install_utils import LineSplitter, \
+    exec_cmd_outputs_to_log, exec_cmds_outputs_to_log
+
+# Size of the reads of the old implementation
+OLD_READ_SIZE = 8192
+
+
+class NullLog(object):
+    """Logger counting the records it is given"""
+    def __init__(self):
+        self.records = 0
+
+    def log(self, level, msg):
+        self.records += 1
+
+
+def split_old(data):
+    """Split like the old exec_cmd_outputs_to_log()"""
+    nlines = 0
+    buf = ""
+    for idx in range(0, len(data), OLD_READ_SIZE):
+        buf = buf + data[idx:idx + OLD_READ_SIZE].decode()
+        while buf.find("\n") != -1:
+            new_line_pos = buf.find("\n")
+            nlines += 1
+            buf = buf[new_line_pos + 1:]
+    return nlines
+
+
+def split_new(data):
+    """Split with LineSplitter, in reads of the same size"""
+    nlines = 0
+    splitter = LineSplitter()
+    for idx in range(0, len(data), OLD_READ_SIZE):
+        nlines += len(splitter.feed(data[idx:idx + OLD_READ_SIZE]))
+    return nlines
+
+
+def timed(func, *args):
+    """Return the result of func(*args) and the seconds it took"""
+    start = time.time()
+    result = func(*args)
+    return result, time.time() - start
+
+
+if len(sys.argv) > 3:
+    print("usage: %s [<lines> [<commands>]]" % sys.argv[0])
+    sys.exit(1)
+nlines = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+ncmds = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+
+# Short lines, like the ones of pkg install -v or cpio -v
+data = b"".join([b"file usr/share/man/man1/f%d.1\n" % i
+                 for i in range(nlines)])
+for name, func in (("old", split_old), ("new", split_new)):
+    count, elapsed = timed(func, data)
+    print("%-4s split: %d lines, %.3f seconds" % (name, count, elapsed))
+
+cmd = [sys.executable, "-c",
+       "import sys; sys.stdout.write('line of output\\n' * %d)" % nlines]
+log = NullLog()
+elapsed = timed(lambda: [exec_cmd_outputs_to_log(cmd, log)
+                         for i in range(ncmds)])[1]
+print("%d commands one after the other: %d records, %.3f seconds" %
+      (ncmds, log.records, elapsed))
+log = NullLog()
+elapsed = timed(exec_cmds_outputs_to_log, [cmd] * ncmds, log)[1]
+print("%d commands concurrently: %d records, %.3f seconds" %
+      (ncmds, log.records, elapsed))
@@ -0,0 +1,134 @@
+#!/usr/bin/python
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+# Copyright (c) 2010, Oracle and/or its affiliates. All rights reserved.
+#
+# Compare the read throughput of the files of a tree in the orders the
+# cpio file lists can be sorted in, and in the order of the scan.
+#
+# usage: bench_flist_order.py [-c <command>] [-s <sort file>] <directory>
+#
+# Every file is read in full, in each order in turn.  Unless the tree is
+# much larger than memory, the later passes read from the cache: give a
+# command which empties it with -c, for instance one unmounting and
+# mounting the source again, or on Linux
+#     "sync; echo 3 > /proc/sys/vm/drop_caches"
+# It runs before each pass.  -s adds the order of a sort file, pathnames
+# relative to <directory>.
+#
+import getopt
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from osol_install.install_utils import walk_tree
+from osol_install.transfer_flist import FlistSorter, flist_order, \
+    ORDER_INODE, ORDER_PATH, ORDER_SIZE, ORDER_DIRECTORY, ORDER_SORT_FILE
+
+# Size of the reads
+READ_SIZE = 1048576
+
+
+def file_list(top, order):
+    """Return a temporary file holding the pathnames of the regular
+       files under top, relative to top, sorted by order, or in scan
+       order if order is None.
+       """
+    handle = tempfile.TemporaryFile(mode="w+")
+    sorter = FlistSorter(run_dir=tempfile.gettempdir(), order=order)
+    for entry in walk_tree(top, same_fs=True, need_stat=True):
+        if not entry.is_reg():
+            continue
+        path = entry.path[len(top):].lstrip("/")
+        if order is None:
+            handle.write(path + "\n")
+        else:
+            sorter.add(entry.ino, path, entry.size)
+    if order is not None:
+        sorter.write(handle)
+    handle.seek(0)
+    return handle
+
+
+def read_files(top, handle):
+    """Read every file listed in handle.  Returns the number of files
+       and bytes read.
+       """
+    nfiles = 0
+    nbytes = 0
+    for line in handle:
+        try:
+            fd = os.open(os.path.join(top, line[:-1]), os.O_RDONLY)
+        except OSError:
+            continue
+        try:
+            while True:
+                data = os.read(fd, READ_SIZE)
+                if not data:
+                    break
+                nbytes += len(data)
+        finally:
+            os.close(fd)
+        nfiles += 1
+    return nfiles, nbytes
+
+
+try:
+    opts, args = getopt.getopt(sys.argv[1:], "c:s:")
+except getopt.GetoptError:
+    args = []
+if len(args) != 1 or not os.path.isdir(args[0]):
+    print("usage: %s [-c <command>] [-s <sort file>] <directory>" %
+          sys.argv[0])
+    sys.exit(1)
+top = os.path.abspath(args[0])
+drop_cmd = None
+sort_file = None
+for opt, val in opts:
+    if opt == "-c":
+        drop_cmd = val
+    else:
+        sort_file = val
+
+orders = [("scan", None)]
+for name in (ORDER_INODE, ORDER_PATH, ORDER_SIZE, ORDER_DIRECTORY):
+    orders.append((name, flist_order(name)))
+if sort_file is not None:
+    orders.append((ORDER_SORT_FILE, flist_order(ORDER_SORT_FILE, sort_file)))
+if drop_cmd is None:
+    print("No -c command, the passes after the first may read from the "
+          "cache")
+
+for name, order in orders:
+    start = time.time()
+    handle = file_list(top, order)
+    list_seconds = time.time() - start
+    if drop_cmd is not None:
+        subprocess.call(drop_cmd, shell=True)
+    start = time.time()
+    nfiles, nbytes = read_files(top, handle)
+    seconds = time.time() - start
+    handle.close()
+    print("%-9s list: %.3f seconds, read: %d files, %d MB, %.3f seconds, "
+          "%.1f MB/s" % (name, list_seconds, nfiles, nbytes // 1048576,
+                         seconds, nbytes / 1048576.0 / max(seconds, 1e-6)))
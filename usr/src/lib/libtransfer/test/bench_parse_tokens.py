@@ -0,0 +1,111 @@
+#!/usr/bin/python
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+# Copyright (c) 2010, Oracle and/or its affiliates. All rights reserved.
+#
+#
+# Compare the speed of the tokenizers of ENParser.parse_nodepath() and
+# install_utils.space_parse() with the character by character parsers
+# they replaced, and with compile_nodepath() once its cache is warm.
+#
+# usage: bench_parse_tokens.py [<manifest> [<rounds>]]
+#
+# The nodepaths parsed are those of every element and attribute of the
+# manifest, plus bracketed and valued forms of them; the strings given
+# to space_parse() are the element and attribute values.  Without a
+# manifest, a few typical strings are used.
+#
+import sys
+import time
+
+import osol_install.ENParser as ENParser
+import osol_install.install_utils as install_utils
+from osol_install.TreeAcc import TreeAcc
+
+NODEPATHS = ["img_params/output_image/boot_archive/compression/level",
+    "img_params/packages/pkg[name=\"SUNWcs\"]",
+    "img_params/pkg_repo_default_authority/main[authname='opensolaris.org']"
+    "/url", "img_params/distro_name=OpenSolaris", "../name"]
+VALUES = ["SUNWcs", "\"OpenSolaris 2010.03\"",
+    "'en_US.UTF-8' 'fr_FR.UTF-8' \"de_DE.UTF-8\"",
+    "img_params/packages/pkg img_params/packages/post_install_remove_pkg"]
+
+def manifest_strings(manifest):
+	"""Return the nodepaths and values of the nodes of a manifest"""
+	tree = TreeAcc(manifest)
+	nodepaths = []
+	values = []
+	walker = tree.get_tree_walker()
+	while True:
+		cluster = tree.walk_tree(walker)
+		if cluster is None:
+			break
+		for node in cluster:
+			path = node.get_path()
+			value = node.get_value()
+			if not path:
+				continue
+			nodepaths.append(path)
+			if value:
+				values.append(value)
+				if "\"" not in value:
+					nodepaths.append(path + "=\"" + value + "\"")
+					parent, sep, name = path.rpartition("/")
+					if parent:
+						nodepaths.append(parent + "[" + name +
+						    "=\"" + value + "\"]/" + name)
+	return nodepaths, values
+
+def bench(name, func, strings, rounds):
+	"""Run func on every string rounds times, print the time taken"""
+	for string in strings:
+		try:
+			func(string)
+		except Exception:
+			pass
+	start = time.time()
+	for i in range(rounds):
+		for string in strings:
+			try:
+				func(string)
+			except Exception:
+				pass
+	seconds = time.time() - start
+	print("%-22s %8.2f us/string" % (name,
+	    seconds * 1000000 / max(1, rounds * len(strings))))
+
+if len(sys.argv) > 1:
+	nodepaths, values = manifest_strings(sys.argv[1])
+else:
+	nodepaths, values = NODEPATHS, VALUES
+rounds = 100
+if len(sys.argv) > 2:
+	rounds = int(sys.argv[2])
+
+print("%d nodepaths, %d values, %d rounds" % (len(nodepaths), len(values),
+    rounds))
+bench("parse_nodepath bychar", ENParser.__parse_nodepath_bychar, nodepaths,
+    rounds)
+bench("parse_nodepath", ENParser.parse_nodepath, nodepaths, rounds)
+bench("compile_nodepath", ENParser.compile_nodepath, nodepaths, rounds)
+bench("space_parse bychar", install_utils.__space_parse_bychar, values,
+    rounds)
+bench("space_parse", install_utils.space_parse, values, rounds)
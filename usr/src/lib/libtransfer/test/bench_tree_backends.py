@@ -0,0 +1,89 @@
+#!/usr/bin/python
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+# Copyright (c) 2010, Oracle and/or its affiliates. All rights reserved.
+#
+#
+# Compare the load time, memory and search speed of the TreeAcc backends
+# on a manifest.
+#
+# usage: bench_tree_backends.py <manifest> [<rounds>]
+#
+# Memory is the peak of the Python allocations while the tree is loaded,
+# as tracemalloc counts them.  The searches are those of the path of
+# every element and attribute of the manifest, plus a bracketed form of
+# the valued ones, and are run <rounds> times (10 by default).
+#
+import sys
+import time
+import tracemalloc
+
+from osol_install.TreeAcc import TreeAcc
+from osol_install.TreeAccBackend import BACKENDS
+
+def manifest_queries(tree):
+	"""Return the nodepaths of the nodes of a tree"""
+	queries = []
+	walker = tree.get_tree_walker()
+	while True:
+		cluster = tree.walk_tree(walker)
+		if cluster is None:
+			break
+		for node in cluster:
+			path = node.get_path()
+			value = node.get_value()
+			if not path:
+				continue
+			queries.append(path)
+			parent, sep, name = path.rpartition("/")
+			if parent and value and "\"" not in value:
+				queries.append(parent + "[" + name + "=\"" +
+				    value + "\"]/" + name)
+	return queries
+
+if len(sys.argv) < 2:
+	print("usage: %s <manifest> [<rounds>]" % sys.argv[0])
+	sys.exit(1)
+manifest = sys.argv[1]
+rounds = 10
+if len(sys.argv) > 2:
+	rounds = int(sys.argv[2])
+
+queries = manifest_queries(TreeAcc(manifest))
+print("%d queries, %d rounds" % (len(queries), rounds))
+for backend in sorted(BACKENDS):
+	start = time.time()
+	TreeAcc(manifest, backend)
+	load_seconds = time.time() - start
+
+	tracemalloc.start()
+	tree = TreeAcc(manifest, backend)
+	peak = tracemalloc.get_traced_memory()[1]
+	tracemalloc.stop()
+
+	start = time.time()
+	for i in range(rounds):
+		for query in queries:
+			tree.find_node(query)
+	seconds = time.time() - start
+	print("%-12s load: %8.2f ms, memory: %8.1f KB, search: %8.2f "
+	    "us/query" % (backend, load_seconds * 1000, peak / 1024.0,
+	    seconds * 1000000 / max(1, rounds * len(queries))))
@@ -0,0 +1,142 @@
+#!/usr/bin/python
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+# Copyright (c) 2010, Oracle and/or its affiliates. All rights reserved.
+#
+# Compare the cost of scanning a tree the way the cpio file list builder
+# used to (os.walk, then lstat every file and stat every directory) with
+# install_utils.walk_tree().
+#
+# usage: bench_tree_walk.py <directory>
+#
+# Each scan runs in its own process.  When truss(1) or strace(1) is
+# available the scan runs under it and the total number of system calls
+# is reported, otherwise only the stat calls made by the scan itself are
+# counted.
+#
+import os
+import re
+import subprocess
+import sys
+import time
+
+from osol_install.install_utils import walk_tree
+
+
+def scan_old(top):
+    """Scan like the old build_cpio_entire_file_list()"""
+    nentries = 0
+    nstats = 0
+    top_dev = os.stat(top).st_dev
+    for root, dirs, files in os.walk(top):
+        for name in files:
+            try:
+                os.lstat(root + "/" + name)
+            except OSError:
+                pass
+            nstats += 1
+            nentries += 1
+        rmlist = []
+        for name in dirs:
+            nstats += 1
+            try:
+                st1 = os.stat(root + "/" + name)
+            except OSError:
+                rmlist.append(name)
+                continue
+            nentries += 1
+            if st1.st_dev != top_dev:
+                rmlist.append(name)
+        for name in rmlist:
+            dirs.remove(name)
+    return nentries, nstats
+
+
+def scan_new(top):
+    """Scan with walk_tree(), like the file list builder does now"""
+    nentries = 0
+    nstats = 0
+    for entry in walk_tree(top, same_fs=True):
+        nentries += 1
+        # walk_tree only fills in dev for entries it had to stat
+        if entry.dev is not None:
+            nstats += 1
+    return nentries, nstats
+
+
+def find_tracer():
+    """Return the command prefix used to count system calls"""
+    for tracer in (["/usr/bin/truss", "-c", "-f"],
+                   ["/usr/bin/strace", "-c", "-f", "-q"]):
+        if os.access(tracer[0], os.X_OK):
+            return tracer
+    return None
+
+
+def total_syscalls(output):
+    """Extract the total number of calls from truss/strace -c output"""
+    # truss: "sys totals:    .123    45678    12"
+    match = re.search(r"sys totals:\s+\S+\s+(\d+)", output)
+    if match is None:
+        # strace: "100.00    0.123456     1   45678   12 total"
+        match = re.search(r"^\s*100\.00\s+\S+\s+(?:\S+\s+)?(\d+)\s+"
+                          r"(?:\d+\s+)?total", output, re.M)
+    if match is None:
+        return None
+    return int(match.group(1))
+
+
+def run_scan(mode, top, tracer):
+    """Run one scan in a child process and print its results"""
+    cmd = [sys.executable, os.path.abspath(__file__), "--scan", mode, top]
+    if tracer is not None:
+        cmd = tracer + cmd
+    pipe = subprocess.Popen(cmd, stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE, universal_newlines=True)
+    out, err = pipe.communicate()
+    nentries, nstats, elapsed = out.split()
+    print("%-4s scan: %s entries, %s stat calls, %s seconds" %
+          (mode, nentries, nstats, elapsed))
+    if tracer is not None:
+        print("          %s system calls in total" % total_syscalls(err))
+
+
+if len(sys.argv) == 4 and sys.argv[1] == "--scan":
+    start = time.time()
+    if sys.argv[2] == "old":
+        result = scan_old(sys.argv[3])
+    else:
+        result = scan_new(sys.argv[3])
+    print(result[0], result[1], "%.3f" % (time.time() - start))
+    sys.exit(0)
+
+if len(sys.argv) != 2 or not os.path.isdir(sys.argv[1]):
+    print("usage: %s <directory>" % sys.argv[0])
+    sys.exit(1)
+
+tracer = find_tracer()
+if tracer is None:
+    print("No truss or strace found, only counting stat calls")
+
+# Warm up the caches so both scans see the same state.
+scan_new(sys.argv[1])
+run_scan("old", sys.argv[1], tracer)
+run_scan("new", sys.argv[1], tracer)
@@ -165,6 +165,91 @@ if status == TM_E_SUCCESS:
 else:
 	print("FAILED")
 
+print("Testing incremental transfer, first run. Should PASS")
+status = tm_perform_transfer([(TM_ATTR_MECHANISM, TM_PERFORM_CPIO),
+    (TM_CPIO_ACTION, TM_CPIO_INCREMENTAL),
+    (TM_CPIO_DST_MNTPT, '/export/home/cpio_incr'),
+    (TM_ATTR_IMAGE_INFO, '/export/home/jeanm/transfer_mod_test/.image_info'),
+    (TM_CPIO_SRC_MNTPT, '/usr/sbin')])
+if status == TM_E_SUCCESS:
+	print("PASSED")
+else:
+	num_failed += 1
+	print("FAILED")
+
+print("Testing incremental transfer, nothing changed. Should PASS")
+status = tm_perform_transfer([(TM_ATTR_MECHANISM, TM_PERFORM_CPIO),
+    (TM_CPIO_ACTION, TM_CPIO_INCREMENTAL),
+    (TM_CPIO_DST_MNTPT, '/export/home/cpio_incr'),
+    (TM_ATTR_IMAGE_INFO, '/export/home/jeanm/transfer_mod_test/.image_info'),
+    (TM_CPIO_SRC_MNTPT, '/usr/sbin')])
+if status == TM_E_SUCCESS:
+	print("PASSED")
+else:
+	num_failed += 1
+	print("FAILED")
+
+print("Testing incremental transfer, explicit manifest. Should PASS")
+status = tm_perform_transfer([(TM_ATTR_MECHANISM, TM_PERFORM_CPIO),
+    (TM_CPIO_ACTION, TM_CPIO_INCREMENTAL),
+    (TM_CPIO_DST_MNTPT, '/export/home/cpio_incr'),
+    (TM_CPIO_MANIFEST, '/export/home/cpio_incr_sbin.manifest'),
+    (TM_ATTR_IMAGE_INFO, '/export/home/jeanm/transfer_mod_test/.image_info'),
+    (TM_CPIO_SRC_MNTPT, '/usr/sbin')])
+if status == TM_E_SUCCESS:
+	print("PASSED")
+else:
+	num_failed += 1
+	print("FAILED")
+
+print("Testing incremental transfer, invalid src. Should FAIL")
+status = tm_perform_transfer([(TM_ATTR_MECHANISM, TM_PERFORM_CPIO),
+    (TM_CPIO_ACTION, TM_CPIO_INCREMENTAL),
+    (TM_CPIO_DST_MNTPT, '/export/home/cpio_incr'),
+    (TM_ATTR_IMAGE_INFO, '/export/home/jeanm/transfer_mod_test/.image_info'),
+    (TM_CPIO_SRC_MNTPT, '/usr/jean')])
+if status == TM_E_SUCCESS:
+	num_failed += 1
+	print("PASSED")
+else:
+	print("FAILED")
+
+print("Testing transfer plan. Should PASS")
+status = tm_perform_transfer([(TM_ATTR_MECHANISM, TM_PERFORM_CPIO),
+    (TM_CPIO_ACTION, TM_CPIO_PLAN),
+    (TM_CPIO_DST_MNTPT, '/export/home/cpio_plan'),
+    (TM_CPIO_PLAN_FILE, '/export/home/cpio_plan.json'),
+    (TM_CPIO_SRC_MNTPT, '/usr/sbin')])
+if status == TM_E_SUCCESS:
+	print("PASSED")
+else:
+	num_failed += 1
+	print("FAILED")
+
+print("Testing transfer plan, missing TM_CPIO_PLAN_FILE. Should FAIL")
+status = tm_perform_transfer([(TM_ATTR_MECHANISM, TM_PERFORM_CPIO),
+    (TM_CPIO_ACTION, TM_CPIO_PLAN),
+    (TM_CPIO_DST_MNTPT, '/export/home/cpio_plan'),
+    (TM_CPIO_SRC_MNTPT, '/usr/sbin')])
+if status == TM_E_SUCCESS:
+	num_failed += 1
+	print("PASSED")
+else:
+	print("FAILED")
+
+print("Testing valid src, dest, sized by the transfer plan. Should PASS")
+status = tm_perform_transfer([(TM_ATTR_MECHANISM, TM_PERFORM_CPIO),
+    (TM_CPIO_ACTION, TM_CPIO_ENTIRE),
+    (TM_ATTR_IMAGE_INFO, '/export/home/jeanm/transfer_mod_test/.image_info'),
+    (TM_CPIO_DST_MNTPT, '/export/home/cpio_plan'),
+    (TM_CPIO_PLAN_FILE, '/export/home/cpio_plan.json'),
+    (TM_CPIO_SRC_MNTPT, '/usr/sbin')])
+if status == TM_E_SUCCESS:
+	print("PASSED")
+else:
+	num_failed += 1
+	print("FAILED")
+
 if num_failed != 0:
         print("Check the results, %d tests did not perform as expected" % num_failed)
 else:
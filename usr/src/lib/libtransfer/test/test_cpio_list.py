@@ -146,6 +146,74 @@ if status == TM_E_SUCCESS:
 else:
 	print("FAILED")
 
+print("Testing valid src, dest, and file with the native engine. should PASS")
+status = tm_perform_transfer([(TM_ATTR_MECHANISM, TM_PERFORM_CPIO),
+    (TM_CPIO_ACTION, TM_CPIO_LIST),
+    (TM_CPIO_LIST_FILE, '/export/home/jeanm/transfer_mod_test/file_list'),
+    (TM_CPIO_DST_MNTPT, '/export/home/cpio_native1'),
+    (TM_CPIO_SRC_MNTPT, '/usr/sbin'),
+    (TM_CPIO_ENGINE, TM_CPIO_ENGINE_NATIVE),
+    (TM_CPIO_WORKERS, '4')])
+if status == TM_E_SUCCESS:
+	print("PASSED")
+else:
+	num_failed += 1
+	print("FAILED")
+
+print("Testing invalid copy engine. should FAIL")
+status = tm_perform_transfer([(TM_ATTR_MECHANISM, TM_PERFORM_CPIO),
+    (TM_CPIO_ACTION, TM_CPIO_LIST),
+    (TM_CPIO_LIST_FILE, '/export/home/jeanm/transfer_mod_test/file_list'),
+    (TM_CPIO_DST_MNTPT, '/export/home/cpio_native1'),
+    (TM_CPIO_SRC_MNTPT, '/usr/sbin'),
+    (TM_CPIO_ENGINE, 'tar')])
+if status == TM_E_SUCCESS:
+	num_failed += 1
+	print("PASSED")
+else:
+	print("FAILED")
+
+print("Testing invalid number of copy workers. should FAIL")
+status = tm_perform_transfer([(TM_ATTR_MECHANISM, TM_PERFORM_CPIO),
+    (TM_CPIO_ACTION, TM_CPIO_LIST),
+    (TM_CPIO_LIST_FILE, '/export/home/jeanm/transfer_mod_test/file_list'),
+    (TM_CPIO_DST_MNTPT, '/export/home/cpio_native1'),
+    (TM_CPIO_SRC_MNTPT, '/usr/sbin'),
+    (TM_CPIO_ENGINE, TM_CPIO_ENGINE_NATIVE),
+    (TM_CPIO_WORKERS, '0')])
+if status == TM_E_SUCCESS:
+	num_failed += 1
+	print("PASSED")
+else:
+	print("FAILED")
+
+print("Testing deduplication with the native engine. should PASS")
+status = tm_perform_transfer([(TM_ATTR_MECHANISM, TM_PERFORM_CPIO),
+    (TM_CPIO_ACTION, TM_CPIO_LIST),
+    (TM_CPIO_LIST_FILE, '/export/home/jeanm/transfer_mod_test/file_list'),
+    (TM_CPIO_DST_MNTPT, '/export/home/cpio_native2'),
+    (TM_CPIO_SRC_MNTPT, '/usr/sbin'),
+    (TM_CPIO_ENGINE, TM_CPIO_ENGINE_NATIVE),
+    (TM_CPIO_DEDUP, 'true')])
+if status == TM_E_SUCCESS:
+	print("PASSED")
+else:
+	num_failed += 1
+	print("FAILED")
+
+print("Testing deduplication with the cpio engine. should FAIL")
+status = tm_perform_transfer([(TM_ATTR_MECHANISM, TM_PERFORM_CPIO),
+    (TM_CPIO_ACTION, TM_CPIO_LIST),
+    (TM_CPIO_LIST_FILE, '/export/home/jeanm/transfer_mod_test/file_list'),
+    (TM_CPIO_DST_MNTPT, '/export/home/cpio_native2'),
+    (TM_CPIO_SRC_MNTPT, '/usr/sbin'),
+    (TM_CPIO_DEDUP, 'true')])
+if status == TM_E_SUCCESS:
+	num_failed += 1
+	print("PASSED")
+else:
+	print("FAILED")
+
 if num_failed != 0:
 	print("Check your results %d tests did not perform as expected" % num_failed)
 else:
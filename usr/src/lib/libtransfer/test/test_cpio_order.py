@@ -0,0 +1,156 @@
+#!/usr/bin/python
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+# Copyright (c) 2010, Oracle and/or its affiliates. All rights reserved.
+#
+#
+# Test the orders of the cpio file lists.  A stand-in for cpio(1)
+# records the file list it is given instead of copying anything.
+#
+import os
+import shutil
+import tempfile
+
+from libtransfer import *
+from transfer_mod import *
+
+exec(compile(open('./transfer_defs.py', "rb").read(), './transfer_defs.py', 'exec'))
+num_failed = 0
+
+top = tempfile.mkdtemp(prefix="cpio_order")
+src = top + "/src"
+sizes = {"a/big": 5000, "a/tiny": 1, "b/small": 10, "c/mid": 100,
+    "c/sub/mid2": 200}
+for name, size in sizes.items():
+	if not os.path.isdir(os.path.dirname(src + "/" + name)):
+		os.makedirs(os.path.dirname(src + "/" + name))
+	open(src + "/" + name, "w").write("x" * size)
+os.mkdir(top + "/dst")
+image_info = open(top + "/.image_info", "w")
+image_info.write("IMAGE_SIZE=100\n")
+image_info.close()
+sort_file = open(top + "/iso.sort", "w")
+sort_file.write("c/mid\t10\nb/small\t5\n")
+sort_file.close()
+list_file = open(top + "/list", "w")
+list_file.write("./b/small\n./a/tiny\n./c/mid\n./a/big\n")
+list_file.close()
+
+cpio = open(top + "/cpio", "w")
+cpio.write("#!/bin/sh\ncat > %s/record\n" % top)
+cpio.close()
+os.chmod(top + "/cpio", 0o755)
+TMDefs.CPIO = top + "/cpio"
+
+def transfer(action, *extra):
+	"""Run a cpio transfer of src, return its status and the files of
+	the recorded file list, directories left out.
+	"""
+	args = [(TM_ATTR_MECHANISM, TM_PERFORM_CPIO),
+	    (TM_CPIO_ACTION, action),
+	    (TM_CPIO_DST_MNTPT, top + "/dst"),
+	    (TM_CPIO_SRC_MNTPT, src)]
+	if action == TM_CPIO_LIST:
+		args.append((TM_CPIO_LIST_FILE, top + "/list"))
+	else:
+		args.append((TM_ATTR_IMAGE_INFO, top + "/.image_info"))
+	args.extend(extra)
+	if os.path.exists(top + "/record"):
+		os.unlink(top + "/record")
+	status = tm_perform_transfer(args)
+	if not os.path.exists(top + "/record"):
+		return status, []
+	names = [os.path.normpath(line.rstrip("\n"))
+	    for line in open(top + "/record")]
+	return status, [name for name in names if name in sizes]
+
+print("Testing entire transfer, size order. Should PASS")
+status, names = transfer(TM_CPIO_ENTIRE, (TM_CPIO_ORDER, TM_CPIO_ORDER_SIZE))
+if status == TM_E_SUCCESS and \
+    names == ["a/big", "c/sub/mid2", "c/mid", "b/small", "a/tiny"]:
+	print("PASS")
+else:
+	num_failed += 1
+	print("FAIL")
+
+print("Testing entire transfer, path order. Should PASS")
+status, names = transfer(TM_CPIO_ENTIRE, (TM_CPIO_ORDER, TM_CPIO_ORDER_PATH))
+if status == TM_E_SUCCESS and names == sorted(sizes.keys()):
+	print("PASS")
+else:
+	num_failed += 1
+	print("FAIL")
+
+print("Testing entire transfer, directory order. Should PASS")
+status, names = transfer(TM_CPIO_ENTIRE,
+    (TM_CPIO_ORDER, TM_CPIO_ORDER_DIRECTORY))
+# The files of a directory are next to each other
+dirs = [os.path.dirname(name) for name in names]
+runs = [i for i in range(len(dirs)) if i == 0 or dirs[i - 1] != dirs[i]]
+if status == TM_E_SUCCESS and len(names) == len(sizes) and \
+    len(runs) == len(set(dirs)):
+	print("PASS")
+else:
+	num_failed += 1
+	print("FAIL")
+
+print("Testing entire transfer, sort file. Should PASS")
+status, names = transfer(TM_CPIO_ENTIRE, (TM_CPIO_SORT_FILE,
+    top + "/iso.sort"))
+if status == TM_E_SUCCESS and names[:2] == ["c/mid", "b/small"] and \
+    len(names) == len(sizes):
+	print("PASS")
+else:
+	num_failed += 1
+	print("FAIL")
+
+print("Testing list transfer, size order. Should PASS")
+status, names = transfer(TM_CPIO_LIST, (TM_CPIO_ORDER, TM_CPIO_ORDER_SIZE))
+if status == TM_E_SUCCESS and \
+    names == ["a/big", "c/mid", "b/small", "a/tiny"]:
+	print("PASS")
+else:
+	num_failed += 1
+	print("FAIL")
+
+print("Testing invalid TM_CPIO_ORDER. Should FAIL")
+status, names = transfer(TM_CPIO_ENTIRE, (TM_CPIO_ORDER, "random"))
+if status == TM_E_SUCCESS:
+	num_failed += 1
+	print("PASS")
+else:
+	print("FAIL")
+
+print("Testing sortfile order without a sort file. Should FAIL")
+status, names = transfer(TM_CPIO_ENTIRE,
+    (TM_CPIO_ORDER, TM_CPIO_ORDER_SORT_FILE))
+if status == TM_E_SUCCESS:
+	num_failed += 1
+	print("PASS")
+else:
+	print("FAIL")
+
+shutil.rmtree(top)
+
+if num_failed != 0:
+	print("Check your results %d tests didn't perform as expected" % num_failed)
+else:
+	print("Tests performed as expected")
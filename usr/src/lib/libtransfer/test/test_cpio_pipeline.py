@@ -0,0 +1,105 @@
+#!/usr/bin/python
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+# Copyright (c) 2010, Oracle and/or its affiliates. All rights reserved.
+#
+#
+# Test the native copy engine with copy pipelines.  Files larger than
+# PIPELINE_MIN_SIZE are copied by a pipeline when the engine has to read
+# and write the data itself.
+#
+import os
+import shutil
+import tempfile
+
+from libtransfer import *
+from transfer_mod import *
+
+exec(compile(open('./transfer_defs.py', "rb").read(), './transfer_defs.py', 'exec'))
+num_failed = 0
+
+top = tempfile.mkdtemp(prefix="cpio_pipeline")
+src = top + "/src"
+os.makedirs(src + "/dir")
+data = os.urandom(20 * 1024 * 1024 + 4321)
+open(src + "/dir/big", "wb").write(data)
+sparse = open(src + "/dir/sparse", "wb")
+sparse.write(data[:10 * 1024 * 1024])
+sparse.seek(30 * 1024 * 1024)
+sparse.write(b"end")
+sparse.close()
+open(src + "/small", "w").write("small")
+image_info = open(top + "/.image_info", "w")
+image_info.write("IMAGE_SIZE=100\n")
+image_info.close()
+
+def transfer(dst, *extra):
+	"""Run a native copy of src to top/dst, return its status"""
+	os.mkdir(top + "/" + dst)
+	args = [(TM_ATTR_MECHANISM, TM_PERFORM_CPIO),
+	    (TM_CPIO_ACTION, TM_CPIO_ENTIRE),
+	    (TM_CPIO_ENGINE, TM_CPIO_ENGINE_NATIVE),
+	    (TM_CPIO_DST_MNTPT, top + "/" + dst),
+	    (TM_CPIO_SRC_MNTPT, src),
+	    (TM_ATTR_IMAGE_INFO, top + "/.image_info")]
+	args.extend(extra)
+	return tm_perform_transfer(args)
+
+def same(dst, name):
+	"""Return True if name has the same contents in src and top/dst"""
+	try:
+		return open(src + "/" + name, "rb").read() == \
+		    open(top + "/" + dst + "/" + name, "rb").read()
+	except IOError:
+		return False
+
+print("Testing native copy with a pipeline depth of 4. Should PASS")
+status = transfer("dst1", (TM_CPIO_PIPELINE_DEPTH, "4"))
+if status == TM_E_SUCCESS and same("dst1", "dir/big") and \
+    same("dst1", "dir/sparse") and same("dst1", "small"):
+	print("PASS")
+else:
+	num_failed += 1
+	print("FAIL")
+
+print("Testing invalid TM_CPIO_PIPELINE_DEPTH. Should FAIL")
+status = transfer("dst2", (TM_CPIO_PIPELINE_DEPTH, "-1"))
+if status == TM_E_SUCCESS:
+	num_failed += 1
+	print("PASS")
+else:
+	print("FAIL")
+
+print("Testing pipeline with the cpio engine. Should FAIL")
+status = transfer("dst3", (TM_CPIO_PIPELINE_DEPTH, "4"),
+    (TM_CPIO_ENGINE, TM_CPIO_ENGINE_CPIO))
+if status == TM_E_SUCCESS:
+	num_failed += 1
+	print("PASS")
+else:
+	print("FAIL")
+
+shutil.rmtree(top)
+
+if num_failed != 0:
+	print("Check your results %d tests didn't perform as expected" % num_failed)
+else:
+	print("Tests performed as expected")
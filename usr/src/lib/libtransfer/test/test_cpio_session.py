@@ -0,0 +1,124 @@
+#!/usr/bin/python
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+# Copyright (c) 2010, Oracle and/or its affiliates. All rights reserved.
+#
+#
+# Test a TransferSession running several cpio transfers from the same
+# source tree: the scan made by the first transfer is reused by the next
+# ones as long as the tree doesn't change.
+#
+import os
+import shutil
+import tempfile
+
+from libtransfer import *
+from transfer_mod import *
+
+exec(compile(open('./transfer_defs.py', "rb").read(), './transfer_defs.py', 'exec'))
+num_failed = 0
+
+top = tempfile.mkdtemp(prefix="cpio_session")
+src = top + "/src"
+for i in range(10):
+	os.makedirs("%s/dir%d/sub" % (src, i))
+	for j in range(20):
+		open("%s/dir%d/sub/file%d" % (src, i, j), "w").write("x" * j)
+image_info = open(top + "/.image_info", "w")
+image_info.write("IMAGE_SIZE=100\n")
+image_info.close()
+list_file = open(top + "/list", "w")
+for i in range(9, -1, -1):
+	list_file.write("./dir%d/sub/file3\n" % i)
+list_file.close()
+
+def cpio_args(action, dst):
+	"""Return the arguments of a native copy from src to top/dst"""
+	os.mkdir(top + "/" + dst)
+	args = [(TM_ATTR_MECHANISM, TM_PERFORM_CPIO),
+	    (TM_CPIO_ACTION, action),
+	    (TM_CPIO_ENGINE, TM_CPIO_ENGINE_NATIVE),
+	    (TM_CPIO_DST_MNTPT, top + "/" + dst),
+	    (TM_CPIO_SRC_MNTPT, src)]
+	if action == TM_CPIO_LIST:
+		args.append((TM_CPIO_LIST_FILE, top + "/list"))
+	else:
+		args.append((TM_ATTR_IMAGE_INFO, top + "/.image_info"))
+	return args
+
+session = TransferSession()
+
+print("Testing first entire transfer of the session. Should PASS")
+status = session.perform(cpio_args(TM_CPIO_ENTIRE, "dst1"))
+if status == TM_E_SUCCESS and session.scan_cache.misses == 1 and \
+    os.path.exists(top + "/dst1/dir9/sub/file19"):
+	print("PASS")
+else:
+	num_failed += 1
+	print("FAIL")
+
+print("Testing entire transfer reusing the scan. Should PASS")
+status = session.perform(cpio_args(TM_CPIO_ENTIRE, "dst2"))
+if status == TM_E_SUCCESS and session.scan_cache.hits == 1 and \
+    os.path.exists(top + "/dst2/dir9/sub/file19"):
+	print("PASS")
+else:
+	num_failed += 1
+	print("FAIL")
+
+print("Testing entire transfer after the source changed. Should PASS")
+open(src + "/dir4/sub/new", "w").close()
+status = session.perform(cpio_args(TM_CPIO_ENTIRE, "dst3"))
+if status == TM_E_SUCCESS and session.scan_cache.misses == 2 and \
+    os.path.exists(top + "/dst3/dir4/sub/new"):
+	print("PASS")
+else:
+	num_failed += 1
+	print("FAIL")
+
+print("Testing list transfer sorted with the scan, in a pipeline. Should PASS")
+status = session.perform_all([cpio_args(TM_CPIO_LIST, "dst4"),
+    cpio_args(TM_CPIO_ENTIRE, "dst5")])
+if status == TM_E_SUCCESS and session.scan_cache.hits == 3 and \
+    os.path.exists(top + "/dst4/dir0/sub/file3") and \
+    os.path.exists(top + "/dst5/dir4/sub/new"):
+	print("PASS")
+else:
+	num_failed += 1
+	print("FAIL")
+
+print("Testing pipeline stopping at a failed transfer. Should FAIL")
+args = cpio_args(TM_CPIO_ENTIRE, "dst6")
+args.append((TM_CPIO_SRC_MNTPT, top + "/missing"))
+status = session.perform_all([args, cpio_args(TM_CPIO_ENTIRE, "dst7")])
+if status == TM_E_SUCCESS or os.path.exists(top + "/dst7/dir0"):
+	num_failed += 1
+	print("PASS")
+else:
+	print("FAIL")
+
+session.close()
+shutil.rmtree(top)
+
+if num_failed != 0:
+	print("Check your results %d tests didn't perform as expected" % num_failed)
+else:
+	print("Tests performed as expected")
@@ -0,0 +1,195 @@
+#!/usr/bin/python
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+# Copyright (c) 2010, Oracle and/or its affiliates. All rights reserved.
+#
+#
+# Test the checksums computed by native copies and the TM_CPIO_VERIFY
+# action checking the destination against them.
+#
+import os
+import shutil
+import tempfile
+
+from libtransfer import *
+from transfer_mod import *
+
+exec(compile(open('./transfer_defs.py', "rb").read(), './transfer_defs.py', 'exec'))
+num_failed = 0
+
+top = tempfile.mkdtemp(prefix="cpio_verify")
+src = top + "/src"
+dst = top + "/dst"
+os.makedirs(src + "/dir")
+os.mkdir(dst)
+open(src + "/dir/data", "wb").write(os.urandom(3 * 1024 * 1024 + 17))
+os.link(src + "/dir/data", src + "/dir/link")
+sparse = open(src + "/dir/sparse", "wb")
+sparse.write(b"start")
+sparse.seek(5 * 1024 * 1024)
+sparse.write(b"end")
+sparse.truncate(6 * 1024 * 1024)
+sparse.close()
+open(src + "/small", "w").write("small")
+open(src + "/skipped", "w").write("skipped")
+os.symlink("small", src + "/symlink")
+open(top + "/skip", "w").write("./skipped\n")
+image_info = open(top + "/.image_info", "w")
+image_info.write("IMAGE_SIZE=100\n")
+image_info.close()
+
+def transfer(action, *extra):
+	"""Run a native cpio action from src to dst, return its status"""
+	args = [(TM_ATTR_MECHANISM, TM_PERFORM_CPIO),
+	    (TM_CPIO_ACTION, action),
+	    (TM_CPIO_ENGINE, TM_CPIO_ENGINE_NATIVE),
+	    (TM_CPIO_DST_MNTPT, dst),
+	    (TM_CPIO_SRC_MNTPT, src),
+	    (TM_CPIO_CHECKSUM_FILE, top + "/checksums")]
+	if action == TM_CPIO_ENTIRE:
+		args.append((TM_ATTR_IMAGE_INFO, top + "/.image_info"))
+	args.extend(extra)
+	return tm_perform_transfer(args)
+
+print("Testing entire transfer with checksums. Should PASS")
+status = transfer(TM_CPIO_ENTIRE, (TM_CPIO_CHECKSUMS, "true"),
+    (TM_CPIO_ENTIRE_SKIP_FILE_LIST, top + "/skip"))
+try:
+	names = [line.split(" ", 2)[2].rstrip("\n")
+	    for line in open(top + "/checksums")][1:]
+except (IOError, IndexError):
+	names = []
+if status == TM_E_SUCCESS and \
+    names == ["dir/data", "dir/link", "dir/sparse", "small"]:
+	print("PASS")
+else:
+	num_failed += 1
+	print("FAIL")
+
+print("Testing verification of the destination. Should PASS")
+status = transfer(TM_CPIO_VERIFY)
+if status == TM_E_SUCCESS:
+	print("PASS")
+else:
+	num_failed += 1
+	print("FAIL")
+
+print("Testing verification of a modified file. Should FAIL")
+shutil.copy(dst + "/dir/sparse", top + "/sparse")
+modified = open(dst + "/dir/sparse", "r+b")
+modified.seek(4096)
+modified.write(b"x")
+modified.close()
+status = transfer(TM_CPIO_VERIFY)
+if status == TM_E_CPIO_VERIFY_FAILED:
+	print("FAIL")
+else:
+	num_failed += 1
+	print("PASS")
+
+print("Testing verification of a missing file. Should FAIL")
+shutil.copy(top + "/sparse", dst + "/dir/sparse")
+os.unlink(dst + "/small")
+status = transfer(TM_CPIO_VERIFY)
+if status == TM_E_CPIO_VERIFY_FAILED:
+	print("FAIL")
+else:
+	num_failed += 1
+	print("PASS")
+
+print("Testing verification without a checksum manifest. Should FAIL")
+status = transfer(TM_CPIO_VERIFY,
+    (TM_CPIO_CHECKSUM_FILE, top + "/missing"))
+if status == TM_E_SUCCESS:
+	num_failed += 1
+	print("PASS")
+else:
+	print("FAIL")
+
+def incremental(action):
+	"""Run an incremental transfer or a verification of its
+	destination, return its status
+	"""
+	return transfer(action, (TM_CPIO_CHECKSUMS, "true"),
+	    (TM_CPIO_DST_MNTPT, top + "/incr"),
+	    (TM_CPIO_MANIFEST, top + "/incr.manifest"),
+	    (TM_CPIO_CHECKSUM_FILE, top + "/incr.checksums"))
+
+def incremental_names():
+	"""Return the pathnames of the incremental checksum manifest"""
+	try:
+		return [line.split(" ", 2)[2].rstrip("\n")
+		    for line in open(top + "/incr.checksums")][1:]
+	except (IOError, IndexError):
+		return []
+
+print("Testing incremental transfers with checksums. Should PASS")
+os.mkdir(top + "/incr")
+status = incremental(TM_CPIO_INCREMENTAL)
+if status == TM_E_SUCCESS:
+	status = incremental(TM_CPIO_INCREMENTAL)
+all_names = ["dir/data", "dir/link", "dir/sparse", "skipped", "small"]
+if status == TM_E_SUCCESS and incremental_names() == all_names and \
+    incremental(TM_CPIO_VERIFY) == TM_E_SUCCESS:
+	print("PASS")
+else:
+	num_failed += 1
+	print("FAIL")
+
+print("Testing incremental transfer of a change and a removal. Should PASS")
+open(src + "/small", "w").write("small, changed")
+os.rename(src + "/skipped", top + "/skipped")
+status = incremental(TM_CPIO_INCREMENTAL)
+all_names.remove("skipped")
+if status == TM_E_SUCCESS and incremental_names() == all_names and \
+    incremental(TM_CPIO_VERIFY) == TM_E_SUCCESS:
+	print("PASS")
+else:
+	num_failed += 1
+	print("FAIL")
+
+print("Testing verification of a file modified after incremental "
+    "transfers. Should FAIL")
+modified = open(top + "/incr/dir/data", "r+b")
+modified.write(b"x")
+modified.close()
+status = incremental(TM_CPIO_VERIFY)
+if status == TM_E_CPIO_VERIFY_FAILED:
+	print("FAIL")
+else:
+	num_failed += 1
+	print("PASS")
+
+print("Testing checksums with the cpio engine. Should FAIL")
+status = transfer(TM_CPIO_ENTIRE, (TM_CPIO_CHECKSUMS, "true"),
+    (TM_CPIO_ENGINE, TM_CPIO_ENGINE_CPIO))
+if status == TM_E_SUCCESS:
+	num_failed += 1
+	print("PASS")
+else:
+	print("FAIL")
+
+shutil.rmtree(top)
+
+if num_failed != 0:
+	print("Check your results %d tests didn't perform as expected" % num_failed)
+else:
+	print("Tests performed as expected")
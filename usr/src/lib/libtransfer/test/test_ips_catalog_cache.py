@@ -0,0 +1,161 @@
+#!/usr/bin/python
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+# Copyright (c) 2010, Oracle and/or its affiliates. All rights reserved.
+#
+# Test the catalog cache of TM_IPS_REPO_CONTENTS_VERIFY against a
+# simulated repository: a pkg image area holding only the files the
+# cache reads, and a stand-in for pkg(1) answering "pkg list -a" from
+# a file of package names.  No network or real repository is needed.
+#
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from libtransfer import *
+from transfer_mod import *
+
+exec(compile(open('./transfer_defs.py', "rb").read(), './transfer_defs.py', 'exec'))
+num_failed = 0
+
+top = tempfile.mkdtemp(prefix="catalog_cache")
+image = top + "/image"
+repo = top + "/repo"
+cache = top + "/cache"
+calls = top + "/pkg_calls"
+os.makedirs(image + "/var/pkg/publisher/test/catalog")
+os.makedirs(repo)
+
+# The repository catalog
+pkgs = open(repo + "/catalog", "w")
+for pkg in ("SUNWcs", "SUNWcsd", "entire", "SUNWgrub"):
+	pkgs.write(pkg + "\n")
+pkgs.close()
+
+def set_catalog(modified):
+	"""Pretend the image retrieved the catalog last modified then"""
+	attrs = open(image + "/var/pkg/publisher/test/catalog/catalog.attrs",
+	    "w")
+	json.dump({"last-modified": modified}, attrs)
+	attrs.close()
+
+cfg = open(image + "/var/pkg/cfg_cache", "w")
+cfg.write("[authority_test]\norigin = file://%s\n" % repo)
+cfg.close()
+set_catalog("2010-06-01T00:00:00.000000Z")
+
+# The stand-in for pkg(1): every call is recorded, "list -a" fails
+# if a package isn't in the repository catalog.
+stand_in = open(top + "/pkg", "w")
+stand_in.write("""#!/bin/sh
+echo "$@" >> %s
+shift 4
+[ "$1" = "-a" ] && shift
+for pkg in "$@"; do
+	grep -qx "$pkg" %s/catalog || exit 1
+done
+exit 0
+""" % (calls, repo))
+stand_in.close()
+os.chmod(top + "/pkg", 0o755)
+TMDefs.PKG = top + "/pkg"
+
+def verify(pkg_list):
+	"""Verify pkg_list, return the status and the number of pkg calls"""
+	pkg_file = open(top + "/pkgs", "w")
+	for pkg in pkg_list:
+		pkg_file.write(pkg + "\n")
+	pkg_file.close()
+	if os.path.exists(calls):
+		os.unlink(calls)
+	start = time.time()
+	status = tm_perform_transfer([(TM_ATTR_MECHANISM, TM_PERFORM_IPS),
+	    (TM_IPS_ACTION, TM_IPS_REPO_CONTENTS_VERIFY),
+	    (TM_IPS_PKGS, top + "/pkgs"),
+	    (TM_IPS_CATALOG_CACHE, cache),
+	    (TM_IPS_INIT_MNTPT, image)])
+	print("\t%.3f seconds" % (time.time() - start))
+	if not os.path.exists(calls):
+		return status, 0
+	return status, len(open(calls).readlines())
+
+print("Testing first verification, cache empty. Should PASS")
+status, ncalls = verify(["SUNWcs", "entire"])
+if status == TM_E_SUCCESS and ncalls == 1:
+	print("PASS")
+else:
+	num_failed += 1
+	print("FAIL")
+
+print("Testing same packages, catalog unchanged, no pkg call. Should PASS")
+status, ncalls = verify(["SUNWcs", "entire"])
+if status == TM_E_SUCCESS and ncalls == 0:
+	print("PASS")
+else:
+	num_failed += 1
+	print("FAIL")
+
+print("Testing a package missing from the repository. Should FAIL")
+status, ncalls = verify(["SUNWcs", "SUNWnothere"])
+if status == TM_E_SUCCESS:
+	num_failed += 1
+	print("PASS")
+else:
+	print("FAIL")
+
+print("Testing the missing package isn't cached. Should FAIL")
+status, ncalls = verify(["SUNWnothere"])
+if status == TM_E_SUCCESS or ncalls != 1:
+	num_failed += 1
+	print("PASS")
+else:
+	print("FAIL")
+
+print("Testing the catalog changed, pkg called again. Should PASS")
+set_catalog("2010-06-02T00:00:00.000000Z")
+status, ncalls = verify(["SUNWcs", "entire"])
+if status == TM_E_SUCCESS and ncalls == 1:
+	print("PASS")
+else:
+	num_failed += 1
+	print("FAIL")
+
+print("Testing no TM_IPS_CATALOG_CACHE, pkg always called. Should PASS")
+if os.path.exists(calls):
+	os.unlink(calls)
+status = tm_perform_transfer([(TM_ATTR_MECHANISM, TM_PERFORM_IPS),
+    (TM_IPS_ACTION, TM_IPS_REPO_CONTENTS_VERIFY),
+    (TM_IPS_PKGS, top + "/pkgs"),
+    (TM_IPS_INIT_MNTPT, image)])
+if status == TM_E_SUCCESS and os.path.exists(calls):
+	print("PASS")
+else:
+	num_failed += 1
+	print("FAIL")
+
+shutil.rmtree(top)
+
+if num_failed != 0:
+	print("Check your results %d tests didn't perform as expected" % num_failed)
+else:
+	print("Tests performed as expected")
@@ -0,0 +1,118 @@
+#!/usr/bin/python
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+# Copyright (c) 2010, Oracle and/or its affiliates. All rights reserved.
+#
+# Test the batched install of TM_IPS_RETRIEVE with a stand-in for
+# pkg(1) which records the packages of every install, and fails to
+# install SUNWbroken until it's told otherwise.
+#
+import os
+import shutil
+import tempfile
+
+from libtransfer import *
+from transfer_mod import *
+
+exec(compile(open('./transfer_defs.py', "rb").read(), './transfer_defs.py', 'exec'))
+num_failed = 0
+
+top = tempfile.mkdtemp(prefix="install_batches")
+image = top + "/image"
+os.makedirs(image)
+calls = top + "/pkg_calls"
+fixed = top + "/fixed"
+
+stand_in = open(top + "/pkg", "w")
+stand_in.write("""#!/bin/sh
+shift 4
+echo "$@" >> %s
+case "$*" in
+*SUNWbroken*) [ -f %s ] || exit 2;;
+esac
+exit 0
+""" % (calls, fixed))
+stand_in.close()
+os.chmod(top + "/pkg", 0o755)
+TMDefs.PKG = top + "/pkg"
+
+pkg_file = open(top + "/pkgs", "w")
+for pkg in ("SUNWcs", "SUNWcsd", "SUNWbroken", "entire", "SUNWgrub",
+    "SUNWzfs", "SUNWbash"):
+	pkg_file.write(pkg + "\n")
+pkg_file.close()
+
+def install(batch):
+	"""Install the packages in batches, return the status and the
+	install commands run"""
+	if os.path.exists(calls):
+		os.unlink(calls)
+	status = tm_perform_transfer([(TM_ATTR_MECHANISM, TM_PERFORM_IPS),
+	    (TM_IPS_ACTION, TM_IPS_RETRIEVE),
+	    (TM_IPS_PKGS, top + "/pkgs"),
+	    (TM_IPS_INSTALL_BATCH, batch),
+	    (TM_IPS_INIT_MNTPT, image)])
+	if not os.path.exists(calls):
+		return status, []
+	return status, [line.split() for line in open(calls)]
+
+print("Testing batch with a broken package. Should FAIL")
+status, runs = install("2")
+if status == TM_E_SUCCESS or len(runs) != 2 or runs[0][-2:] != \
+    ["entire", "SUNWcs"]:
+	num_failed += 1
+	print("PASS")
+else:
+	print("FAIL")
+
+print("Testing install resumed at the failed batch. Should PASS")
+open(fixed, "w").close()
+status, runs = install("2")
+if status == TM_E_SUCCESS and len(runs) == 3 and \
+    runs[0][-2:] == ["SUNWcsd", "SUNWbroken"] and \
+    not os.path.exists(image + "/.tm_install_state"):
+	print("PASS")
+else:
+	num_failed += 1
+	print("FAIL")
+
+print("Testing install starting over after it completed. Should PASS")
+status, runs = install("2")
+if status == TM_E_SUCCESS and len(runs) == 4:
+	print("PASS")
+else:
+	num_failed += 1
+	print("FAIL")
+
+print("Testing invalid TM_IPS_INSTALL_BATCH. Should FAIL")
+status, runs = install("-1")
+if status == TM_E_SUCCESS:
+	num_failed += 1
+	print("PASS")
+else:
+	print("FAIL")
+
+shutil.rmtree(top)
+
+if num_failed != 0:
+	print("Check your results %d tests didn't perform as expected" % num_failed)
+else:
+	print("Tests performed as expected")
@@ -0,0 +1,147 @@
+#!/usr/bin/python
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+# Copyright (c) 2010, Oracle and/or its affiliates. All rights reserved.
+#
+# Test the retry policy of the IPS actions with a stand-in for pkg(1)
+# which fails a given number of times before succeeding.
+#
+import json
+import os
+import shutil
+import tempfile
+
+from libtransfer import *
+from transfer_mod import *
+
+exec(compile(open('./transfer_defs.py', "rb").read(), './transfer_defs.py', 'exec'))
+num_failed = 0
+
+top = tempfile.mkdtemp(prefix="ips_retry")
+image = top + "/image"
+os.makedirs(image)
+counter = top + "/count"
+retry_log = top + "/retries"
+
+# The stand-in exits with $FAIL_STATUS the first $FAILURES times
+stand_in = open(top + "/pkg", "w")
+stand_in.write("""#!/bin/sh
+n=`cat %s 2>/dev/null || echo 0`
+n=`expr $n + 1`
+echo $n > %s
+[ $n -le $FAILURES ] && exit $FAIL_STATUS
+exit 0
+""" % (counter, counter))
+stand_in.close()
+os.chmod(top + "/pkg", 0o755)
+TMDefs.PKG = top + "/pkg"
+
+# Keep the test short
+RetryPolicy.BASE_DELAY = 0.1
+
+open(top + "/pkgs", "w").write("SUNWcs\nentire\n")
+
+def run(action, failures, fail_status, attempts=None):
+	"""Run action against the stand-in, return the status and the
+	number of times pkg was run"""
+	os.environ["FAILURES"] = str(failures)
+	os.environ["FAIL_STATUS"] = str(fail_status)
+	for name in (counter, retry_log):
+		if os.path.exists(name):
+			os.unlink(name)
+	args = [(TM_ATTR_MECHANISM, TM_PERFORM_IPS),
+	    (TM_IPS_ACTION, action),
+	    (TM_IPS_RETRY_LOG, retry_log),
+	    (TM_IPS_PKGS, top + "/pkgs"),
+	    (TM_IPS_INIT_MNTPT, image)]
+	if attempts is not None:
+		args.append((TM_IPS_RETRY_ATTEMPTS, attempts))
+	status = tm_perform_transfer(args)
+	if not os.path.exists(counter):
+		return status, 0
+	return status, int(open(counter).read())
+
+print("Testing refresh failing twice, retried. Should PASS")
+status, nruns = run(TM_IPS_REFRESH, 2, 1)
+if status == TM_E_SUCCESS and nruns == 3:
+	print("PASS")
+	for line in open(retry_log):
+		rec = json.loads(line)
+		print("\tattempt %d: status %d, %.3f seconds, waited %.3f" %
+		    (rec["attempt"], rec["status"], rec["seconds"], rec["delay"]))
+else:
+	num_failed += 1
+	print("FAIL")
+
+print("Testing refresh failing more than TM_IPS_RETRY_ATTEMPTS. Should FAIL")
+status, nruns = run(TM_IPS_REFRESH, 2, 1, "2")
+if status == TM_E_SUCCESS or nruns != 2:
+	num_failed += 1
+	print("PASS")
+else:
+	print("FAIL")
+
+print("Testing purge-history error isn't retried. Should FAIL")
+status, nruns = run(TM_IPS_PURGE_HIST, 1, 1)
+if status == TM_E_SUCCESS or nruns != 1:
+	num_failed += 1
+	print("PASS")
+else:
+	print("FAIL")
+
+print("Testing purge-history on a locked image, retried. Should PASS")
+status, nruns = run(TM_IPS_PURGE_HIST, 1, 7)
+if status == TM_E_SUCCESS and nruns == 2:
+	print("PASS")
+else:
+	num_failed += 1
+	print("FAIL")
+
+print("Testing install error isn't retried. Should FAIL")
+status, nruns = run(TM_IPS_RETRIEVE, 1, 1)
+if status == TM_E_SUCCESS or nruns != 1:
+	num_failed += 1
+	print("PASS")
+else:
+	print("FAIL")
+
+print("Testing install on a locked image, retried. Should PASS")
+status, nruns = run(TM_IPS_RETRIEVE, 1, 7)
+if status == TM_E_SUCCESS and nruns == 2:
+	print("PASS")
+else:
+	num_failed += 1
+	print("FAIL")
+
+print("Testing invalid TM_IPS_RETRY_ATTEMPTS. Should FAIL")
+status, nruns = run(TM_IPS_REFRESH, 0, 1, "0")
+if status == TM_E_SUCCESS:
+	num_failed += 1
+	print("PASS")
+else:
+	print("FAIL")
+
+shutil.rmtree(top)
+
+if num_failed != 0:
+	print("Check your results %d tests didn't perform as expected" % num_failed)
+else:
+	print("Tests performed as expected")
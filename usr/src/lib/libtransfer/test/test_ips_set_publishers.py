@@ -0,0 +1,81 @@
+#!/usr/bin/python
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+# Copyright (c) 2010, Oracle and/or its affiliates. All rights reserved.
+#
+from libtransfer import *
+from transfer_mod import *
+from transfer_publishers import read_publisher_results
+
+exec(compile(open('./transfer_defs.py', "rb").read(), './transfer_defs.py', 'exec'))
+num_failed = 0
+
+print("Testing valid spec, valid mountpoint, refresh. Should PASS")
+status = tm_perform_transfer([(TM_ATTR_MECHANISM, TM_PERFORM_IPS),
+	    (TM_IPS_ACTION, TM_IPS_SET_PUBLISHERS),
+	    (TM_IPS_PUBLISHER_SPEC, './publisher_spec'),
+	    (TM_IPS_PUBLISHER_RESULTS, '/tmp/publisher_results'),
+	    (TM_IPS_REFRESH_CATALOG, 'true'),
+	    (TM_IPS_INIT_MNTPT, '/export/home/test1')])
+if status == TM_E_SUCCESS:
+	print("PASS")
+	for pub, pub_status in read_publisher_results('/tmp/publisher_results'):
+		print("\t%s: %d" % (pub, pub_status))
+else:
+	num_failed += 1
+	print("FAIL")
+
+print("Testing missing TM_IPS_PUBLISHER_SPEC. Should FAIL")
+status = tm_perform_transfer([(TM_ATTR_MECHANISM, TM_PERFORM_IPS),
+	    (TM_IPS_ACTION, TM_IPS_SET_PUBLISHERS),
+	    (TM_IPS_INIT_MNTPT, '/export/home/test1')])
+if status == TM_E_SUCCESS:
+	num_failed += 1
+	print("PASS")
+else:
+	print("FAIL")
+
+print("Testing badly formatted spec. Should FAIL")
+status = tm_perform_transfer([(TM_ATTR_MECHANISM, TM_PERFORM_IPS),
+	    (TM_IPS_ACTION, TM_IPS_SET_PUBLISHERS),
+	    (TM_IPS_PUBLISHER_SPEC, './publisher_bad_spec'),
+	    (TM_IPS_INIT_MNTPT, '/export/home/test1')])
+if status == TM_E_SUCCESS:
+	num_failed += 1
+	print("PASS")
+else:
+	print("FAIL")
+
+print("Testing invalid mountpoint. Should FAIL")
+status = tm_perform_transfer([(TM_ATTR_MECHANISM, TM_PERFORM_IPS),
+	    (TM_IPS_ACTION, TM_IPS_SET_PUBLISHERS),
+	    (TM_IPS_PUBLISHER_SPEC, './publisher_spec'),
+	    (TM_IPS_INIT_MNTPT, '/export/home/testZ')])
+if status == TM_E_SUCCESS:
+	num_failed += 1
+	print("PASS")
+else:
+	print("FAIL")
+
+if num_failed != 0:
+	print("Check your results %d tests didn't perform as expected" % num_failed)
+else:
+	print("Tests performed as expected")
@@ -0,0 +1,123 @@
+#!/usr/bin/python
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+# Copyright (c) 2010, Oracle and/or its affiliates. All rights reserved.
+#
+#
+# Differential test of the tokenizers of ENParser.parse_nodepath() and
+# install_utils.space_parse() against the character by character parsers
+# they replaced.  Random strings, mostly made of the characters special
+# to either grammar, must give the same tokens, the same exceptions and
+# the same messages on stderr.
+#
+# usage: test_parse_tokens.py [<iterations> [<seed>]]
+#
+import io
+import random
+import sys
+import time
+
+import osol_install.ENParser as ENParser
+import osol_install.install_utils as install_utils
+
+num_failed = 0
+
+iterations = 20000
+seed = int(time.time())
+if len(sys.argv) > 1:
+	iterations = int(sys.argv[1])
+if len(sys.argv) > 2:
+	seed = int(sys.argv[2])
+print("Seed %d" % seed)
+rand = random.Random(seed)
+
+# Weighted pieces the random strings are made of
+NODEPATH_PIECES = ["a", "b", "name", "img_params", " ", "/", "//", "[", "]",
+    "=", ":", "\"", "'", "..", "x y", "\\", "\t"]
+SPACE_PIECES = ["a", "bc", "d e", " ", "  ", "\t", "\n", "\"", "'", "\\",
+    "\\\"", "\\'", "\\\\"]
+
+def random_string(pieces):
+	"""Return a string of 0 to 16 random pieces"""
+	return "".join([rand.choice(pieces)
+	    for i in range(rand.randint(0, 16))])
+
+def outcome(func, arg):
+	"""Return what func(arg) returns or raises, and writes to stderr"""
+	saved_stderr = sys.stderr
+	sys.stderr = io.StringIO()
+	try:
+		try:
+			result = func(arg)
+		except Exception as err:
+			result = (err.__class__.__name__, str(err))
+		return result, sys.stderr.getvalue()
+	finally:
+		sys.stderr = saved_stderr
+
+def nodepath_tokens(nodepath):
+	"""parse_nodepath() as comparable tuples"""
+	return [(token.name, list(token.valpaths), list(token.values))
+	    for token in ENParser.parse_nodepath(nodepath)]
+
+def nodepath_tokens_bychar(nodepath):
+	"""The reference parser as comparable tuples"""
+	return [(token.name, list(token.valpaths), list(token.values))
+	    for token in ENParser.__parse_nodepath_bychar(nodepath)]
+
+def compare(name, func, ref_func, pieces, fixed):
+	"""Compare func with ref_func on the fixed strings and random ones.
+	Returns the number of differences.
+	"""
+	ndiffs = 0
+	strings = list(fixed)
+	strings.extend([random_string(pieces) for i in range(iterations)])
+	for string in strings:
+		if outcome(func, string) != outcome(ref_func, string):
+			ndiffs += 1
+			if ndiffs <= 10:
+				print("%s differs for %r" % (name, string))
+	return ndiffs
+
+print("Testing parse_nodepath against the reference parser. Should PASS")
+if compare("parse_nodepath", nodepath_tokens, nodepath_tokens_bychar,
+    NODEPATH_PIECES, ["", "/a", "a/b=v1/c", "a[b/c=v5]/b=v1/d",
+    "a[b/c=\"v:6\":b/d='v/8']/b", "a[b=c]]", "a]", "a=\"b", "a[b=c",
+    "a=b\"", "a=\"\"/b", "a//b/", "a=b'c"]) == 0:
+	print("PASS")
+else:
+	num_failed += 1
+	print("FAIL")
+
+print("Testing space_parse against the reference parser. Should PASS")
+if compare("space_parse", install_utils.space_parse,
+    install_utils.__space_parse_bychar, SPACE_PIECES,
+    ["", "abc", "abc def", "\"abc def\" 'ghi'", "\"a'b'c\" 'd\"e\"f ghi'",
+    "\"a'bc\" \"d\\\"ef\"", "ab\\", "a\\\\'b'", "'  '", "\"abc"]) == 0:
+	print("PASS")
+else:
+	num_failed += 1
+	print("FAIL")
+
+if num_failed != 0:
+	print("Check your results %d tests didn't perform as expected" % num_failed)
+else:
+	print("Tests performed as expected")
@@ -0,0 +1,184 @@
+#!/usr/bin/python
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+# Copyright (c) 2010, Oracle and/or its affiliates. All rights reserved.
+#
+#
+# Test the cancellation of transfers through a CancelToken: a native
+# TM_CPIO_ENTIRE transfer cancelled before and during the copy, an IPS
+# action cancelled while waiting to retry pkg, and a transfer aborted
+# with tm_abort_transfer() from its progress callback.  A cancelled
+# transfer must return EINTR promptly and leave no threads running.
+#
+import errno
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import transfer_mod
+from libtransfer import *
+from transfer_mod import *
+from osol_install.transfer_copy import CopyEngine
+
+exec(compile(open('./transfer_defs.py', "rb").read(), './transfer_defs.py', 'exec'))
+num_failed = 0
+
+NFILES = 500
+
+top = tempfile.mkdtemp(prefix="transfer_cancel")
+src = top + "/src"
+dst = top + "/dst"
+for i in range(NFILES):
+	if i % 50 == 0:
+		os.makedirs(src + "/dir%d" % i)
+	open(src + "/dir%d/file%d" % (i - i % 50, i), "w").write("x" * i)
+image_info = open(top + "/.image_info", "w")
+image_info.write("IMAGE_SIZE=100\n")
+image_info.close()
+
+# The stand-in for pkg(1) always fails, and counts its runs
+counter = top + "/count"
+stand_in = open(top + "/pkg", "w")
+stand_in.write("""#!/bin/sh
+n=`cat %s 2>/dev/null || echo 0`
+expr $n + 1 > %s
+exit 1
+""" % (counter, counter))
+stand_in.close()
+os.chmod(top + "/pkg", 0o755)
+TMDefs.PKG = top + "/pkg"
+os.makedirs(top + "/image")
+
+threads = threading.active_count()
+
+def entire(cancel=None, callback=None):
+	"""Run a native TM_CPIO_ENTIRE transfer into a new dst, return its
+	status, the seconds it took and the number of files copied"""
+	if os.path.exists(dst):
+		shutil.rmtree(dst)
+	os.mkdir(dst)
+	start = time.time()
+	status = tm_perform_transfer([(TM_ATTR_MECHANISM, TM_PERFORM_CPIO),
+	    (TM_CPIO_ACTION, TM_CPIO_ENTIRE),
+	    (TM_CPIO_ENGINE, TM_CPIO_ENGINE_NATIVE),
+	    (TM_CPIO_DST_MNTPT, dst),
+	    (TM_CPIO_SRC_MNTPT, src),
+	    (TM_ATTR_IMAGE_INFO, top + "/.image_info")], callback, cancel)
+	seconds = time.time() - start
+	copied = sum([len(files) for path, dirs, files in os.walk(dst)])
+	return status, seconds, copied
+
+def stopped(status, seconds):
+	"""Return whether a transfer was cancelled promptly, without
+	leaving threads behind"""
+	return status == errno.EINTR and seconds < 5 and \
+	    threading.active_count() == threads
+
+print("Testing a transfer cancelled before it starts. Should FAIL")
+token = CancelToken()
+token.cancel()
+status, seconds, copied = entire(token)
+if stopped(status, seconds) and copied == 0:
+	print("FAIL")
+else:
+	num_failed += 1
+	print("PASS")
+
+print("Testing a transfer cancelled during the copy. Should FAIL")
+token = CancelToken()
+copy_entry = CopyEngine.copy_entry
+entries = []
+def cancelling_copy_entry(self, src_dir, name, flags="pdum"):
+	"""Copy an entry, cancel the transfer after the first 50"""
+	entries.append(name)
+	if len(entries) == 50:
+		token.cancel()
+	return copy_entry(self, src_dir, name, flags)
+CopyEngine.copy_entry = cancelling_copy_entry
+try:
+	status, seconds, copied = entire(token)
+finally:
+	CopyEngine.copy_entry = copy_entry
+if stopped(status, seconds) and 0 < copied < NFILES:
+	print("FAIL")
+else:
+	num_failed += 1
+	print("PASS")
+
+print("Testing the transfer run again without cancelling. Should PASS")
+status, seconds, copied = entire()
+if status == TM_E_SUCCESS and copied == NFILES and \
+    threading.active_count() == threads:
+	print("PASS")
+else:
+	num_failed += 1
+	print("FAIL")
+
+print("Testing an IPS action cancelled while waiting to retry. Should FAIL")
+backoff = RetryPolicy.backoff
+RetryPolicy.backoff = lambda self, attempt: 60.0
+token = CancelToken()
+timer = threading.Timer(0.5, token.cancel)
+timer.start()
+start = time.time()
+try:
+	status = tm_perform_transfer([(TM_ATTR_MECHANISM, TM_PERFORM_IPS),
+	    (TM_IPS_ACTION, TM_IPS_REFRESH),
+	    (TM_IPS_INIT_MNTPT, top + "/image")], cancel=token)
+finally:
+	RetryPolicy.backoff = backoff
+seconds = time.time() - start
+timer.join()
+if stopped(status, seconds) and int(open(counter).read()) == 1:
+	print("FAIL")
+else:
+	num_failed += 1
+	print("PASS")
+
+print("Testing tm_abort_transfer() from the progress callback. "
+    "Should FAIL")
+reports = []
+def quitting_callback(percent, message):
+	"""Quit the transfer at the first report, as ti_install does"""
+	reports.append(percent)
+	tm_abort_transfer()
+# Report progress to the callback, as libtransfer does
+logprogress = transfer_mod.tmod.logprogress
+transfer_mod.tmod.logprogress = quitting_callback
+try:
+	status, seconds, copied = entire(callback=quitting_callback)
+finally:
+	transfer_mod.tmod.logprogress = logprogress
+if stopped(status, seconds) and reports and copied < NFILES and \
+    not tm_abort_signaled():
+	print("FAIL")
+else:
+	num_failed += 1
+	print("PASS")
+
+shutil.rmtree(top)
+
+if num_failed != 0:
+	print("Check your results %d tests didn't perform as expected" % num_failed)
+else:
+	print("Tests performed as expected")
@@ -0,0 +1,132 @@
+#!/usr/bin/python
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+# Copyright (c) 2010, Oracle and/or its affiliates. All rights reserved.
+#
+#
+# Test the metrics file written for every transfer, with a native copy
+# of a tree the test creates and a stand-in for pkg(1).
+#
+import os
+import shutil
+import tempfile
+
+from libtransfer import *
+from transfer_mod import *
+from transfer_metrics import read_metrics
+
+exec(compile(open('./transfer_defs.py', "rb").read(), './transfer_defs.py', 'exec'))
+num_failed = 0
+
+top = tempfile.mkdtemp(prefix="transfer_metrics")
+src = top + "/src"
+for i in range(5):
+	os.makedirs("%s/dir%d" % (src, i))
+	for j in range(10):
+		open("%s/dir%d/file%d" % (src, i, j), "w").write("x" * 100)
+os.mkdir(top + "/dst")
+os.mkdir(top + "/image")
+image_info = open(top + "/.image_info", "w")
+image_info.write("IMAGE_SIZE=100\n")
+image_info.close()
+skip_file = open(top + "/skip", "w")
+skip_file.write("dir0/file0\n")
+skip_file.close()
+metrics_file = top + "/metrics.json"
+
+stand_in = open(top + "/pkg", "w")
+stand_in.write("#!/bin/sh\nexit 0\n")
+stand_in.close()
+os.chmod(top + "/pkg", 0o755)
+TMDefs.PKG = top + "/pkg"
+
+def last_metrics():
+	"""Return the metrics of the last transfer, None if there are none"""
+	try:
+		return read_metrics(metrics_file)[-1]
+	except (IOError, ValueError, IndexError):
+		return None
+
+print("Testing metrics of an entire transfer. Should PASS")
+status = tm_perform_transfer([(TM_ATTR_MECHANISM, TM_PERFORM_CPIO),
+    (TM_CPIO_ACTION, TM_CPIO_ENTIRE),
+    (TM_CPIO_ENGINE, TM_CPIO_ENGINE_NATIVE),
+    (TM_ATTR_IMAGE_INFO, top + "/.image_info"),
+    (TM_CPIO_ENTIRE_SKIP_FILE_LIST, top + "/skip"),
+    (TM_METRICS_FILE, metrics_file),
+    (TM_CPIO_DST_MNTPT, top + "/dst"),
+    (TM_CPIO_SRC_MNTPT, src)])
+metrics = last_metrics()
+if status == TM_E_SUCCESS and metrics is not None and \
+    metrics["action"] == "entire" and metrics["status"] == TM_E_SUCCESS and \
+    metrics["stages"]["scan"]["files"] == 55 and \
+    metrics["stages"]["copy"]["bytes"] == 5000 and \
+    metrics["stages"]["skip"]["files"] == 1 and "sort" in metrics["stages"]:
+	print("PASS")
+else:
+	num_failed += 1
+	print("FAIL")
+
+print("Testing metrics of an IPS action. Should PASS")
+status = tm_perform_transfer([(TM_ATTR_MECHANISM, TM_PERFORM_IPS),
+    (TM_IPS_ACTION, TM_IPS_REFRESH),
+    (TM_METRICS_FILE, metrics_file),
+    (TM_IPS_INIT_MNTPT, top + "/image")])
+metrics = last_metrics()
+if status == TM_E_SUCCESS and len(read_metrics(metrics_file)) == 2 and \
+    metrics["action"] == "ips_refresh" and \
+    metrics["commands"]["pkg refresh"]["calls"] == 1 and \
+    "ips_refresh" in metrics["stages"]:
+	print("PASS")
+else:
+	num_failed += 1
+	print("FAIL")
+
+print("Testing metrics of a failed transfer. Should FAIL")
+status = tm_perform_transfer([(TM_ATTR_MECHANISM, TM_PERFORM_IPS),
+    (TM_IPS_ACTION, TM_IPS_REFRESH),
+    (TM_METRICS_FILE, metrics_file),
+    (TM_IPS_INIT_MNTPT, top + "/missing")])
+metrics = last_metrics()
+if status == TM_E_SUCCESS or metrics is None or \
+    metrics["status"] != status:
+	num_failed += 1
+	print("PASS")
+else:
+	print("FAIL")
+
+print("Testing unwritable metrics file. Should PASS")
+status = tm_perform_transfer([(TM_ATTR_MECHANISM, TM_PERFORM_IPS),
+    (TM_IPS_ACTION, TM_IPS_REFRESH),
+    (TM_METRICS_FILE, top + "/missing/metrics.json"),
+    (TM_IPS_INIT_MNTPT, top + "/image")])
+if status == TM_E_SUCCESS:
+	print("PASS")
+else:
+	num_failed += 1
+	print("FAIL")
+
+shutil.rmtree(top)
+
+if num_failed != 0:
+	print("Check your results %d tests didn't perform as expected" % num_failed)
+else:
+	print("Tests performed as expected")
@@ -0,0 +1,95 @@
+#!/usr/bin/python
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+# Copyright (c) 2010, Oracle and/or its affiliates. All rights reserved.
+#
+#
+# Test the progress reports of transfers: file lists still being built,
+# bytes estimated from the sizes of the file lists, and the monitor
+# reporting until it's stopped.
+#
+import threading
+import time
+
+import transfer_mod
+from transfer_mod import *
+
+num_failed = 0
+
+reports = []
+transfer_mod.tmod.logprogress = lambda pct, msg: reports.append(pct)
+ProgressMon.INTERVAL = 0.01
+
+print("Testing a transfer with file lists still to come. Should PASS")
+listed = threading.Event()
+progress = TransferProgress(0, 0, listed)
+progress.expect(10)
+progress.update(10)
+progress.list_done()
+pending = progress.fraction()
+listed.set()
+if pending < 1.0 and progress.fraction() == 1.0:
+	print("PASS")
+else:
+	num_failed += 1
+	print("FAIL")
+
+print("Testing bytes estimated from the file list sizes. Should PASS")
+progress = TransferProgress(1000)
+progress.expect(10, 600)
+progress.update(5)
+half = progress.fraction()
+progress.update(5)
+progress.list_done()
+progress.expect(10, 400)
+if abs(half - 0.3) < 0.01 and abs(progress.fraction() - 0.6) < 0.01:
+	print("PASS")
+else:
+	num_failed += 1
+	print("FAIL")
+
+print("Testing the monitor past its end percentage. Should PASS")
+listed.clear()
+progress = TransferProgress(1000, 0, listed)
+monitor = ProgressMon()
+monitor.startmonitor(progress, "Transferring", 0, 95)
+progress.expect(10, 500)
+progress.update(10)
+progress.list_done()
+time.sleep(0.1)
+listed.set()
+progress.expect(10, 500)
+progress.update(10)
+progress.list_done()
+time.sleep(0.1)
+alive = monitor.thread1.is_alive()
+monitor.stop()
+if alive and not monitor.thread1.is_alive() and reports[-1] == 95 and \
+    47 in reports:
+	print("PASS")
+else:
+	num_failed += 1
+	print("FAIL")
+
+if num_failed != 0:
+	print("Check your results %d tests didn't perform as expected" % num_failed)
+else:
+	print("Tests performed as expected")
@@ -0,0 +1,138 @@
+#!/usr/bin/python
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+# Copyright (c) 2010, Oracle and/or its affiliates. All rights reserved.
+#
+#
+# Test that the path index of TreeAcc searches from the root follows
+# add_node() and replace_value().  Searches on indexed paths are
+# interleaved with changes to the tree, on every backend, and must
+# find the same nodes as a tree loaded from a save of the changed one.
+#
+import os
+import shutil
+import tempfile
+
+from osol_install.TreeAcc import TreeAcc, TreeAccNode
+from osol_install.TreeAccBackend import BACKENDS
+
+num_failed = 0
+
+top = tempfile.mkdtemp(prefix="tree_index")
+manifest = open(top + "/manifest.xml", "w")
+manifest.write("""<distro name="test">
+	<img_params>
+		<packages>
+			<pkg name="SUNWcs"/>
+			<pkg name="entire"/>
+		</packages>
+		<output_image>
+			<pathname>/export/a</pathname>
+		</output_image>
+	</img_params>
+	<key_value_pairs>
+		<pair key="k1" value="v1"/>
+	</key_value_pairs>
+</distro>
+""")
+manifest.close()
+
+QUERIES = ["img_params/packages/pkg",
+    "img_params/packages/pkg/name",
+    "distro/img_params/packages/pkg/name",
+    "img_params/packages/pkg[name=extra]/name",
+    "img_params/packages/pkg[name=renamed]/name",
+    "img_params/packages/pkg/ver",
+    "img_params/packages/pkg/ver/rev",
+    "img_params/output_image/pathname",
+    "key_value_pairs/pair",
+    "key_value_pairs/pair/key",
+    "key_value_pairs/pair[key=k2]/value"]
+
+def results(tree):
+	"""Return what the searches of QUERIES find in tree"""
+	return [[(node.get_path(), node.get_value(), node.is_attr())
+	    for node in tree.find_node(query)] for query in QUERIES]
+
+def matches_saved(tree):
+	"""Return whether tree finds what a reload of its save finds"""
+	tree.save_tree(top + "/saved.xml")
+	return results(tree) == results(TreeAcc(top + "/saved.xml"))
+
+def check(ok):
+	"""Count and report the outcome of a test which should pass"""
+	global num_failed
+	if ok:
+		print("PASS")
+	else:
+		num_failed += 1
+		print("FAIL")
+
+for backend in sorted(BACKENDS):
+	tree = TreeAcc(top + "/manifest.xml", backend)
+
+	print("Testing %s: searches filling the index. Should PASS" % backend)
+	check(matches_saved(tree) and
+	    len(tree.find_node("img_params/packages/pkg")) == 2)
+
+	print("Testing %s: add_node() of an element on an indexed path. "
+	    "Should PASS" % backend)
+	pkg = tree.add_node("img_params/packages/pkg", None,
+	    TreeAccNode.ELEMENT, is_unique=False)
+	found = tree.find_node("img_params/packages/pkg")
+	check(matches_saved(tree) and len(found) == 3 and found[2] is pkg)
+
+	print("Testing %s: add_node() of an attribute and of elements below "
+	    "the new element. Should PASS" % backend)
+	tree.add_node("name", "extra", TreeAccNode.ATTRIBUTE, pkg)
+	tree.add_node("ver", "1.0", TreeAccNode.ELEMENT, pkg)
+	tree.add_node("img_params/packages/pkg/ver/rev", "2",
+	    TreeAccNode.ELEMENT)
+	check(matches_saved(tree) and
+	    len(tree.find_node("img_params/packages/pkg[name=extra]/name")) == 1
+	    and len(tree.find_node("img_params/packages/pkg/ver/rev")) == 1)
+
+	print("Testing %s: replace_value() of an attribute and of an "
+	    "element. Should PASS" % backend)
+	tree.replace_value("img_params/packages/pkg[name=extra]/name",
+	    "renamed")
+	tree.replace_value("img_params/output_image/pathname", "/export/b")
+	check(matches_saved(tree) and
+	    not tree.find_node("img_params/packages/pkg[name=extra]/name") and
+	    tree.find_node("img_params/output_image/pathname")[0].get_value()
+	    == "/export/b")
+
+	print("Testing %s: add_node() of a sibling with attributes. "
+	    "Should PASS" % backend)
+	pair = tree.add_node("key_value_pairs/pair", None,
+	    TreeAccNode.ELEMENT, is_unique=False)
+	tree.add_node("key", "k2", TreeAccNode.ATTRIBUTE, pair)
+	tree.add_node("value", "v2", TreeAccNode.ATTRIBUTE, pair)
+	values = tree.find_node("key_value_pairs/pair[key=k2]/value")
+	check(matches_saved(tree) and len(values) == 1 and
+	    values[0].get_value() == "v2")
+
+shutil.rmtree(top)
+
+if num_failed != 0:
+	print("Check your results %d tests didn't perform as expected" % num_failed)
+else:
+	print("Tests performed as expected")
@@ -0,0 +1,140 @@
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+# Copyright (c) 2010, Oracle and/or its affiliates. All rights reserved.
+#
+""" Batched package installs for the Slim Install Transfer Module
+
+    A long package list can be installed in batches, one pkg install
+    per batch.  The batches that finished are recorded in a state file
+    in the image, so an install that failed resumes from the first
+    batch that didn't finish instead of starting over.
+    """
+import hashlib
+import json
+import os
+import tempfile
+
+# Version of the state file format
+STATE_VERSION = 1
+
+# Name of the state file, in the root of the image
+STATE_FILE = ".tm_install_state"
+
+
+def pkg_stem(pkg):
+    """Return the stem of the package name or FMRI pkg"""
+    if pkg.startswith("pkg:/"):
+        pkg = pkg[len("pkg:/"):]
+    return pkg.split("@", 1)[0]
+
+
+def is_incorporation(pkg):
+    """Return True if pkg looks like an incorporation, a package which
+       constrains the versions of others.
+       """
+    stem = pkg_stem(pkg)
+    return stem == "entire" or "incorporation" in stem.split("/")[-1]
+
+
+def split_batches(pkgs, size):
+    """Split the package list pkgs into batches of at most size
+       packages.  Incorporations go in the first batch, so they
+       constrain the versions installed by the later ones.  The other
+       packages keep their order.  Returns the list of batches.
+       """
+    first = [pkg for pkg in pkgs if is_incorporation(pkg)]
+    rest = [pkg for pkg in pkgs if not is_incorporation(pkg)]
+    ordered = first + rest
+    return [ordered[idx:idx + size] for idx in range(0, len(ordered), size)]
+
+
+class BatchState(object):
+    """Record of the batches of an install that finished.
+
+       The record is only used for the same package list split the same
+       way: it holds a digest of the batches, and a record with another
+       digest is ignored.
+       """
+
+    def __init__(self, image, batches):
+        self.name = os.path.join(image, STATE_FILE)
+        self.batches = batches
+        digest = hashlib.sha256()
+        for batch in batches:
+            digest.update(("\n".join(batch) + "\n\n").encode("utf-8"))
+        self.digest = digest.hexdigest()
+        self.done = {}
+
+    def load(self):
+        """Read the batches that finished in an earlier run.  Returns
+           the index of the first batch to install.
+           """
+        self.done = {}
+        try:
+            with open(self.name, 'r') as handle:
+                state = json.load(handle)
+        except (IOError, ValueError):
+            return 0
+        if not isinstance(state, dict) or \
+            state.get("version") != STATE_VERSION or \
+            state.get("digest") != self.digest:
+            return 0
+        for idx, seconds in state.get("done", {}).items():
+            self.done[int(idx)] = seconds
+        return self.first_pending()
+
+    def first_pending(self):
+        """Return the index of the first batch that didn't finish"""
+        idx = 0
+        while idx in self.done:
+            idx += 1
+        return idx
+
+    def finish(self, idx, seconds):
+        """Record that batch idx finished in seconds.  Raises IOError or
+           OSError if the state file can't be written.
+           """
+        self.done[idx] = round(seconds, 3)
+        state = {"version": STATE_VERSION,
+                 "digest": self.digest,
+                 "batches": len(self.batches),
+                 "done": dict([(str(key), val) for key, val in
+                               self.done.items()])}
+        # Replace the file as a whole, so an interrupted write never
+        # leaves a partial record.
+        fd, tmp_name = tempfile.mkstemp(prefix=STATE_FILE,
+                                        dir=os.path.dirname(self.name))
+        try:
+            with os.fdopen(fd, 'w') as handle:
+                json.dump(state, handle, sort_keys=True)
+            os.rename(tmp_name, self.name)
+        except:
+            os.unlink(tmp_name)
+            raise
+
+    def remove(self):
+        """Remove the state file once every batch finished, so it
+           doesn't end up in the image.
+           """
+        try:
+            os.unlink(self.name)
+        except OSError:
+            pass
@@ -0,0 +1,207 @@
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+# Copyright (c) 2010, Oracle and/or its affiliates. All rights reserved.
+#
+""" Package catalog cache for the Slim Install Transfer Module
+
+    Verifying that the packages of a build are in the repository asks
+    the repository about every one of them, on every build, although
+    the catalog rarely changes between builds.  The cache remembers the
+    packages found in a catalog.  It is keyed by a digest of the origins
+    of each publisher of the image and of the last-modified time of its
+    catalog, so a catalog that changed, or another repository, gets a
+    new key and nothing stale is ever answered.
+    """
+import configparser
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+# Number of catalog keys kept in the cache, least recently used first out
+CACHE_KEYS = 8
+
+# Name of the file listing the packages found, in each key directory
+VERIFIED_FILE = "packages"
+
+
+def image_config(image):
+    """Return the pathname of the configuration file of the pkg image
+       at image, None if there is none.
+       """
+    for name in ("pkg5.image", "cfg_cache"):
+        path = os.path.join(image, "var/pkg", name)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def catalog_last_modified(image, pub):
+    """Return the last-modified time of the catalog of publisher pub in
+       the pkg image at image, None if the catalog wasn't retrieved.
+       """
+    attrs = os.path.join(image, "var/pkg/publisher", pub,
+                         "catalog/catalog.attrs")
+    try:
+        with open(attrs, 'r') as handle:
+            return json.load(handle).get("last-modified")
+    except IOError:
+        pass
+    except ValueError:
+        return None
+
+    # Older images keep the catalog attributes as text
+    attrs = os.path.join(image, "var/pkg/catalog", pub, "attrs")
+    try:
+        with open(attrs, 'r') as handle:
+            for line in handle:
+                if line.startswith("S Last-Modified:"):
+                    return line.split(":", 1)[1].strip()
+    except IOError:
+        pass
+    return None
+
+
+def catalog_fingerprint(image):
+    """Return the digest identifying the catalogs of the pkg image at
+       image: the origins of each publisher and the last-modified time
+       of its catalog.  Returns None if the image configuration can't
+       be read or a catalog wasn't retrieved yet.
+       """
+    config_file = image_config(image)
+    if config_file is None:
+        return None
+    config = configparser.RawConfigParser()
+    try:
+        config.read(config_file)
+    except configparser.Error:
+        return None
+
+    pubs = []
+    for section in sorted(config.sections()):
+        for prefix in ("authority_", "publisher_"):
+            if section.startswith(prefix):
+                break
+        else:
+            continue
+        pub = section[len(prefix):]
+        origins = []
+        for option in ("origin", "origins"):
+            if config.has_option(section, option):
+                origins.append(config.get(section, option))
+        modified = catalog_last_modified(image, pub)
+        if modified is None:
+            return None
+        pubs.append((pub, origins, modified))
+
+    if not pubs:
+        return None
+    return hashlib.sha256(json.dumps(pubs).encode("utf-8")).hexdigest()
+
+
+class CatalogCache(object):
+    """Packages known to be in the catalogs of a pkg image.
+
+       The cache is a directory with one subdirectory per catalog
+       fingerprint.  Each holds the list of the package names found in
+       that catalog.  A fingerprint can't be computed for an image whose
+       catalogs weren't retrieved, in which case the cache holds
+       nothing and remembers nothing.
+       """
+
+    def __init__(self, cache_dir, image):
+        self.cache_dir = cache_dir
+        self.key = catalog_fingerprint(image)
+        if self.key is None:
+            self.key_dir = None
+        else:
+            self.key_dir = os.path.join(cache_dir, self.key)
+
+    def verified(self):
+        """Return the set of package names found in the catalogs"""
+        if self.key_dir is None:
+            return set()
+        verified_file = os.path.join(self.key_dir, VERIFIED_FILE)
+        try:
+            with open(verified_file, 'r') as handle:
+                pkgs = set([line.rstrip("\n") for line in handle])
+        except IOError:
+            return set()
+        # Keep the recently used keys from being pruned
+        try:
+            os.utime(self.key_dir, None)
+        except OSError:
+            pass
+        return pkgs
+
+    def unverified(self, pkgs):
+        """Return the names of pkgs not known to be in the catalogs,
+           in the order of pkgs.
+           """
+        known = self.verified()
+        return [pkg for pkg in pkgs if pkg not in known]
+
+    def add_verified(self, pkgs):
+        """Remember that the package names pkgs were found in the
+           catalogs.  Raises OSError or IOError if the cache can't be
+           written.
+           """
+        if self.key_dir is None or not pkgs:
+            return
+        known = self.verified()
+        known.update(pkgs)
+        if not os.path.isdir(self.key_dir):
+            os.makedirs(self.key_dir)
+        # Write a new list and rename it over the old one, so concurrent
+        # builds never read a partial list.
+        fd, tmp_name = tempfile.mkstemp(prefix=".packages",
+                                        dir=self.key_dir)
+        try:
+            with os.fdopen(fd, 'w') as handle:
+                for pkg in sorted(known):
+                    handle.write(pkg + "\n")
+            os.rename(tmp_name, os.path.join(self.key_dir, VERIFIED_FILE))
+        except:
+            os.unlink(tmp_name)
+            raise
+        self.prune()
+
+    def prune(self):
+        """Remove all but the CACHE_KEYS most recently used keys"""
+        try:
+            names = os.listdir(self.cache_dir)
+        except OSError:
+            return
+        keys = []
+        for name in names:
+            # Only touch what looks like a key
+            if len(name) != len(self.key) or \
+                name.strip("0123456789abcdef") != "":
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                keys.append((os.stat(path).st_mtime, path))
+            except OSError:
+                continue
+        keys.sort(reverse=True)
+        for mtime, path in keys[CACHE_KEYS:]:
+            shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,983 @@
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+# Copyright (c) 2010, Oracle and/or its affiliates. All rights reserved.
+#
+""" Native copy engine for the Slim Install Transfer Module
+
+    The engine copies the pathnames listed in a cpio file list using a
+    pool of worker threads, instead of feeding the list to cpio -p.  It
+    mimics the behaviour of "cpio -pdum": parent directories are created
+    as needed, existing files are replaced, modification times are kept,
+    and ownership is kept when running as root.  Hardlinks, symbolic
+    links and special files are recreated on the destination.
+
+    File data is cloned when the filesystem can share blocks between
+    files, otherwise it's copied in the kernel with copy_file_range() or
+    sendfile() when available, and only read and written by the engine
+    as a last resort.  Holes of sparse files are kept.
+
+    When the engine reads and writes the data itself, large files can
+    be copied by a pipeline: the worker reads the file into buffers
+    taken from a pool while a writer thread writes the buffers already
+    filled, so the time spent waiting on a slow source and on a slow
+    destination overlaps instead of adding up.
+
+    Optionally, regular files whose contents are identical are
+    hardlinked together on the destination instead of being written
+    again.
+
+    Optionally, the data of regular files is hashed as it is copied, see
+    transfer_verify.  Data which never leaves the kernel can't be
+    hashed, so files are then neither cloned nor copied in the kernel.
+
+    It also provides the batch removal used to clobber and skip listed
+    pathnames on the destination.
+    """
+import errno
+import hashlib
+import os
+import sys
+import queue
+import stat as st
+import threading
+import time
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from osol_install.transfer_verify import new_digest, hash_zeroes
+
+# Number of worker threads used when the caller doesn't ask for
+# a specific number.  Copying is mostly bound by I/O so use a few more
+# threads than there are CPUs, but don't go overboard.
+DEFAULT_WORKERS = max(2, min(16, (os.cpu_count() or 1) * 2))
+
+# Size of the buffer used to copy file data
+COPY_BUFSIZE = 1024 * 1024
+
+# Maximum number of pathnames queued up in front of the workers
+QUEUE_DEPTH = 4096
+
+# Maximum number of bytes handed to copy_file_range() or sendfile() at once
+RANGE_CHUNK = 64 * 1024 * 1024
+
+# ioctl(2) request cloning a whole file (FICLONE), only known on Linux
+if sys.platform.startswith("linux"):
+    FICLONE = 0x40049409
+else:
+    FICLONE = None
+
+# Errors telling that a way of copying data isn't supported between two
+# files, meaning the next one should be tried.
+FALLBACK_ERRNOS = frozenset([errno.EXDEV, errno.ENOSYS, errno.EINVAL,
+                             errno.EOPNOTSUPP, errno.ENOTTY, errno.EBADF,
+                             getattr(errno, "ENOTSUP", errno.EOPNOTSUPP)])
+
+# Files smaller than this aren't worth deduplicating
+DEDUP_MIN_SIZE = 1024
+
+# Size of the buffers of the copy pipelines
+PIPELINE_BUFSIZE = 1024 * 1024
+
+# Data segments smaller than this are copied without a pipeline
+PIPELINE_MIN_SIZE = 8 * 1024 * 1024
+
+# Maximum number of buffers written by a single call
+PIPELINE_MAX_IOV = 16
+
+
+class CopyStats(object):
+    """Throughput counters for a single copy worker"""
+    def __init__(self, name):
+        self.name = name
+        self.files = 0
+        self.nbytes = 0
+        self.errors = 0
+        self.busy_time = 0.0
+
+    def rate(self):
+        """Return the throughput of this worker in bytes per second"""
+        if self.busy_time <= 0:
+            return 0.0
+        return self.nbytes / self.busy_time
+
+    def __str__(self):
+        return "%s: %d files, %.1f MB, %.1f MB/s, %d errors" % \
+            (self.name, self.files, self.nbytes / 1048576.0,
+             self.rate() / 1048576.0, self.errors)
+
+
+class DedupStats(object):
+    """Counters of the deduplication of identical files"""
+    def __init__(self):
+        self.hashed = 0
+        self.linked = 0
+        self.bytes_saved = 0
+
+    def __str__(self):
+        return "Deduplication: %d files hashed, %d files linked, " \
+            "%.1f MB saved" % (self.hashed, self.linked,
+                               self.bytes_saved / 1048576.0)
+
+
+class PipelineStats(object):
+    """Counters of the pipelined copies"""
+    def __init__(self):
+        self.files = 0
+        self.nbytes = 0
+        self.read_time = 0.0
+        self.write_time = 0.0
+        self.wall_time = 0.0
+
+    def __str__(self):
+        return "Pipeline: %d files, %.1f MB, %.1f s reading, " \
+            "%.1f s writing, %.1f s elapsed" % \
+            (self.files, self.nbytes / 1048576.0, self.read_time,
+             self.write_time, self.wall_time)
+
+
+class BufferPool(object):
+    """Buffers shared by the copy pipelines.  Up to nbuffers buffers of
+       size bytes are allocated, as they're needed, and reused.  get()
+       waits for a buffer to be put back once they're all in use.
+       """
+    def __init__(self, nbuffers, size=PIPELINE_BUFSIZE):
+        self.nbuffers = max(1, nbuffers)
+        self.size = size
+        self.allocated = 0
+        self._free = []
+        self._cond = threading.Condition()
+
+    def get(self):
+        """Return a free buffer, as a bytearray"""
+        with self._cond:
+            while not self._free:
+                if self.allocated < self.nbuffers:
+                    self.allocated += 1
+                    return bytearray(self.size)
+                self._cond.wait()
+            return self._free.pop()
+
+    def put(self, buf):
+        """Give back a buffer returned by get()"""
+        with self._cond:
+            self._free.append(buf)
+            self._cond.notify()
+
+
+def read_into(fd, view, offset):
+    """Read into the memoryview view from offset of the file open on
+       fd.  Returns the number of bytes read.
+       """
+    if hasattr(os, "preadv"):
+        return os.preadv(fd, [view], offset)
+    os.lseek(fd, offset, os.SEEK_SET)
+    return os.readv(fd, [view])
+
+
+def write_views(fd, views, offset):
+    """Write the memoryviews views at offset of the file open on fd,
+       with a single system call unless it writes less than asked.
+       """
+    if hasattr(os, "pwritev"):
+        written = os.pwritev(fd, views, offset)
+    else:
+        os.lseek(fd, offset, os.SEEK_SET)
+        written = os.writev(fd, views)
+    # Finish a short write one buffer at a time
+    for view in views:
+        if written >= len(view):
+            written -= len(view)
+            offset += len(view)
+            continue
+        view = view[written:]
+        offset += written
+        written = 0
+        while len(view):
+            count = os.pwrite(fd, view, offset)
+            view = view[count:]
+            offset += count
+
+
+class DedupEntry(object):
+    """A regular file copied to the destination, which later files of
+       the same size and attributes may be linked to.  done is set once
+       the copy is finished, ok tells whether it succeeded.
+       """
+    def __init__(self, src, dst):
+        self.src = src
+        self.dst = dst
+        self.digest = None
+        self.ok = False
+        self.done = threading.Event()
+
+
+def data_segments(fd, size):
+    """Generate the (offset, length) of the data segments of the first
+       size bytes of the file open on fd, skipping holes.  The whole
+       file is a single segment when holes can't be found.
+       """
+    if not hasattr(os, "SEEK_DATA"):
+        if size:
+            yield (0, size)
+        return
+    offset = 0
+    while offset < size:
+        try:
+            data = os.lseek(fd, offset, os.SEEK_DATA)
+        except OSError as err:
+            if err.errno == errno.ENXIO:
+                # Nothing but a hole up to the end of the file
+                return
+            yield (offset, size - offset)
+            return
+        if data >= size:
+            return
+        hole = min(os.lseek(fd, data, os.SEEK_HOLE), size)
+        yield (data, hole - data)
+        offset = hole
+
+
+def _range_copy_file_range(src_fd, dst_fd, offset, length, buf,
+                           digest=None):
+    """Copy part of a range with copy_file_range(2)"""
+    return os.copy_file_range(src_fd, dst_fd, min(length, RANGE_CHUNK),
+                              offset, offset)
+
+
+def _range_sendfile(src_fd, dst_fd, offset, length, buf, digest=None):
+    """Copy part of a range with sendfile(2)"""
+    os.lseek(dst_fd, offset, os.SEEK_SET)
+    return os.sendfile(dst_fd, src_fd, offset, min(length, RANGE_CHUNK))
+
+
+def _range_buffered(src_fd, dst_fd, offset, length, buf, digest=None):
+    """Copy part of a range through buf, adding the data to digest if
+       given.
+       """
+    view = memoryview(buf)[:min(length, len(buf))]
+    count = os.preadv(src_fd, [view], offset)
+    if digest is not None:
+        digest.update(view[:count])
+    written = 0
+    while written < count:
+        written += os.pwrite(dst_fd, view[written:count], offset + written)
+    return count
+
+
+def _range_pread(src_fd, dst_fd, offset, length, buf, digest=None):
+    """Copy part of a range with pread/pwrite, when preadv is missing,
+       adding the data to digest if given.
+       """
+    data = os.pread(src_fd, min(length, len(buf)), offset)
+    if digest is not None:
+        digest.update(data)
+    written = 0
+    while written < len(data):
+        written += os.pwrite(dst_fd, data[written:], offset + written)
+    return len(data)
+
+
+# Ways of copying a range of a file, in order of preference, along with
+# the name used in the statistics.  Only the "buffered" one can hash the
+# data it copies.
+RANGE_METHODS = []
+if hasattr(os, "copy_file_range"):
+    RANGE_METHODS.append(("copy_file_range", _range_copy_file_range))
+if hasattr(os, "sendfile") and sys.platform.startswith("linux"):
+    RANGE_METHODS.append(("sendfile", _range_sendfile))
+if hasattr(os, "preadv"):
+    RANGE_METHODS.append(("buffered", _range_buffered))
+else:
+    RANGE_METHODS.append(("buffered", _range_pread))
+
+
+def file_digest(path):
+    """Return the SHA-256 digest of the contents of path"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        while True:
+            data = handle.read(COPY_BUFSIZE)
+            if not data:
+                break
+            digest.update(data)
+    return digest.digest()
+
+
+class CopyEngine(object):
+    """Copy the pathnames of cpio file lists to a destination directory
+       using a pool of worker threads.
+
+       dst_mntpt - destination directory
+       nworkers - number of copy threads
+       abort_check - callable returning True when the transfer should stop
+       info_msg, dbg_msg, err_msg - logging callables taking a string
+       progress - object whose update(nfiles, nbytes) method is called
+                  as pathnames are copied
+       dedup - when True, a regular file identical to one already copied,
+               with the same size, mode and ownership, is hardlinked to
+               it instead of being copied.  The linked files share the
+               modification time of the first copy.
+       pipeline_depth - when not 0, data segments of at least
+               PIPELINE_MIN_SIZE bytes which the engine has to read and
+               write itself are copied by a pipeline, reading up to
+               pipeline_depth buffers ahead of the writes.
+       checksum - when True, the data of every regular file copied is
+               hashed, and its checksum and size are kept in checksums
+               by pathname relative to dst_mntpt.
+       """
+
+    def __init__(self, dst_mntpt, nworkers=DEFAULT_WORKERS,
+                 abort_check=None, info_msg=None, dbg_msg=None, err_msg=None,
+                 progress=None, dedup=False, pipeline_depth=0,
+                 checksum=False):
+        self.dst_mntpt = dst_mntpt
+        self.progress = progress
+        self.dedup = dedup
+        self.dedup_stats = DedupStats()
+        self.pipeline_depth = max(0, int(pipeline_depth))
+        self.pipeline_stats = PipelineStats()
+        self.checksums = None
+        if checksum:
+            self.checksums = {}
+        # DedupEntry lists, keyed by size and attributes
+        self._dedup_index = {}
+        self.nworkers = max(1, int(nworkers))
+        self._pool = None
+        if self.pipeline_depth:
+            self._pool = BufferPool(self.pipeline_depth * self.nworkers)
+        self.abort_check = abort_check
+        self.info_msg = info_msg or (lambda msg: None)
+        self.dbg_msg = dbg_msg or (lambda msg: None)
+        self.err_msg = err_msg or self.info_msg
+        self.stats = []
+        self.aborted = False
+        self._preserve_owner = (os.geteuid() == 0)
+        self._queue = None
+        self._lock = threading.Lock()
+        self._links = {}
+        self._dirs = []
+        self._made_dirs = set()
+        self._failure = None
+        # Bytes copied by each method, and the methods which don't work
+        # between pairs of devices.
+        self.method_bytes = {}
+        self._unsupported = set()
+
+    def copy_filelist(self, list_name, src_dir, cpio_args="pdum"):
+        """Copy every pathname listed in list_name.  Pathnames are
+           relative to src_dir and are recreated under dst_mntpt.
+           cpio_args is honoured the way cpio -p would: "d" creates
+           missing directories, "u" replaces existing files
+           unconditionally and "m" keeps modification times.
+           Returns the number of pathnames which could not be copied.
+           """
+        self._queue = queue.Queue(QUEUE_DEPTH)
+        self._links = {}
+        self._dirs = []
+        self._made_dirs = set()
+        self._failure = None
+        flags = cpio_args or ""
+
+        workers = []
+        run_stats = []
+        for i in range(self.nworkers):
+            stats = CopyStats("Copy worker " + str(i))
+            run_stats.append(stats)
+            thr = threading.Thread(target=self._worker,
+                                   args=(src_dir, flags, stats))
+            thr.daemon = True
+            workers.append(thr)
+            thr.start()
+
+        try:
+            with open(list_name, 'r') as list_handle:
+                for line in list_handle:
+                    if self._aborting():
+                        break
+                    name = line.rstrip("\n")
+                    if name:
+                        self._queue.put(name)
+        finally:
+            for thr in workers:
+                self._queue.put(None)
+            for thr in workers:
+                thr.join()
+
+        if self._failure is not None:
+            raise self._failure
+
+        # Directory metadata is applied last, deepest directories first,
+        # since creating entries inside a directory changes its mtime.
+        errors = 0
+        if not self.aborted:
+            self._dirs.sort(key=lambda ent: ent[0].count("/"), reverse=True)
+            for dst, sst in self._dirs:
+                try:
+                    self._set_metadata(dst, sst, flags)
+                except OSError as err:
+                    self.err_msg("Unable to set attributes of " + dst +
+                                 ": " + str(err))
+                    errors += 1
+
+        self.stats.extend(run_stats)
+        return errors + sum([stats.errors for stats in run_stats])
+
+    def _aborting(self):
+        """Check whether the caller asked to stop the copy"""
+        if not self.aborted and self.abort_check is not None and \
+            self.abort_check():
+            self.aborted = True
+        return self.aborted
+
+    def _worker(self, src_dir, flags, stats):
+        """Worker thread: copy pathnames taken from the queue"""
+        while True:
+            name = self._queue.get()
+            if name is None:
+                return
+            if self.aborted or self._failure is not None:
+                continue
+            start = time.time()
+            nbytes = 0
+            try:
+                nbytes = self.copy_entry(src_dir, name, flags)
+                stats.nbytes += nbytes
+                stats.files += 1
+            except (OSError, IOError) as err:
+                stats.errors += 1
+                self.err_msg("Unable to copy " + name + ": " + str(err))
+            except Exception as err:
+                self._failure = err
+            stats.busy_time += time.time() - start
+            if self.progress is not None:
+                self.progress.update(1, nbytes)
+
+    def _make_parent(self, dst, flags):
+        """Create the parent directory of dst if asked to"""
+        parent = os.path.dirname(dst)
+        if "d" not in flags or parent in self._made_dirs:
+            return
+        try:
+            os.makedirs(parent)
+        except OSError as err:
+            if err.errno != errno.EEXIST:
+                raise
+        self._made_dirs.add(parent)
+
+    def _remove_existing(self, dst, sst, flags):
+        """Get an existing non-directory entry out of the way.
+           Returns False if the existing entry is to be kept.
+           """
+        if "u" not in flags:
+            try:
+                dst_st = os.lstat(dst)
+            except OSError:
+                return True
+            if dst_st.st_mtime >= sst.st_mtime:
+                self.dbg_msg("Existing " + dst + " is current, skipped")
+                return False
+        try:
+            os.unlink(dst)
+        except OSError as err:
+            if err.errno != errno.ENOENT:
+                raise
+        return True
+
+    def copy_entry(self, src_dir, name, flags="pdum"):
+        """Copy a single pathname.  Returns the number of bytes copied."""
+        rel = name.lstrip("/")
+        src = os.path.join(src_dir, rel)
+        dst = os.path.normpath(os.path.join(self.dst_mntpt, rel))
+        sst = os.lstat(src)
+        mode = sst.st_mode
+
+        if st.S_ISDIR(mode):
+            try:
+                os.mkdir(dst, st.S_IMODE(mode) | st.S_IRWXU)
+            except OSError as err:
+                if err.errno == errno.ENOENT and "d" in flags:
+                    os.makedirs(dst)
+                elif err.errno != errno.EEXIST:
+                    raise
+            with self._lock:
+                self._dirs.append((dst, sst))
+                self._made_dirs.add(dst)
+            return 0
+
+        self._make_parent(dst, flags)
+        if not self._remove_existing(dst, sst, flags):
+            return 0
+
+        # Files with more than one link are linked to the first copy
+        # made, the way cpio preserves hardlinks.
+        if sst.st_nlink > 1:
+            key = (sst.st_dev, sst.st_ino)
+            with self._lock:
+                link = self._links.get(key)
+                if link is None:
+                    self._links[key] = (dst, threading.Event())
+            if link is not None:
+                first, done = link
+                done.wait()
+                os.link(first, dst)
+                self._link_checksum(first, dst)
+                return 0
+            try:
+                return self._create(src, dst, sst, flags)
+            finally:
+                self._links[key][1].set()
+
+        if self.dedup and st.S_ISREG(mode) and sst.st_size >= DEDUP_MIN_SIZE:
+            return self._dedup_create(src, dst, sst, flags)
+        return self._create(src, dst, sst, flags)
+
+    def _dedup_create(self, src, dst, sst, flags):
+        """Create dst as a link to an identical file copied earlier,
+           or as a copy of src if there's none.  Only files with the
+           same size and attributes are compared, so most files never
+           need to be hashed.
+           """
+        key = (sst.st_size, sst.st_mode, sst.st_uid, sst.st_gid)
+        entry = DedupEntry(src, dst)
+        with self._lock:
+            candidates = self._dedup_index.setdefault(key, [])
+            earlier = list(candidates)
+            candidates.append(entry)
+
+        try:
+            if earlier:
+                entry.digest = self._digest(src)
+                for cand in earlier:
+                    cand.done.wait()
+                    if not cand.ok:
+                        continue
+                    if cand.digest is None:
+                        cand.digest = self._digest(cand.src)
+                    if cand.digest != entry.digest:
+                        continue
+                    try:
+                        os.link(cand.dst, dst)
+                    except OSError as err:
+                        # Too many links, or another filesystem
+                        # mounted under the destination: copy instead.
+                        self.dbg_msg("Unable to link " + dst + " to " +
+                                     cand.dst + ": " + str(err))
+                        break
+                    self._link_checksum(cand.dst, dst)
+                    entry.ok = True
+                    with self._lock:
+                        self.dedup_stats.linked += 1
+                        self.dedup_stats.bytes_saved += sst.st_size
+                    return 0
+            nbytes = self._create(src, dst, sst, flags)
+            entry.ok = True
+            return nbytes
+        finally:
+            entry.done.set()
+
+    def _digest(self, path):
+        """Hash the contents of path, counting it"""
+        digest = file_digest(path)
+        with self._lock:
+            self.dedup_stats.hashed += 1
+        return digest
+
+    def _create(self, src, dst, sst, flags):
+        """Create dst as a copy of the non-directory entry src"""
+        mode = sst.st_mode
+        nbytes = 0
+        if st.S_ISREG(mode):
+            nbytes = self.copy_file(src, dst, sst)
+        elif st.S_ISLNK(mode):
+            os.symlink(os.readlink(src), dst)
+        elif st.S_ISCHR(mode) or st.S_ISBLK(mode):
+            os.mknod(dst, mode, sst.st_rdev)
+        elif st.S_ISFIFO(mode):
+            os.mkfifo(dst, st.S_IMODE(mode))
+        else:
+            self.dbg_msg("Skipping " + src + ": unsupported file type")
+            return 0
+        self._set_metadata(dst, sst, flags)
+        return nbytes
+
+    def copy_file(self, src, dst, sst):
+        """Copy the data of regular file src into a new file dst.
+           Returns the number of bytes copied.
+           """
+        src_fd = os.open(src, os.O_RDONLY)
+        try:
+            dst_fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_EXCL,
+                             st.S_IMODE(sst.st_mode) | st.S_IWUSR)
+            try:
+                digest = None
+                if self.checksums is not None:
+                    digest = new_digest()
+                nbytes = self._copy_data(src_fd, dst_fd, sst, digest)
+            finally:
+                os.close(dst_fd)
+        finally:
+            os.close(src_fd)
+        if digest is not None:
+            rel = os.path.relpath(dst, self.dst_mntpt)
+            with self._lock:
+                self.checksums[rel] = (digest.hexdigest(), sst.st_size)
+        return nbytes
+
+    def _copy_data(self, src_fd, dst_fd, sst, digest=None):
+        """Copy the data of the file open on src_fd to the empty file
+           open on dst_fd, cloning it if possible, and keeping holes
+           otherwise.  If digest is given, the data is added to it, holes
+           included, and never cloned.  Returns the number of bytes
+           copied.
+           """
+        size = sst.st_size
+        if size == 0:
+            return 0
+        devs = (sst.st_dev, os.fstat(dst_fd).st_dev)
+        if digest is None and self._clone(src_fd, dst_fd, devs):
+            self._count_method("clone", size)
+            return size
+
+        nbytes = 0
+        end = 0
+        buf = None
+        for offset, length in data_segments(src_fd, size):
+            if buf is None:
+                buf = bytearray(min(COPY_BUFSIZE, size))
+            if digest is not None:
+                hash_zeroes(digest, offset - end)
+            count = self._copy_range(src_fd, dst_fd, offset, length, devs,
+                                     buf, digest)
+            nbytes += count
+            end = offset + count
+        # Extend the file over a trailing hole
+        if end < size:
+            os.ftruncate(dst_fd, size)
+            if digest is not None:
+                hash_zeroes(digest, size - end)
+        return nbytes
+
+    def _link_checksum(self, first, dst):
+        """Record for dst, a link to first, the checksum of first"""
+        if self.checksums is None:
+            return
+        with self._lock:
+            rec = self.checksums.get(os.path.relpath(first, self.dst_mntpt))
+            if rec is not None:
+                self.checksums[os.path.relpath(dst, self.dst_mntpt)] = rec
+
+    def _clone(self, src_fd, dst_fd, devs):
+        """Make dst_fd share the blocks of src_fd.  Returns False when
+           the filesystems can't do it.
+           """
+        if fcntl is None or FICLONE is None or \
+            ("clone", devs) in self._unsupported:
+            return False
+        try:
+            fcntl.ioctl(dst_fd, FICLONE, src_fd)
+        except (OSError, IOError) as err:
+            if err.errno not in FALLBACK_ERRNOS:
+                raise
+            with self._lock:
+                self._unsupported.add(("clone", devs))
+            return False
+        return True
+
+    def _copy_range(self, src_fd, dst_fd, offset, length, devs, buf,
+                    digest=None):
+        """Copy length bytes at offset from src_fd to dst_fd using the
+           first of RANGE_METHODS which works between the two
+           filesystems, the buffered one if digest is given to hash the
+           data.  Returns the number of bytes copied, which is less than
+           length if the file got shorter.
+           """
+        done = 0
+        for name, method in RANGE_METHODS:
+            if (name, devs) in self._unsupported:
+                continue
+            if digest is not None and name != "buffered":
+                continue
+            if name == "buffered" and self._pool is not None and \
+                length >= PIPELINE_MIN_SIZE:
+                name, method = "pipeline", self._range_pipeline
+            copied = 0
+            try:
+                while done < length and not self._aborting():
+                    count = method(src_fd, dst_fd, offset + done,
+                                   length - done, buf, digest)
+                    if count == 0:
+                        length = done
+                        break
+                    done += count
+                    copied += count
+            except OSError as err:
+                if name in ("buffered", "pipeline") or \
+                    err.errno not in FALLBACK_ERRNOS:
+                    raise
+                with self._lock:
+                    self._unsupported.add((name, devs))
+                continue
+            finally:
+                self._count_method(name, copied)
+            return done
+        return done
+
+    def _range_pipeline(self, src_fd, dst_fd, offset, length, buf,
+                        digest=None):
+        """Copy a range with a pipeline.  The calling thread reads the
+           range into buffers of the pool, adds them to digest if given,
+           and queues them, a writer thread writes them out.  Returns the
+           number of bytes copied, less than length if the file got
+           shorter or the copy was aborted.
+           """
+        start = time.time()
+        filled = queue.Queue(self.pipeline_depth)
+        result = {"write_time": 0.0, "failure": None}
+        writer = threading.Thread(target=self._pipeline_writer,
+                                  args=(dst_fd, filled, result))
+        writer.daemon = True
+        writer.start()
+        read_time = 0.0
+        done = 0
+        try:
+            while done < length and result["failure"] is None and \
+                not self._aborting():
+                pbuf = self._pool.get()
+                read_start = time.time()
+                try:
+                    count = read_into(src_fd, memoryview(pbuf)[:min(
+                        length - done, len(pbuf))], offset + done)
+                except:
+                    self._pool.put(pbuf)
+                    raise
+                read_time += time.time() - read_start
+                if count == 0:
+                    self._pool.put(pbuf)
+                    break
+                if digest is not None:
+                    digest.update(memoryview(pbuf)[:count])
+                filled.put((offset + done, pbuf, count))
+                done += count
+        finally:
+            filled.put(None)
+            writer.join()
+        if result["failure"] is not None:
+            raise result["failure"]
+        with self._lock:
+            self.pipeline_stats.files += 1
+            self.pipeline_stats.nbytes += done
+            self.pipeline_stats.read_time += read_time
+            self.pipeline_stats.write_time += result["write_time"]
+            self.pipeline_stats.wall_time += time.time() - start
+        return done
+
+    def _pipeline_writer(self, dst_fd, filled, result):
+        """Writer thread of a pipeline: write the buffers queued on
+           filled until None is queued, giving them back to the pool.
+           The buffers queued one after the other follow on, those
+           already waiting are written together.  A failure is recorded
+           in result, later buffers are only given back.
+           """
+        finished = False
+        while not finished:
+            batch = [filled.get()]
+            while batch[-1] is not None and len(batch) < PIPELINE_MAX_IOV:
+                try:
+                    batch.append(filled.get_nowait())
+                except queue.Empty:
+                    break
+            if batch[-1] is None:
+                finished = True
+                batch.pop()
+            if not batch:
+                continue
+            if result["failure"] is None:
+                write_start = time.time()
+                try:
+                    write_views(dst_fd, [memoryview(pbuf)[:count] for
+                                         offset, pbuf, count in batch],
+                                batch[0][0])
+                except Exception as err:
+                    result["failure"] = err
+                result["write_time"] += time.time() - write_start
+            for offset, pbuf, count in batch:
+                self._pool.put(pbuf)
+
+    def _count_method(self, name, nbytes):
+        """Account for nbytes copied by the method name"""
+        if nbytes:
+            with self._lock:
+                self.method_bytes[name] = \
+                    self.method_bytes.get(name, 0) + nbytes
+
+    def _set_metadata(self, dst, sst, flags):
+        """Apply ownership, permissions and times of sst to dst"""
+        is_link = st.S_ISLNK(sst.st_mode)
+        if self._preserve_owner:
+            os.lchown(dst, sst.st_uid, sst.st_gid)
+        if not is_link:
+            # chown clears the setuid/setgid bits, so set the mode after.
+            os.chmod(dst, st.S_IMODE(sst.st_mode))
+        if "m" in flags:
+            if not is_link:
+                os.utime(dst, ns=(sst.st_atime_ns, sst.st_mtime_ns))
+            elif os.utime in os.supports_follow_symlinks:
+                os.utime(dst, ns=(sst.st_atime_ns, sst.st_mtime_ns),
+                         follow_symlinks=False)
+
+    def log_stats(self):
+        """Log the throughput counters of every worker run so far"""
+        for stats in self.stats:
+            self.info_msg(str(stats))
+        for name in sorted(self.method_bytes):
+            self.info_msg("Copied with %s: %.1f MB" %
+                          (name, self.method_bytes[name] / 1048576.0))
+        if self.dedup:
+            self.info_msg(str(self.dedup_stats))
+        if self.pipeline_stats.files:
+            self.info_msg(str(self.pipeline_stats))
+
+
+class RemoveStats(object):
+    """Counters of a batch removal"""
+    def __init__(self):
+        self.removed = 0
+        self.missing = 0
+        self.kept = 0
+        self.failed = 0
+
+    def add(self, other):
+        """Add the counters of other to these"""
+        self.removed += other.removed
+        self.missing += other.missing
+        self.kept += other.kept
+        self.failed += other.failed
+
+    def __str__(self):
+        return "%d removed, %d missing, %d kept, %d failed" % \
+            (self.removed, self.missing, self.kept, self.failed)
+
+
+def group_by_parent(names):
+    """Group pathnames by parent directory.  Returns a dictionary
+       mapping each parent directory, relative and normalized, to the
+       list of names it holds.  Empty lines are ignored.
+       """
+    groups = {}
+    for name in names:
+        name = name.rstrip()
+        if not name:
+            continue
+        parent, base = os.path.split(os.path.normpath(name.lstrip("/")))
+        groups.setdefault(parent, []).append(base)
+    return groups
+
+
+def _remove_group(root, parent, bases, links_only, stats, err_msg):
+    """Remove the entries bases of the directory parent of root.
+       The directory is opened once and entries are removed relative
+       to it, so the pathname is only resolved once for the group.
+       """
+    try:
+        dir_fd = os.open(os.path.join(root, parent),
+                         os.O_RDONLY | getattr(os, "O_DIRECTORY", 0))
+    except OSError as err:
+        if err.errno in (errno.ENOENT, errno.ENOTDIR):
+            stats.missing += len(bases)
+        else:
+            stats.failed += len(bases)
+            err_msg("Unable to open " + os.path.join(root, parent) +
+                    ": " + str(err))
+        return
+
+    try:
+        for base in bases:
+            try:
+                if links_only:
+                    if not st.S_ISLNK(os.lstat(base, dir_fd=dir_fd).st_mode):
+                        stats.kept += 1
+                        continue
+                os.unlink(base, dir_fd=dir_fd)
+                stats.removed += 1
+            except OSError as err:
+                if err.errno == errno.ENOENT:
+                    stats.missing += 1
+                else:
+                    stats.failed += 1
+                    err_msg("Unable to remove " +
+                            os.path.join(root, parent, base) + ": " +
+                            str(err))
+    finally:
+        os.close(dir_fd)
+
+
+def remove_listed(root, names, links_only=False, nworkers=1, err_msg=None,
+                  abort_check=None):
+    """Remove the pathnames listed in names, relative to root.
+       Pathnames are grouped by parent directory, and each directory is
+       handled as a whole by one of nworkers threads.  With links_only
+       set, only symbolic links are removed and other entries are kept.
+       Directories are never removed.  Removal stops early once
+       abort_check returns True.
+       Returns a RemoveStats with the counts of the removed, missing,
+       kept and failed entries.
+       """
+    err_msg = err_msg or (lambda msg: None)
+    abort_check = abort_check or (lambda: False)
+    groups = group_by_parent(names)
+    total = RemoveStats()
+    if not groups:
+        return total
+
+    nworkers = max(1, min(int(nworkers), len(groups)))
+    if nworkers == 1:
+        for parent, bases in groups.items():
+            if abort_check():
+                break
+            _remove_group(root, parent, bases, links_only, total, err_msg)
+        return total
+
+    group_queue = queue.Queue()
+    for item in groups.items():
+        group_queue.put(item)
+
+    def worker(stats):
+        """Worker thread: remove the groups taken from the queue"""
+        while not abort_check():
+            try:
+                parent, bases = group_queue.get_nowait()
+            except queue.Empty:
+                return
+            _remove_group(root, parent, bases, links_only, stats, err_msg)
+
+    workers = []
+    for i in range(nworkers):
+        stats = RemoveStats()
+        thr = threading.Thread(target=worker, args=(stats,))
+        thr.daemon = True
+        workers.append((thr, stats))
+        thr.start()
+    for thr, stats in workers:
+        thr.join()
+        total.add(stats)
+    return total
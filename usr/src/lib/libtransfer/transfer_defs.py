@@ -53,6 +53,9 @@ TM_PERFORM_CPIO = int(TM_DEFINES['TM_PERFORM_CPIO'])
 TM_PERFORM_IPS = int(TM_DEFINES['TM_PERFORM_IPS'])
 TM_CPIO_ENTIRE = int(TM_DEFINES['TM_CPIO_ENTIRE'])
 TM_CPIO_LIST = int(TM_DEFINES['TM_CPIO_LIST'])
+TM_CPIO_INCREMENTAL = int(TM_DEFINES['TM_CPIO_INCREMENTAL'])
+TM_CPIO_PLAN = int(TM_DEFINES['TM_CPIO_PLAN'])
+TM_CPIO_VERIFY = int(TM_DEFINES['TM_CPIO_VERIFY'])
 TM_IPS_INIT_RETRY_TIMEOUT = TM_DEFINES['TM_IPS_INIT_RETRY_TIMEOUT'].strip('"')
 TM_IPS_INIT = int(TM_DEFINES['TM_IPS_INIT'])
 TM_IPS_REPO_CONTENTS_VERIFY = int(TM_DEFINES['TM_IPS_REPO_CONTENTS_VERIFY'])
@@ -62,6 +65,7 @@ TM_IPS_SET_AUTH = int(TM_DEFINES['TM_IPS_SET_AUTH'])
 TM_IPS_UNSET_AUTH = int(TM_DEFINES['TM_IPS_UNSET_AUTH'])
 TM_IPS_SET_PROP = int(TM_DEFINES['TM_IPS_SET_PROP'])
 TM_IPS_PURGE_HIST = int(TM_DEFINES['TM_IPS_PURGE_HIST'])
+TM_IPS_SET_PUBLISHERS = int(TM_DEFINES['TM_IPS_SET_PUBLISHERS'])
 TM_IPS_IMAGE_TYPE = TM_DEFINES['TM_IPS_IMAGE_TYPE'].strip('"')
 TM_IPS_IMAGE_FULL = TM_DEFINES['TM_IPS_IMAGE_FULL'].strip('"')
 TM_IPS_IMAGE_PARTIAL = TM_DEFINES['TM_IPS_IMAGE_PARTIAL'].strip('"')
@@ -81,6 +85,31 @@ TM_IPS_REFRESH_CATALOG = TM_DEFINES['TM_IPS_REFRESH_CATALOG'].strip('"')
 TM_IPS_PROP_NAME = TM_DEFINES['TM_IPS_PROP_NAME'].strip('"')
 TM_IPS_PROP_VALUE = TM_DEFINES['TM_IPS_PROP_VALUE'].strip('"')
 TM_IPS_ALT_URL = TM_DEFINES['TM_IPS_ALT_URL'].strip('"')
+TM_CPIO_ENGINE = TM_DEFINES['TM_CPIO_ENGINE'].strip('"')
+TM_CPIO_ENGINE_CPIO = TM_DEFINES['TM_CPIO_ENGINE_CPIO'].strip('"')
+TM_CPIO_ENGINE_NATIVE = TM_DEFINES['TM_CPIO_ENGINE_NATIVE'].strip('"')
+TM_CPIO_WORKERS = TM_DEFINES['TM_CPIO_WORKERS'].strip('"')
+TM_CPIO_MANIFEST = TM_DEFINES['TM_CPIO_MANIFEST'].strip('"')
+TM_CPIO_DEDUP = TM_DEFINES['TM_CPIO_DEDUP'].strip('"')
+TM_CPIO_PLAN_FILE = TM_DEFINES['TM_CPIO_PLAN_FILE'].strip('"')
+TM_CPIO_ORDER = TM_DEFINES['TM_CPIO_ORDER'].strip('"')
+TM_CPIO_ORDER_INODE = TM_DEFINES['TM_CPIO_ORDER_INODE'].strip('"')
+TM_CPIO_ORDER_PATH = TM_DEFINES['TM_CPIO_ORDER_PATH'].strip('"')
+TM_CPIO_ORDER_SIZE = TM_DEFINES['TM_CPIO_ORDER_SIZE'].strip('"')
+TM_CPIO_ORDER_DIRECTORY = TM_DEFINES['TM_CPIO_ORDER_DIRECTORY'].strip('"')
+TM_CPIO_ORDER_SORT_FILE = TM_DEFINES['TM_CPIO_ORDER_SORT_FILE'].strip('"')
+TM_CPIO_SORT_FILE = TM_DEFINES['TM_CPIO_SORT_FILE'].strip('"')
+TM_CPIO_PIPELINE_DEPTH = TM_DEFINES['TM_CPIO_PIPELINE_DEPTH'].strip('"')
+TM_CPIO_CHECKSUMS = TM_DEFINES['TM_CPIO_CHECKSUMS'].strip('"')
+TM_CPIO_CHECKSUM_FILE = TM_DEFINES['TM_CPIO_CHECKSUM_FILE'].strip('"')
+TM_IPS_PUBLISHER_SPEC = TM_DEFINES['TM_IPS_PUBLISHER_SPEC'].strip('"')
+TM_IPS_PUBLISHER_RESULTS = \
+    TM_DEFINES['TM_IPS_PUBLISHER_RESULTS'].strip('"')
+TM_IPS_CATALOG_CACHE = TM_DEFINES['TM_IPS_CATALOG_CACHE'].strip('"')
+TM_IPS_RETRY_ATTEMPTS = TM_DEFINES['TM_IPS_RETRY_ATTEMPTS'].strip('"')
+TM_IPS_RETRY_LOG = TM_DEFINES['TM_IPS_RETRY_LOG'].strip('"')
+TM_IPS_INSTALL_BATCH = TM_DEFINES['TM_IPS_INSTALL_BATCH'].strip('"')
+TM_METRICS_FILE = TM_DEFINES['TM_METRICS_FILE'].strip('"')
 
 # The following is only useful for python code, not C code.  So, it will 
 # only be defined here, instead of being defined in transfermod.h
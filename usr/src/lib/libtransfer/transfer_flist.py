@@ -0,0 +1,364 @@
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+# Copyright (c) 2010, Oracle and/or its affiliates. All rights reserved.
+#
+""" File list helpers for the Slim Install Transfer Module
+
+    The cpio file lists are sorted before they are written out, by
+    inode number unless another order is chosen (see FlistOrder).
+    Holding every (key, pathname) pair of a full root in memory costs
+    gigabytes, so the pairs are sorted in bounded chunks which are
+    spilled to disk as sorted runs and merged when the list is written.
+
+    Incremental transfers keep a manifest of what was copied, which is
+    compared with a new scan of the source to find what changed.  Both
+    are streams sorted the same way, so they are compared without being
+    loaded in memory.
+    """
+import heapq
+import os
+import tempfile
+
+# Number of entries kept in memory before a sorted run is written out
+CHUNK_SIZE = 200000
+
+# Directory holding the sorted runs
+RUN_DIR = "/var/run"
+
+
+# Orders of the pathnames in the file lists
+ORDER_INODE = "inode"
+ORDER_PATH = "path"
+ORDER_SIZE = "size"
+ORDER_DIRECTORY = "directory"
+ORDER_SORT_FILE = "sortfile"
+
+
+class FlistOrder(object):
+    """Order of the pathnames of a file list: by inode number.
+
+       On hsfs the inode number is the location of the file's extent,
+       so this order reads an ISO image front to back.  Other orders
+       derive from this class and redefine key(), which returns a tuple
+       of integers for a pathname.  Pathnames are sorted by key, then by
+       pathname.  need_size is set by orders which need the size of
+       every pathname, which costs a stat per file when scanning.
+       """
+    name = ORDER_INODE
+    need_size = False
+
+    def key(self, ino, path, size):
+        """Return the sort key of path, with inode number ino and
+           size bytes.
+           """
+        return (ino,)
+
+
+class PathOrder(FlistOrder):
+    """Order of the pathnames of a file list: by pathname, which keeps
+       the files of a directory and of its subdirectories together.
+       """
+    name = ORDER_PATH
+
+    def key(self, ino, path, size):
+        return ()
+
+
+class SizeOrder(FlistOrder):
+    """Order of the pathnames of a file list: largest files first, so
+       the bulk of the data is read in long sequential runs.  Pathnames
+       of the same size are sorted by inode number.
+       """
+    name = ORDER_SIZE
+    need_size = True
+
+    def key(self, ino, path, size):
+        return (-size, ino)
+
+
+class DirectoryOrder(FlistOrder):
+    """Order of the pathnames of a file list: grouped by directory.
+       Directories come in the order their first pathname was added,
+       which is the scan order, and the pathnames of a directory are
+       sorted by inode number.
+       """
+    name = ORDER_DIRECTORY
+
+    def __init__(self):
+        self._dirs = {}
+
+    def key(self, ino, path, size):
+        parent = os.path.dirname(os.path.normpath(path))
+        idx = self._dirs.get(parent)
+        if idx is None:
+            idx = self._dirs[parent] = len(self._dirs)
+        return (idx, ino)
+
+
+class SortFileOrder(FlistOrder):
+    """Order of the pathnames of a file list given by a sort file, the
+       format mkisofs -sort reads: one pathname and its weight, an
+       integer, per line.  Pathnames are relative to the top of the
+       source.  Heavier pathnames come first, pathnames missing from the
+       sort file weigh 0.  Pathnames of the same weight are sorted by
+       inode number.  Unlike mkisofs, wildcards aren't expanded.
+       """
+    name = ORDER_SORT_FILE
+
+    def __init__(self, weights):
+        self.weights = weights
+
+    def key(self, ino, path, size):
+        return (-self.weights.get(os.path.normpath(path).lstrip("/"), 0),
+                ino)
+
+
+def read_sort_file(name):
+    """Read the sort file name.  Returns the weights by normalized
+       pathname.  Raises IOError if the file can't be read, ValueError
+       if a line isn't a pathname followed by a weight.
+       """
+    weights = {}
+    with open(name, 'r') as handle:
+        for line in handle:
+            if not line.strip():
+                continue
+            fields = line.rsplit(None, 1)
+            if len(fields) != 2:
+                raise ValueError("Invalid line in sort file " + name +
+                                 ": " + line.rstrip("\n"))
+            path = os.path.normpath(fields[0]).lstrip("/")
+            weights[path] = int(fields[1])
+    return weights
+
+
+def flist_order(name, sort_file=None):
+    """Return the FlistOrder named name.  ORDER_SORT_FILE reads its
+       order from sort_file, see read_sort_file() for the exceptions
+       raised.  Raises ValueError for an unknown order.
+       """
+    if name == ORDER_INODE:
+        return FlistOrder()
+    if name == ORDER_PATH:
+        return PathOrder()
+    if name == ORDER_SIZE:
+        return SizeOrder()
+    if name == ORDER_DIRECTORY:
+        return DirectoryOrder()
+    if name == ORDER_SORT_FILE and sort_file:
+        return SortFileOrder(read_sort_file(sort_file))
+    raise ValueError("Unknown file list order " + str(name))
+
+
+class FlistSorter(object):
+    """Sort pathnames in the order of a FlistOrder with bounded memory,
+       by inode number unless another order is given.
+
+       Pathnames are collected with add().  Every chunk_size pathnames
+       the collected chunk is sorted and written to a temporary run
+       file.  write() merges the runs and the last chunk into the final
+       list.
+       """
+
+    def __init__(self, chunk_size=CHUNK_SIZE, run_dir=RUN_DIR, order=None):
+        self.chunk_size = chunk_size
+        self.run_dir = run_dir
+        if order is None:
+            order = FlistOrder()
+        self.order = order
+        self.count = 0
+        # Sum of the sizes given to add(), None if one wasn't known
+        self.nbytes = 0
+        self._chunk = []
+        self._runs = []
+
+    def add(self, ino, path, size=0):
+        """Add a pathname with its inode number and size.  size is
+           None if it isn't known.
+           """
+        if size is None:
+            self.nbytes = None
+            size = 0
+        elif self.nbytes is not None:
+            self.nbytes += size
+        self._chunk.append((self.order.key(ino, path, size), path))
+        self.count += 1
+        if len(self._chunk) >= self.chunk_size:
+            self._spill()
+
+    def _spill(self):
+        """Write the current chunk out as a sorted run"""
+        self._chunk.sort()
+        run = tempfile.TemporaryFile(mode="w+", dir=self.run_dir,
+                                     prefix="flistrun")
+        for key, path in self._chunk:
+            run.write("%s %s\n" % (",".join([str(val) for val in key]),
+                                   path))
+        run.flush()
+        run.seek(0)
+        self._runs.append(run)
+        self._chunk = []
+
+    @staticmethod
+    def _read_run(run):
+        """Generate the (key, pathname) pairs of a sorted run"""
+        for line in run:
+            key, path = line[:-1].split(" ", 1)
+            yield (tuple([int(val) for val in key.split(",") if val]), path)
+
+    def write(self, handle):
+        """Write the pathnames, sorted, one per line to handle.  The
+           sorter is empty afterwards.
+           """
+        self._chunk.sort()
+        if self._runs:
+            sources = [self._read_run(run) for run in self._runs]
+            sources.append(iter(self._chunk))
+            entries = heapq.merge(*sources)
+        else:
+            entries = self._chunk
+        for entry in entries:
+            handle.write(entry[1] + "\n")
+        handle.flush()
+        self.close()
+
+    def close(self):
+        """Throw away everything collected so far"""
+        for run in self._runs:
+            run.close()
+        self._runs = []
+        self._chunk = []
+        self.count = 0
+        self.nbytes = 0
+
+
+# Version of the manifest format, part of the header line
+MANIFEST_VERSION = "1"
+
+# Differences reported by manifest_diff()
+(
+MANIFEST_ADDED,
+MANIFEST_CHANGED,
+MANIFEST_REMOVED
+) = list(range(3))
+
+
+class TransferManifest(object):
+    """Persistent record of the pathnames copied from a source.
+
+       The manifest is a text file.  The header line names the format
+       version and the source directory.  Each other line describes a
+       pathname with its inode number, size, mtime (in nanoseconds)
+       and mode, followed by the pathname relative to the source:
+           <ino> <size> <mtime> <mode> <path>
+       Lines are in the order of the lists of pathname components, the
+       order install_utils.walk_tree(sort_names=True) produces.
+
+       A new manifest is written to a temporary file next to the old one
+       and only replaces it when commit() is called.
+       """
+
+    def __init__(self, name, source):
+        self.name = name
+        self.source = source
+        self._new = None
+
+    def header(self):
+        """Return the header line of manifests for this source"""
+        return "# transfer manifest %s %s\n" % (MANIFEST_VERSION, self.source)
+
+    def entries(self):
+        """Generate the (path, size, mtime, ino, mode) records of the
+           existing manifest.  Nothing is generated if there's no
+           manifest yet, or if it was made from another source.
+           """
+        try:
+            handle = open(self.name, 'r', errors="surrogateescape")
+        except IOError:
+            return
+        with handle:
+            if handle.readline() != self.header():
+                return
+            for line in handle:
+                ino, size, mtime, mode, path = line[:-1].split(" ", 4)
+                yield (path, int(size), int(mtime), int(ino), int(mode, 8))
+
+    def create(self):
+        """Start writing a new manifest"""
+        self._new = open(self.name + ".new", 'w', errors="surrogateescape")
+        self._new.write(self.header())
+
+    def add(self, rec):
+        """Add a (path, size, mtime, ino, mode) record to the new
+           manifest.  Records must be added in manifest order.
+           """
+        path, size, mtime, ino, mode = rec
+        self._new.write("%d %d %d %o %s\n" % (ino, size, mtime, mode, path))
+
+    def commit(self):
+        """Replace the existing manifest with the new one"""
+        self._new.close()
+        self._new = None
+        os.rename(self.name + ".new", self.name)
+
+    def abandon(self):
+        """Throw the new manifest away, keeping the existing one"""
+        if self._new is not None:
+            self._new.close()
+            self._new = None
+            try:
+                os.unlink(self.name + ".new")
+            except OSError:
+                pass
+
+
+def manifest_diff(old_recs, new_recs):
+    """Compare two streams of manifest records, both in manifest order.
+       Generates (action, old_rec, new_rec) tuples for the pathnames
+       which differ, action being MANIFEST_ADDED, MANIFEST_CHANGED or
+       MANIFEST_REMOVED.  The record missing for an added or a removed
+       pathname is None.
+       """
+    old_iter = iter(old_recs)
+    new_iter = iter(new_recs)
+    old = next(old_iter, None)
+    new = next(new_iter, None)
+    while old is not None or new is not None:
+        if old is None:
+            old_key = None
+        else:
+            old_key = old[0].split("/")
+        if new is None:
+            new_key = None
+        else:
+            new_key = new[0].split("/")
+
+        if old_key == new_key:
+            if old[1:] != new[1:]:
+                yield (MANIFEST_CHANGED, old, new)
+            old = next(old_iter, None)
+            new = next(new_iter, None)
+        elif new_key is None or (old_key is not None and old_key < new_key):
+            yield (MANIFEST_REMOVED, old, None)
+            old = next(old_iter, None)
+        else:
+            yield (MANIFEST_ADDED, None, new)
+            new = next(new_iter, None)
@@ -0,0 +1,305 @@
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+# Copyright (c) 2010, Oracle and/or its affiliates. All rights reserved.
+#
+""" Transfer metrics for the Slim Install Transfer Module
+
+    Every transfer records how long each of its stages took, how many
+    files and bytes they handled, the wall time of the commands it ran
+    and the resources used by the process.  The records of the transfers
+    are kept in a JSON metrics file, next to the install log unless
+    another file is given, to track where install time goes and compare
+    releases.
+
+    The stages of a transfer may overlap: the file lists of
+    TM_CPIO_ENTIRE are scanned while the first ones are copied, and
+    sorting a file list is part of its scan.
+    """
+import json
+import os
+import resource
+import struct
+import tempfile
+import threading
+import time
+
+# Version of the metrics file format
+METRICS_VERSION = 1
+
+# Name of the metrics file, in the directory of the install log
+METRICS_FILE = "transfer_metrics.json"
+
+# Directory of the install log written by the logging service
+INSTALL_LOG_DIR = "/tmp"
+
+# Number of transfers kept in the metrics file, the oldest are dropped
+MAX_TRANSFERS = 200
+
+# Stages of the transfers
+STAGE_SCAN = "scan"
+STAGE_SORT = "sort"
+STAGE_COPY = "copy"
+STAGE_CLOBBER = "clobber"
+STAGE_SKIP = "skip"
+STAGE_VERIFY = "verify"
+
+# Layout of the Solaris prusage_t up to pr_sysc: pr_lwpid, pr_count, 20
+# timestruc_t and 11 ulong_t counters before it
+PRUSAGE_FORMAT = "@ii" + "ll" * 20 + "L" * 11
+PRUSAGE_SYSC = 2 + 40 + 10
+
+
+def syscall_count():
+    """Return the number of system calls made by the process so far and
+       where it comes from, (None, None) if it isn't known.  Solaris
+       counts every system call, Linux only the reads and writes.
+       """
+    try:
+        with open("/proc/self/usage", "rb") as handle:
+            data = handle.read(struct.calcsize(PRUSAGE_FORMAT))
+        return (struct.unpack(PRUSAGE_FORMAT, data)[PRUSAGE_SYSC],
+                "prusage")
+    except (IOError, OSError, struct.error):
+        pass
+    try:
+        with open("/proc/self/io", "r") as handle:
+            counters = dict([line.split(":", 1) for line in handle])
+        return (int(counters["syscr"]) + int(counters["syscw"]),
+                "proc_io_read_write")
+    except (IOError, OSError, KeyError, ValueError):
+        return (None, None)
+
+
+def resource_usage():
+    """Return the resources used so far by the process and the
+       children it waited for, as a dictionary.
+       """
+    usage = {}
+    for who, name in ((resource.RUSAGE_SELF, "self"),
+                      (resource.RUSAGE_CHILDREN, "children")):
+        rusage = resource.getrusage(who)
+        usage[name] = {"user_seconds": rusage.ru_utime,
+                       "system_seconds": rusage.ru_stime,
+                       "blocks_in": rusage.ru_inblock,
+                       "blocks_out": rusage.ru_oublock,
+                       "voluntary_switches": rusage.ru_nvcsw,
+                       "involuntary_switches": rusage.ru_nivcsw}
+    return usage
+
+
+def rates(seconds, files, nbytes):
+    """Return the files and bytes per second of a stage"""
+    if seconds <= 0:
+        return {"files_per_second": 0.0, "bytes_per_second": 0.0}
+    return {"files_per_second": round(files / seconds, 1),
+            "bytes_per_second": round(nbytes / seconds, 1)}
+
+
+class StageMetrics(object):
+    """Counters of one stage of a transfer, over every time it ran"""
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.seconds = 0.0
+        self.files = 0
+        self.nbytes = 0
+
+    def to_dict(self):
+        """Return the counters as a dictionary for the metrics file"""
+        stage = {"calls": self.calls,
+                 "seconds": round(self.seconds, 3),
+                 "files": self.files,
+                 "bytes": self.nbytes}
+        stage.update(rates(self.seconds, self.files, self.nbytes))
+        return stage
+
+
+class CommandMetrics(object):
+    """Wall time of the runs of one command"""
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.failures = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+
+    def to_dict(self):
+        """Return the counters as a dictionary for the metrics file"""
+        return {"calls": self.calls,
+                "failures": self.failures,
+                "seconds": round(self.seconds, 3),
+                "max_seconds": round(self.max_seconds, 3)}
+
+
+class StageTimer(object):
+    """Context manager adding the time spent in a block to a stage.
+       The files and bytes handled can be set while in the block.
+       """
+    def __init__(self, metrics, name, files=0, nbytes=0):
+        self.metrics = metrics
+        self.name = name
+        self.files = files
+        self.nbytes = nbytes
+        self._start = None
+
+    def __enter__(self):
+        self._start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.metrics.add(self.name, time.time() - self._start,
+                         self.files, self.nbytes)
+
+
+class TransferMetrics(object):
+    """Metrics of one transfer.
+
+       Stages and commands may be recorded from several threads.
+       finish() takes the totals once the transfer is over.
+       """
+
+    def __init__(self, mechanism, action):
+        self.mechanism = mechanism
+        self.action = action
+        self.status = None
+        self.start_time = time.time()
+        self.seconds = 0.0
+        self.stages = {}
+        self.commands = {}
+        self._lock = threading.Lock()
+        self._syscalls_start, self.syscall_source = syscall_count()
+        self.syscalls = None
+        self._usage_start = resource_usage()
+        self.usage = None
+
+    def stage(self, name, files=0, nbytes=0):
+        """Return a StageTimer timing a block of the stage name"""
+        return StageTimer(self, name, files, nbytes)
+
+    def add(self, name, seconds, files=0, nbytes=0):
+        """Account for one run of the stage name"""
+        with self._lock:
+            stage = self.stages.get(name)
+            if stage is None:
+                stage = self.stages[name] = StageMetrics(name)
+            stage.calls += 1
+            stage.seconds += seconds
+            stage.files += files
+            stage.nbytes += nbytes
+
+    def command(self, name, seconds, status):
+        """Account for one run of the command name, which took seconds
+           and exited with status.
+           """
+        with self._lock:
+            cmd = self.commands.get(name)
+            if cmd is None:
+                cmd = self.commands[name] = CommandMetrics(name)
+            cmd.calls += 1
+            cmd.seconds += seconds
+            cmd.max_seconds = max(cmd.max_seconds, seconds)
+            if status != 0:
+                cmd.failures += 1
+
+    def finish(self, status):
+        """Record the end of the transfer with the return code status"""
+        self.status = status
+        self.seconds = time.time() - self.start_time
+        syscalls = syscall_count()[0]
+        if syscalls is not None and self._syscalls_start is not None:
+            self.syscalls = syscalls - self._syscalls_start
+        usage = resource_usage()
+        for who, counters in usage.items():
+            for key, val in counters.items():
+                counters[key] = round(val - self._usage_start[who][key], 3)
+        self.usage = usage
+
+    def to_dict(self):
+        """Return the metrics as a dictionary for the metrics file"""
+        with self._lock:
+            stages = dict([(name, stage.to_dict())
+                           for name, stage in self.stages.items()])
+            commands = dict([(name, cmd.to_dict())
+                             for name, cmd in self.commands.items()])
+        return {"mechanism": self.mechanism,
+                "action": self.action,
+                "status": self.status,
+                "start": time.strftime("%Y-%m-%dT%H:%M:%SZ",
+                                       time.gmtime(self.start_time)),
+                "seconds": round(self.seconds, 3),
+                "stages": stages,
+                "commands": commands,
+                "command_seconds": round(sum([cmd["seconds"] for cmd in
+                                              commands.values()]), 3),
+                "syscalls": self.syscalls,
+                "syscall_source": self.syscall_source,
+                "rusage": self.usage}
+
+
+def default_metrics_file(log_handler=None):
+    """Return the pathname of the metrics file next to the install
+       log: the file of log_handler, a python logger, if it writes to
+       one, the log of the logging service otherwise.
+       """
+    if log_handler is not None:
+        for handler in getattr(log_handler, "handlers", []):
+            name = getattr(handler, "baseFilename", None)
+            if name:
+                return os.path.join(os.path.dirname(name), METRICS_FILE)
+    return os.path.join(INSTALL_LOG_DIR, METRICS_FILE)
+
+
+def read_metrics(name):
+    """Read a metrics file.  Returns the list of the records of the
+       transfers, oldest first.  Raises IOError or ValueError if the
+       file can't be read or isn't a metrics file of a known version.
+       """
+    with open(name, 'r') as handle:
+        doc = json.load(handle)
+    if not isinstance(doc, dict) or doc.get("version") != METRICS_VERSION:
+        raise ValueError("Unknown transfer metrics version in " + name)
+    return doc.get("transfers", [])
+
+
+def write_metrics(name, metrics):
+    """Add the record of the transfer metrics to the metrics file name,
+       which is created if needed.  A file which can't be read is
+       started over.  Raises IOError or OSError if the file can't be
+       written.
+       """
+    try:
+        transfers = read_metrics(name)
+    except (IOError, ValueError):
+        transfers = []
+    transfers.append(metrics.to_dict())
+    doc = {"version": METRICS_VERSION,
+           "transfers": transfers[-MAX_TRANSFERS:]}
+    # Replace the file as a whole, so a reader never sees a partial one
+    fd, tmp_name = tempfile.mkstemp(prefix="." + os.path.basename(name),
+                                    dir=os.path.dirname(name) or ".")
+    try:
+        with os.fdopen(fd, 'w') as handle:
+            json.dump(doc, handle, indent=1, sort_keys=True)
+            handle.write("\n")
+        os.rename(tmp_name, name)
+    except:
+        os.unlink(tmp_name)
+        raise
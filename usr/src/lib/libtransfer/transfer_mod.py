@@ -22,7 +22,9 @@
 #
 """ Slim Install Transfer Module """
 import errno
-import operator
+import json
+import random
+import queue
 import sys
 import tempfile
 import time
@@ -33,9 +35,25 @@ import tempfile
 import threading
 import traceback
 import re
+import shutil
 from osol_install import liblogsvc as logsvc
 from osol_install import libtransfer as tmod
-from osol_install.install_utils import exec_cmd_outputs_to_log
+from osol_install.install_utils import exec_cmd_outputs_to_log, walk_tree
+from osol_install.transfer_copy import CopyEngine, DEFAULT_WORKERS, \
+    remove_listed
+from osol_install.transfer_batches import BatchState, split_batches
+from osol_install.transfer_catalog import CatalogCache
+from osol_install.transfer_plan import TransferPlan, read_plan
+from osol_install.transfer_publishers import read_publisher_spec, \
+    write_publisher_results
+from osol_install.transfer_scan import ScanCache
+from osol_install.transfer_metrics import TransferMetrics, \
+    default_metrics_file, write_metrics, STAGE_SCAN, STAGE_SORT, \
+    STAGE_COPY, STAGE_CLOBBER, STAGE_SKIP, STAGE_VERIFY
+from osol_install.transfer_verify import ChecksumManifest, verify_checksums
+from osol_install.transfer_flist import FlistOrder, FlistSorter, \
+    TransferManifest, flist_order, manifest_diff, MANIFEST_CHANGED, \
+    MANIFEST_REMOVED
 from osol_install.transfer_defs import TRANSFER_ID, \
     TM_ATTR_IMAGE_INFO, \
     TM_ATTR_MECHANISM, \
@@ -54,6 +72,9 @@ from osol_install.transfer_defs import TRANSFER_ID, \
     TM_PERFORM_IPS, \
     TM_CPIO_ENTIRE, \
     TM_CPIO_LIST, \
+    TM_CPIO_INCREMENTAL, \
+    TM_CPIO_PLAN, \
+    TM_CPIO_VERIFY, \
     TM_IPS_INIT, \
     TM_IPS_REPO_CONTENTS_VERIFY, \
     TM_IPS_RETRIEVE, \
@@ -62,6 +83,7 @@ from osol_install.transfer_defs import TRANSFER_ID, \
     TM_IPS_UNSET_AUTH, \
     TM_IPS_SET_PROP, \
     TM_IPS_PURGE_HIST, \
+    TM_IPS_SET_PUBLISHERS, \
     TM_IPS_IMAGE_TYPE, \
     TM_IPS_IMAGE_CREATE_FORCE, \
     TM_IPS_VERBOSE_MODE, \
@@ -75,6 +97,30 @@ from osol_install.transfer_defs import TRANSFER_ID, \
     TM_IPS_PROP_VALUE, \
     TM_IPS_ALT_URL, \
     TM_IPS_INIT_RETRY_TIMEOUT, \
+    TM_CPIO_ENGINE, \
+    TM_CPIO_ENGINE_CPIO, \
+    TM_CPIO_ENGINE_NATIVE, \
+    TM_CPIO_WORKERS, \
+    TM_CPIO_MANIFEST, \
+    TM_CPIO_DEDUP, \
+    TM_CPIO_PLAN_FILE, \
+    TM_CPIO_ORDER, \
+    TM_CPIO_ORDER_INODE, \
+    TM_CPIO_ORDER_PATH, \
+    TM_CPIO_ORDER_SIZE, \
+    TM_CPIO_ORDER_DIRECTORY, \
+    TM_CPIO_ORDER_SORT_FILE, \
+    TM_CPIO_SORT_FILE, \
+    TM_CPIO_PIPELINE_DEPTH, \
+    TM_CPIO_CHECKSUMS, \
+    TM_CPIO_CHECKSUM_FILE, \
+    TM_IPS_PUBLISHER_SPEC, \
+    TM_IPS_PUBLISHER_RESULTS, \
+    TM_IPS_CATALOG_CACHE, \
+    TM_IPS_RETRY_ATTEMPTS, \
+    TM_IPS_RETRY_LOG, \
+    TM_IPS_INSTALL_BATCH, \
+    TM_METRICS_FILE, \
     TM_PYTHON_LOG_HANDLER, \
     TM_E_SUCCESS, \
     TM_E_INVALID_TRANSFER_TYPE_ATTR, \
@@ -87,10 +133,30 @@ from osol_install.transfer_defs import TRANSFER_ID, \
     TM_E_IPS_REPO_CONTENTS_VERIFY_FAILED, \
     TM_E_IPS_RETRIEVE_FAILED, \
     TM_E_IPS_PKG_MISSING, \
+    TM_E_IPS_REFRESH_FAILED, \
     TM_E_IPS_SET_AUTH_FAILED, \
     TM_E_IPS_UNSET_AUTH_FAILED, \
     TM_E_IPS_SET_PROP_FAILED, \
-    TM_E_PYTHON_ERROR 
+    TM_E_PYTHON_ERROR, \
+    TM_E_CPIO_VERIFY_FAILED
+
+# Names of the actions in the transfer metrics. The IPS action names are
+# also the names of their stage.
+CPIO_ACTION_NAMES = {TM_CPIO_ENTIRE: "entire",
+                     TM_CPIO_LIST: "list",
+                     TM_CPIO_INCREMENTAL: "incremental",
+                     TM_CPIO_PLAN: "plan",
+                     TM_CPIO_VERIFY: "verify"}
+IPS_ACTION_NAMES = {TM_IPS_INIT: "ips_init",
+                    TM_IPS_REPO_CONTENTS_VERIFY: "ips_contents_verify",
+                    TM_IPS_RETRIEVE: "ips_retrieve",
+                    TM_IPS_REFRESH: "ips_refresh",
+                    TM_IPS_SET_AUTH: "ips_set_publisher",
+                    TM_IPS_UNSET_AUTH: "ips_unset_publisher",
+                    TM_IPS_PURGE_HIST: "ips_purge_history",
+                    TM_IPS_UNINSTALL: "ips_uninstall",
+                    TM_IPS_SET_PROP: "ips_set_property",
+                    TM_IPS_SET_PUBLISHERS: "ips_set_publishers"}
 
 class TMDefs(object):
     """ Class that holds some globally used values """
@@ -102,12 +168,17 @@ class TMDefs(object):
     GZCAT = "/usr/bin/gzcat "
     GZCAT_DST = "/var/run/boot_archive"
     PKG_EXIT_SUCCESS = 0
+    PKG_EXIT_ERROR = 1
     PKG_EXIT_NOP = 4
+    PKG_EXIT_LOCKED = 7
 	
     def __init__(self):
-        self.tm_lock = None
-        self.do_abort = 0
+        # Held while a transfer runs, so there isn't more than 1
+        # transfer running at a time
+        self.tm_lock = threading.RLock()
+        self.cancel = None
         self.percent = 0.0
+        self.progress = None
 
 class CpioSpec(object):
     """Class used to hold values specifying a mountpoint for cpio operation"""
@@ -130,6 +201,9 @@ class Flist(object):
         self.clobber_files = clobber_files
         self.cpio_args = cpio_args
         self.handle = None
+        self.nfiles = 0
+        # Data size of the files listed, 0 if unknown
+        self.nbytes = 0
 
     def open(self):
         """Open a file"""
@@ -173,113 +247,398 @@ class TIPSPkgmissing(TError):
         TError.__init__(self)
         self.retcode = retcode
 
+class CancelToken(object):
+    """Cancellation request shared by every stage of a transfer.
+	Stages either check it between units of work (check(),
+	is_cancelled()), wait on it instead of sleeping (wait()), or
+	register a callback run as soon as it's cancelled, which is
+	how running commands get terminated (add_callback()).
+	"""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+
+    def cancel(self):
+        """Cancel the transfer. Registered callbacks are run once."""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks = self._callbacks
+            self._callbacks = []
+        for func in callbacks:
+            try:
+                func()
+            except Exception:
+                pass
+
+    def is_cancelled(self):
+        """Return True once the transfer was cancelled"""
+        return self._event.is_set()
+
+    def wait(self, timeout=None):
+        """Wait up to timeout seconds for a cancellation. Returns True
+		if the transfer was cancelled.
+		"""
+        return self._event.wait(timeout)
+
+    def check(self):
+        """Raise TAbort if the transfer was cancelled"""
+        if self._event.is_set():
+            raise TAbort("User aborted transfer")
+
+    def add_callback(self, func):
+        """Have func called when the transfer is cancelled. It's called
+		right away if it already was.
+		"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(func)
+                return
+        func()
+
+    def remove_callback(self, func):
+        """Forget a callback registered with add_callback()"""
+        with self._lock:
+            if func in self._callbacks:
+                self._callbacks.remove(func)
+
+class RetryPolicy(object):
+    """Retry of the pkg commands run by TransferIps.
+	A command is run again when its exit status is one of the
+	retryable statuses given for it, up to max_attempts times in
+	all (0 means no limit). Before attempt n+1 the policy waits a
+	random time ("full jitter") of up to base_delay * 2 ** (n - 1)
+	seconds, capped at max_delay, so builds hitting the same
+	repository don't retry in lockstep. The waits can also be
+	limited to max_wait seconds in all.
+	Every attempt is recorded in attempts, logged, and appended as
+	a line of JSON to log_file when one is set.
+	"""
+
+    # pkg exit statuses worth retrying: any error, which includes
+    # an unreachable repository, or only the image being locked by
+    # another pkg process.  Any error is only retried by commands
+    # which just talk to the repository; for an install or an
+    # uninstall it also means a missing package or constraints which
+    # can't be satisfied, which no retry will fix.
+    RETRY_ERRORS = (TMDefs.PKG_EXIT_ERROR, TMDefs.PKG_EXIT_LOCKED)
+    RETRY_LOCKED = (TMDefs.PKG_EXIT_LOCKED,)
+
+    MAX_ATTEMPTS = 3
+    BASE_DELAY = 5.0
+    MAX_DELAY = 60.0
+
+    def __init__(self, max_attempts=None, base_delay=None, max_delay=None,
+                 log_file=None):
+        if max_attempts is None:
+            max_attempts = self.MAX_ATTEMPTS
+        if base_delay is None:
+            base_delay = self.BASE_DELAY
+        if max_delay is None:
+            max_delay = self.MAX_DELAY
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.log_file = log_file
+        self.attempts = []
+
+    def backoff(self, attempt):
+        """Return the number of seconds to wait after attempt"""
+        return random.uniform(0, min(self.max_delay,
+                                     self.base_delay * 2 ** (attempt - 1)))
+
+    def retry_seconds(self):
+        """Return the wall time spent on failed attempts and on waiting
+		between attempts, in seconds.
+		"""
+        return sum([rec["seconds"] + rec["delay"] for rec in self.attempts
+                    if rec["retried"]])
+
+    def run(self, func, name, retryable, cancel, max_attempts=None,
+            max_wait=None):
+        """Call func(), which runs the command name and returns its exit
+		status, until the status isn't in retryable or the limits
+		are reached. max_attempts and max_wait override the
+		limits of the policy. cancel is the CancelToken of the
+		transfer, the waits end as soon as it's cancelled.
+		Returns the status of the last attempt.
+		Raises TAbort if the transfer is cancelled.
+		"""
+        if max_attempts is None:
+            max_attempts = self.max_attempts
+        waited = 0.0
+        spent = 0.0
+        attempt = 0
+        while True:
+            attempt += 1
+            start = time.time()
+            status = func()
+            rec = {"command": name,
+                   "attempt": attempt,
+                   "status": status,
+                   "start": round(start, 3),
+                   "seconds": round(time.time() - start, 3),
+                   "delay": 0.0,
+                   "retried": False}
+
+            if status in retryable and \
+                (max_attempts == 0 or attempt < max_attempts):
+                delay = self.backoff(attempt)
+                if max_wait is not None:
+                    delay = min(delay, max_wait - waited)
+                if max_wait is None or delay > 0:
+                    rec["delay"] = round(delay, 3)
+                    rec["retried"] = True
+            self._record(rec)
+            if not rec["retried"]:
+                if attempt > 1:
+                    logsvc.write_dbg(TRANSFER_ID, logsvc.LS_DBGLVL_INFO,
+                                     "pkg %s: %d attempts, %.1f seconds "
+                                     "spent on retries\n" %
+                                     (name, attempt, spent))
+                return status
+            cancel.wait(rec["delay"])
+            cancel.check()
+            waited += rec["delay"]
+            spent += rec["seconds"] + rec["delay"]
+
+    def _record(self, rec):
+        """Keep and log the record of one attempt"""
+        self.attempts.append(rec)
+        if rec["retried"]:
+            msg = "pkg %s attempt %d exited with %d after %.1f seconds, " \
+                "retrying in %.1f seconds\n" % (rec["command"],
+                rec["attempt"], rec["status"], rec["seconds"], rec["delay"])
+            logsvc.write_log(TRANSFER_ID, msg)
+        if self.log_file is None:
+            return
+        try:
+            with open(self.log_file, 'a') as handle:
+                handle.write(json.dumps(rec, sort_keys=True) + "\n")
+        except IOError as err:
+            logsvc.write_dbg(TRANSFER_ID, logsvc.LS_DBGLVL_ERR,
+                             "Unable to write the retry log: %s\n" % err)
+
 def tm_abort_transfer():
     """Method to signal to abort the transfer"""
-    if PARAMS.tm_lock.locked():
-        PARAMS.tm_lock.release()
-    else:
-        PARAMS.do_abort = 1
+    if PARAMS.cancel is not None:
+        PARAMS.cancel.cancel()
 
 def tm_abort_signaled():
     """Method to detect abort"""
-    return PARAMS.do_abort
+    if PARAMS.cancel is not None and PARAMS.cancel.is_cancelled():
+        return 1
+    return 0
+
+def tm_transfer_progress():
+    """Return the TransferProgress of the current or last cpio
+	transfer, None if there wasn't any. Callers can use it to show
+	the throughput and the estimated time left.
+	"""
+    return PARAMS.progress
+
+class TransferProgress(object):
+    """Counters of the files and bytes actually transferred, kept
+          up to date by the transfer itself.
+          total_bytes - expected number of bytes, 0 if unknown
+          total_files - expected number of files, grows as file lists
+                        are handed over to the copy stage
+          planned_files - number of files and directories of the transfer
+                        plan, 0 if there's none
+          listed - threading.Event set once the last file list has
+                        been built, None if they all are from the start
+       """
+    # Highest fraction reported while more file lists may come
+    PENDING_FRACTION = 0.99
+
+    def __init__(self, total_bytes=0, planned_files=0, listed=None):
+        self.total_bytes = total_bytes
+        self.total_files = 0
+        self.planned_files = planned_files
+        self.listed = listed
+        self.bytes_done = 0
+        self.files_done = 0
+        self.start_time = time.time()
+        self._listed_files = 0
+        # Data size of the file lists copied, and file count, data size
+        # and files done before it of the list being copied.  They
+        # stand for the bytes copied when the transfer doesn't count
+        # them.
+        self._listed_bytes = 0
+        self._list_files = 0
+        self._list_bytes = 0
+        self._list_start = 0
+        self._lock = threading.Lock()
+
+    def expect(self, nfiles, nbytes=0):
+        """Account for a file list of nfiles entries about to be copied,
+              holding nbytes bytes of file data if known
+           """
+        with self._lock:
+            self.total_files += nfiles
+            self._list_files = nfiles
+            self._list_bytes = nbytes
+            self._list_start = self.files_done
+
+    def list_done(self):
+        """Mark every file list handed over so far as copied"""
+        with self._lock:
+            self._listed_files = self.total_files
+            self.files_done = max(self.files_done, self._listed_files)
+            self._listed_bytes += self._list_bytes
+            self._list_files = 0
+            self._list_bytes = 0
+
+    def update(self, nfiles, nbytes=0):
+        """Account for nfiles files and nbytes bytes just copied"""
+        with self._lock:
+            self.files_done += nfiles
+            self.bytes_done += nbytes
+
+    def bytes_copied(self):
+        """Return the number of bytes copied.  When the transfer
+              doesn't count them, they are estimated from the data
+              sizes of the file lists: the lists copied, plus the
+              share of the current list its files done stand for.
+           """
+        if self.bytes_done:
+            return self.bytes_done
+        with self._lock:
+            nbytes = self._listed_bytes
+            if self._list_files:
+                share = float(self.files_done - self._list_start) / \
+                    self._list_files
+                nbytes += int(self._list_bytes * min(share, 1.0))
+        return nbytes
+
+    def fraction(self):
+        """Return the fraction, between 0 and 1, of the transfer done.
+              Bytes are used when they are known and the total is
+              known, files otherwise.  The transfer isn't done until
+              the last file list has been built.
+           """
+        nbytes = self.bytes_copied()
+        total_files = max(self.total_files, self.planned_files)
+        if self.total_bytes and nbytes:
+            done = float(nbytes) / self.total_bytes
+        elif total_files:
+            done = float(self.files_done) / total_files
+        else:
+            return 0.0
+        done = min(done, 1.0)
+        if self.listed is not None and not self.listed.is_set():
+            done = min(done, self.PENDING_FRACTION)
+        return done
+
+    def rate(self):
+        """Return the throughput in bytes per second, or in files per
+              second if bytes are not known.
+           """
+        elapsed = time.time() - self.start_time
+        if elapsed <= 0:
+            return 0.0
+        nbytes = self.bytes_copied()
+        if nbytes:
+            return nbytes / elapsed
+        return self.files_done / elapsed
+
+    def eta(self):
+        """Return the estimated number of seconds left, None if there
+              is no estimate yet.
+           """
+        done = self.fraction()
+        if done <= 0:
+            return None
+        elapsed = time.time() - self.start_time
+        return elapsed * (1 - done) / done
+
+    def describe(self):
+        """Return the throughput and ETA as a string suitable for
+              showing to the user.
+           """
+        if self.bytes_copied():
+            desc = "%.1f MB/s" % (self.rate() / 1048576.0)
+        else:
+            desc = "%d files/s" % self.rate()
+        eta = self.eta()
+        if eta is not None:
+            desc += ", %d:%02d remaining" % (int(eta) // 60, int(eta) % 60)
+        return desc
 
 class ProgressMon(object):
     """The ProgressMon class contains methods to monitor
           the progress of the transfer
        """
-    def __init__(self, message=None, distrosize=0,
-        initpct=0, endpct=0, done=0):
+    # Seconds between two progress reports
+    INTERVAL = 2
+
+    def __init__(self, message=None, initpct=0, endpct=0, done=0):
         self.message = message
-        self.distrosize = distrosize
         self.initpct = initpct
         self.endpct = endpct
         self.done = done
         self.thread1 = None
+        self.progress = None
+        self._wakeup = threading.Event()
 
-    def startmonitor(self, filesys, distrosize, message, initpct=0,
-        endpct=100):
-        """Start thread to monitor progress in populating file system
-           filesys - file system to monitor
-           distrosize = full distro size in kilobytes
+    def startmonitor(self, progress, message, initpct=0, endpct=100):
+        """Start thread to report the progress of the transfer
+           progress - TransferProgress updated by the transfer
            message = progress message to log. 
            initpct = base percent value from which to start calculating.
            endpct = percentage value at which to stop calculating
            """
         self.message =	message
-        self.distrosize = distrosize
+        self.progress = progress
         self.initpct = initpct
         self.endpct = endpct
         self.done = False
-        self.thread1 = threading.Thread(target=self.__progressthread,
-                                        args=(filesys, ))
+        self._wakeup.clear()
+        self.thread1 = threading.Thread(target=self.__progressthread)
         self.thread1.start()
         return 0
 
+    def stop(self):
+        """Stop the monitor thread and wait for it to exit"""
+        self.done = True
+        self._wakeup.set()
+        self.wait()
+
     def wait(self):
         """Wait"""
         self.thread1.join()
 
-    def __progressthread(self, filesystem):
-        """Monitor progress in populating file system
-              filesystem - file system to monitor
+    def __progressthread(self):
+        """Report the progress of the transfer, as counted by the
+              transfer itself, until stop() is called or the transfer
+              is aborted.
            """
-        initsize = self.__fssize(filesystem)
         totpct = self.endpct - self.initpct
         prevpct = -1
 
         # Loop until the user aborts or we're done transferring.
         # Keep track of the percentage done and let the user know
-        # how far the transfer has progressed.
+        # how far the transfer has progressed, how fast it goes and
+        # how long it should still take.
         while True:
-            # Compute increase in filesystem size
-            fssz = self.__fssize(filesystem)
-            if (fssz == -1):
-                return -1
-            fsgain = fssz - initsize
-
-            # Compute percentage transfer
-            actualpct = fsgain * 100 / self.distrosize
-            # Compute percentage transfer in terms of stated range
-            pct = fsgain * totpct / self.distrosize + self.initpct
-            # Do not exceed limits
-            if pct >= self.endpct or actualpct > 100:
-                pct = self.endpct
+            # Compute percentage transfer in terms of stated range.
+            # The total number of files can grow while file lists are
+            # still being built, don't let the percentage go back.
+            pct = int(self.progress.fraction() * totpct + self.initpct)
+            pct = max(min(pct, self.endpct), prevpct)
             # If the percentage has changed at all, log the
             # progress so the user can see something is going on.
             if (pct != prevpct):
-                tmod.logprogress(int(pct), self.message)
+                tmod.logprogress(pct, self.message + " (" +
+                                 self.progress.describe() + ")")
                 prevpct = pct
-            if pct >= self.endpct:
-                return 0
-            time.sleep(2)
+            self._wakeup.wait(self.INTERVAL)
             if tm_abort_signaled() or self.done:
                 return 0
 
-    @staticmethod
-    def __fssize(filesystem):
-        """Find the current size of the specified file system.
-			filesystem - file system to monitor
-		Returns the size of the filesystem in kilobytes
-		"""	
-        cmd = "/usr/bin/df -k " + filesystem
-        output = os.popen(cmd)
-        # Read the header and throw it away....
-        dfout = output.readline()
-        if not dfout:
-            logsvc.write_log(TRANSFER_ID, "FS size computation " +
-                             "failed for " + filesystem + "\n")
-            return -1
-        # read the line with the size information.
-        dfout = output.readline()
-        if not dfout:
-            logsvc.write_log(TRANSFER_ID, "FS size computation " +
-                             "failed for " + filesystem + "\n")
-            return -1
-        # and yank out the size information
-        line_tokens = dfout.split()
-        return int(line_tokens[2])
-
 
 class TransferCpio(object):
     """This class contains all the methods used to actually transfer
@@ -299,6 +658,42 @@ class TransferCpio(object):
         self.image_info = ""
         self.distro_size = 0
         self.log_handler = None
+        self.cpio_engine = TM_CPIO_ENGINE_CPIO
+        self.cpio_workers = DEFAULT_WORKERS
+        self.manifest = ""
+        self.cpio_dedup = False
+        # Number of buffers read ahead by the copy pipelines of the
+        # native engine, 0 when they're not used
+        self.pipeline_depth = 0
+        self.cpio_checksums = False
+        self.checksum_file = ""
+        # Checksums of the files copied, by pathname relative to
+        # dst_mntpt, when cpio_checksums is set
+        self.checksums = {}
+        # Pathnames an incremental transfer removed from dst_mntpt, or
+        # None if the checksum manifest is to be written from scratch
+        self.checksums_removed = None
+        self.plan_file = ""
+        self.cpio_order = ""
+        self.sort_file = ""
+        # Order of the pathnames in the file lists
+        self.flist_order = FlistOrder()
+        # Number of files and directories from the transfer plan, 0
+        # if there's none
+        self.plan_files = 0
+        self.plan_dirs = 0
+        # Set to stop a file list scan running in the background
+        self.scan_stop = threading.Event()
+        # Set once the file list scanner has built its last list, or
+        # when there's no scanner running
+        self.scan_listed = threading.Event()
+        self.scan_listed.set()
+        self.pmon = None
+        self.cancel = CancelToken()
+        # Scans of the source kept by the TransferSession, if any
+        self.scan_cache = None
+        self.metrics = TransferMetrics("cpio", None)
+        self.metrics_file = ""
 
         # This is live media specific and shouldn't be part
         # of transfer mod.
@@ -363,33 +758,63 @@ class TransferCpio(object):
                 symbolic links to files mounted off a compressed lofi file.
                 This is done to drastically reduce space usage by the
                 boot_archive.
+                Pathnames are processed a directory at a time, see
+                remove_listed().
 		"""
         self.dbg_msg("File list for clobber: " + flist_file)
-        filehandle = open(flist_file, 'r')
-        os.chdir(self.dst_mntpt)
-        for line in filehandle:
-            line = line[:-1]
+        with self.metrics.stage(STAGE_CLOBBER) as timer:
+            with open(flist_file, 'r') as filehandle:
+                stats = remove_listed(self.dst_mntpt, filehandle,
+                                      links_only=True,
+                                      nworkers=self.cpio_workers,
+                                      err_msg=self.dbg_msg,
+                                      abort_check=self.cancel.is_cancelled)
+            timer.files = stats.removed
+        self.check_abort()
+        self.dbg_msg("Clobber: " + str(stats))
 
-            try:
-                mst = os.lstat(line)
-                if st.S_ISLNK(mst.st_mode):
-                    self.dbg_msg("Unlink: " + line)
-                    os.unlink(line)
-            except OSError:
-                pass
-        filehandle.close()
+    def metrics_name(self):
+        """Return the pathname of the metrics file of the transfer"""
+        return self.metrics_file or default_metrics_file(self.log_handler)
 
-    @staticmethod
-    def check_abort():
+    def check_abort(self):
         """Check if the user aborted the transfer""" 
-        if tm_abort_signaled() == 1:
-            raise TAbort("User aborted transfer")
+        self.cancel.check()
+        if self.scan_stop.is_set():
+            raise TAbort("File list scan stopped")
+
+    def use_src_mntpt(self):
+        """Replace the default prefixes with the source mountpoint,
+		if one was given.
+		"""
+        if self.src_mntpt != "" and self.src_mntpt != "/":
+            self.cpio_prefixes = []
+            self.cpio_prefixes.append(CpioSpec(
+                                      chdir_prefix=self.src_mntpt, 
+                                      cpio_dir=".",
+                                      cpio_args=self.cpio_args))
 
     def build_cpio_entire_file_list(self):
         """Do a file tree walk of all the mountpoints provided and
 		build up pathname lists. Pathname lists of all mountpoints
 		under the same prefix are aggregated in the same file to
 		reduce the number of cpio invocations.
+		Returns the complete list of Flist entries.
+		"""
+        return list(self.iter_cpio_entire_file_list())
+
+    def iter_cpio_entire_file_list(self):
+        """Generator version of build_cpio_entire_file_list().
+		Each Flist entry is yielded, closed and ready to be copied,
+		as soon as the scan of its prefixes is finished, so the copy
+		of a prefix can start while later prefixes are still being
+		scanned. Pathnames are sorted in the order of the transfer,
+		by inode number by default, in bounded chunks (see
+		FlistSorter), so memory use doesn't grow with the number of
+		files.
+		Pathnames are resolved against the chdir_prefix rather than
+		the current directory, so the scan doesn't depend on the
+		process working directory.
 		"""	
 		
         self.info_msg("-- Starting transfer process, " +
@@ -398,15 +823,12 @@ class TransferCpio(object):
 
         tmod.logprogress(0, "Building file lists for cpio")
 
-        if self.src_mntpt != "" and self.src_mntpt != "/":
-            self.cpio_prefixes = []
-            self.cpio_prefixes.append(CpioSpec(
-                                      chdir_prefix=self.src_mntpt, 
-                                      cpio_dir=".",
-                                      cpio_args=self.cpio_args))
+        self.use_src_mntpt()
 
         total_find_percent = (len(self.cpio_prefixes) - 1) * \
             TMDefs.FIND_PERCENT
+        # The plan knows how many files there are, otherwise guess.
+        max_numfiles = float(self.plan_files) or TMDefs.MAX_NUMFILES
 
         # Get the optimized libc overlay out of the way.
         # Errors from umount intentionally ignored
@@ -427,10 +849,9 @@ class TransferCpio(object):
         patt = None
         i = 0
         nfiles = 0.0
-        # file entry list. List of files containing the files
-        # to cpio.
-        fent_list = []
         fent = None
+        # Sorts the pathnames of the current file list
+        sorter = self.new_sorter()
         self.check_abort()
 
         #
@@ -439,211 +860,199 @@ class TransferCpio(object):
         # under the same prefix are aggregated in the same file to
         # reduce the number of cpio invocations.
         #
-        # This loop builds a list where each entry points to a file
-        # containing a pathname list and mentions other info like the
-        # mountpoint from which to copy etc.
+        # Each file list is handed to the caller as soon as the next
+        # one is started, along with info like the mountpoint from
+        # which to copy etc.
         #
-        for cp in self.cpio_prefixes:
-            self.dbg_msg("Cpio dir: " + cp.cpio_dir +
-                         " Chdir to: " + cp.chdir_prefix)
-            patt = cp.match_pattern
-            self.check_abort()
-
-            if patt is not None and patt.startswith('!'):
-                negate = True
-                patt = patt[1:]
-            else:
-                negate = False
-
-            # Check to be sure the specified cpio source
-            # directory is accessable.
-            st2 = None
-            try:
-                os.chdir(cp.chdir_prefix)
-                st2 = os.stat(cp.cpio_dir)
-            except OSError:
-                raise TAbort("Failed to access Cpio dir: " +
-                             traceback.format_exc(),
-                             TM_E_CPIO_ENTIRE_FAILED)
-
-            # Create a new file if the prefix, or cpio_args
-            # or clobber files, have changed, or a
-            # file containing a pre-generated list of
-            # content is provided.
-            if (old_cprefix != cp.chdir_prefix or
-                patt is not None or
-                cp.clobber_files == 1 or cp.cpio_args is not None or
-                cp.file_list is not None):
-                # create a temporary file that will
-                # contain the list of files to cpio
-                # temp files are /var/run/flist<number>
-                fent = Flist()
-                fent_list.append(fent)
-                old_cprefix = cp.chdir_prefix
-                fent.name = "/var/run/flist" + str(i)
-                fent.open()
-                i = i + 1
-                self.dbg_msg(" File list tempfile:" +
-                             fent.name)
-                fent.handle = open(fent.name, "w+")
-                fent.chdir_prefix = cp.chdir_prefix
-                fent.clobber_files = cp.clobber_files
-                if (cp.cpio_args):
-                    fent.cpio_args = cp.cpio_args
-
-            # If the matching pattern is negated (!)
-            # flag this and remove the ! from the pattern
-            # before compiling it.
-            if patt is not None:
-                cpatt = re.compile(patt)
-
-            self.info_msg("Scanning " + cp.chdir_prefix + "/" +
-                          cp.cpio_dir)
-
-            # This is for temporarily storing the list of inode
-            # numbers and their corresponding file names.  This
-            # list will later be sorted by the inode number before
-            # it is written out to the cpio file list.
-            tmp_flist = []
+        try:
+            for cp in self.cpio_prefixes:
+                self.dbg_msg("Cpio dir: " + cp.cpio_dir +
+                             " Chdir to: " + cp.chdir_prefix)
+                patt = cp.match_pattern
+                self.check_abort()
+
+                if patt is not None and patt.startswith('!'):
+                    negate = True
+                    patt = patt[1:]
+                else:
+                    negate = False
 
-            if (cp.file_list):
+                # Check to be sure the specified cpio source
+                # directory is accessable.
+                top = os.path.join(cp.chdir_prefix, cp.cpio_dir)
+                st2 = None
                 try:
-                    image_content = open(cp.file_list, 'r')
-                except IOError:
-                    raise TAbort("Failed to access " +
-                                 cp.file_list,
-                                 TM_E_INVALID_CPIO_FILELIST_ATTR)
-
-                for fname in image_content:
-
-                    # Remove the '\n' character from
-                    # each of the lines read from the file
-                    if (fname[-1:] == '\n'):
-                        fname = fname[:-1]
+                    st2 = os.stat(top)
+                except OSError:
+                    raise TAbort("Failed to access Cpio dir: " +
+                                 traceback.format_exc(),
+                                 TM_E_CPIO_ENTIRE_FAILED)
+
+                # Create a new file if the prefix, or cpio_args
+                # or clobber files, have changed, or a
+                # file containing a pre-generated list of
+                # content is provided.
+                if (old_cprefix != cp.chdir_prefix or
+                    patt is not None or
+                    cp.clobber_files == 1 or cp.cpio_args is not None or
+                    cp.file_list is not None):
+                    # The previous file list is complete, write
+                    # it out and hand it over.
+                    if fent is not None:
+                        self.finish_file_list(fent, sorter)
+                        yield fent
+                    # create a temporary file that will
+                    # contain the list of files to cpio
+                    # temp files are /var/run/flist<number>
+                    fent = Flist()
+                    old_cprefix = cp.chdir_prefix
+                    fent.name = "/var/run/flist" + str(i)
+                    fent.open()
+                    i = i + 1
+                    self.dbg_msg(" File list tempfile:" +
+                                 fent.name)
+                    fent.chdir_prefix = cp.chdir_prefix
+                    fent.clobber_files = cp.clobber_files
+                    if (cp.cpio_args):
+                        fent.cpio_args = cp.cpio_args
+
+                # If the matching pattern is negated (!)
+                # flag this and remove the ! from the pattern
+                # before compiling it.
+                if patt is not None:
+                    cpatt = re.compile(patt)
+
+                self.info_msg("Scanning " + cp.chdir_prefix + "/" +
+                              cp.cpio_dir)
+
+                if (cp.file_list):
                     try:
-                        st1 = os.lstat(fname)
-                    except OSError:
-                        self.info_msg("Warning: Error" +
-                                      " processing " + fname +
-                                      "from file " + cp.file_list)
-                        continue
-
-                    # Store the extent location of the
-                    # hsfs file and the filename to a
-                    # temporary list
-                    tmp_flist.append((st1.st_ino, fname))
-            else:
-                #
-                # os.walk does not recurse into directory
-                # symlinks so nftw(..., FTW_PHYS) is satisfied.
-                # In addition, we want to restrict our search
-                # only to the current filesystem which is
-                # handled below.
-                #
-                for root, dirs, files in os.walk(cp.cpio_dir):
-                    self.check_abort()
-                    for name in files:
-                        match = None
-                        fname = root + "/" + name
-                        if patt is not None:
-                            match = \
-                                cpatt.match(name)
-                            # If we have a match on
-                            # the name but the
-                            # pattern was !, then
-                            # that's really a
-                            # non-match.  Also, if
-                            # no match is found
-                            # but the pattern
-                            # was not ! it's a
-                            # non-match.
-                            if (match is not None \
-                                and negate) \
-                                or (match is None \
-                                    and not negate):
-                                self.dbg_msg(
-                                    "Non " \
-                                    "match. " \
-                                    "Skipped:" \
-                                    + fname)
-                                continue
-
+                        image_content = open(cp.file_list, 'r')
+                    except IOError:
+                        raise TAbort("Failed to access " +
+                                     cp.file_list,
+                                     TM_E_INVALID_CPIO_FILELIST_ATTR)
+
+                    for fname in image_content:
+
+                        # Remove the '\n' character from
+                        # each of the lines read from the file
+                        if (fname[-1:] == '\n'):
+                            fname = fname[:-1]
                         try:
-                            st1 = os.lstat(fname)
+                            st1 = os.lstat(os.path.join(cp.chdir_prefix,
+                                                        fname))
                         except OSError:
-                            self.info_msg(
-                                          "Warning: Error" +
-                                          " processing " +
-                                          fname)
+                            self.info_msg("Warning: Error" +
+                                          " processing " + fname +
+                                          "from file " + cp.file_list)
                             continue
 
+                        # Store the extent location of the
+                        # hsfs file and the filename
+                        if st.S_ISDIR(st1.st_mode):
+                            sorter.add(st1.st_ino, fname, 0)
+                        else:
+                            sorter.add(st1.st_ino, fname, st1.st_size)
+                    image_content.close()
+                    continue
+
+                #
+                # walk_tree does not follow symbolic links so
+                # nftw(..., FTW_PHYS) is satisfied, and with same_fs
+                # it doesn't descend into other mounted filesystems,
+                # which emulates nftw(..., FTW_MOUNT).  The inode
+                # numbers come straight from the directory entries,
+                # so files don't have to be stat'ed.
+                #
+                for entry in self.walk_source(top):
+                    # pathname of the entry as seen from chdir_prefix
+                    fname = cp.cpio_dir + entry.path[len(top):]
+                    if entry.is_dir():
+                        self.check_abort()
                         # Store the extent location of
-                        # the hsfs file and the
-                        # filename to a temporary list
-                        tmp_flist.append((st1.st_ino,
-                                         fname))
-
-                        nfiles = nfiles + 1
-                        PARAMS.percent = int(nfiles /
-                                             TMDefs.MAX_NUMFILES *
-                                             total_find_percent)
-                        if PARAMS.percent - opercent > 1:
-                            tmod.logprogress(
-                                PARAMS.percent, "Building cpio file lists")
-                            opercent = PARAMS.percent
-
-                    #
-                    # Identify directories that we do not
-                    # want to traverse.  These are those
-                    # that can't be read for some reason
-                    # or those holding other mounted
-                    # filesystems.
-                    #
-                    rmlist = []
-                    for name in dirs:
-                        dname = root + "/" + name
-                        try:
-                            st1 = os.stat(dname)
-                        except OSError:
-                            rmlist.append(name)
+                        # the hsfs file and the filename
+                        sorter.add(entry.ino, fname, 0)
+                        continue
+
+                    if patt is not None:
+                        match = cpatt.match(entry.name)
+                        # If we have a match on the name but the
+                        # pattern was !, then that's really a
+                        # non-match.  Also, if no match is found
+                        # but the pattern was not ! it's a
+                        # non-match.
+                        if (match is not None and negate) or \
+                            (match is None and not negate):
+                            self.dbg_msg("Non match. Skipped:" + fname)
                             continue
 
-                        # Store the extent location of
-                        # the hsfs file and the
-                        # filename to a temporary list
-                        tmp_flist.append((st1.st_ino,
-                                         dname))
-
-                        # Emulate nftw(..., FTW_MOUNT)
-                        # for directories.
-                        if st1.st_dev != st2.st_dev:
-                            rmlist.append(name)
-
-                    #
-                    # Remove directories so that they are
-                    # not traversed.   os.walk allows dirs
-                    # to be modified in place.
-                    #
-                    for dname in rmlist:
-                        dirs.remove(dname)
-
-            # Write file list out to the file, after sorting
-            # by the inode number, which is the first item
-            tmp_flist.sort(key=operator.itemgetter(0))
-            lf = fent.handle
-            for entry in map(operator.itemgetter(1), tmp_flist):
-                lf.write(entry + "\n")
-            lf.flush()
-				
-        for fent in fent_list:
-            fent.handle.close()
-            fent.handle = None
-        return fent_list
-
-    def cpio_skip_files(self):
+                    # Store the extent location of
+                    # the hsfs file and the filename
+                    sorter.add(entry.ino, fname, entry.size)
+
+                    nfiles = nfiles + 1
+                    PARAMS.percent = int(nfiles /
+                                         max_numfiles *
+                                         total_find_percent)
+                    if PARAMS.percent - opercent > 1:
+                        tmod.logprogress(
+                            PARAMS.percent, "Building cpio file lists")
+                        opercent = PARAMS.percent
+
+            if fent is not None:
+                self.finish_file_list(fent, sorter)
+                yield fent
+        finally:
+            sorter.close()
+            if fent is not None and fent.handle is not None:
+                fent.handle.close()
+                fent.handle = None
+
+    def walk_source(self, top):
+        """Walk the source tree under top like walk_tree(top,
+		same_fs=True) does, reusing the scan kept by the session if
+		the tree didn't change since. Every entry is stat'ed if the
+		order of the file lists needs sizes, kept scans don't have
+		them. Without a kept scan, entries are also stat'ed for the
+		cpio engine when progress is reported: cpio doesn't count
+		the bytes it copies, the sizes of the file lists stand for
+		them.
+		"""
+        need_stat = self.flist_order.need_size
+        if self.scan_cache is None or need_stat:
+            if self.distro_size and self.cpio_engine == TM_CPIO_ENGINE_CPIO:
+                need_stat = True
+            return walk_tree(top, same_fs=True, need_stat=need_stat,
+                             onerror=self.scan_error)
+        return self.scan_cache.walk(top, onerror=self.scan_error)
+
+    def new_sorter(self):
+        """Return a FlistSorter sorting in the order of the file lists"""
+        return FlistSorter(order=self.flist_order)
+
+    def scan_error(self, err):
+        """Report an entry which can't be scanned. The entry is
+		skipped.
+		"""
+        self.info_msg("Warning: Error processing " + str(err.filename))
+
+    def finish_file_list(self, fent, sorter):
+        """Write the pathnames collected by sorter out to the file
+		list fent, sorted, and close it.
+		"""
+        fent.nfiles = sorter.count
+        fent.nbytes = sorter.nbytes or 0
+        with self.metrics.stage(STAGE_SORT, files=fent.nfiles):
+            sorter.write(fent.handle)
+        fent.handle.close()
+        fent.handle = None
+
+    def cpio_skip_files(self, missing_ok=False):
         """Function to remove the files listed in the skip file list.
 		Copying and then deleting the files is equivalent to not copying
 		them at all or "skipping" them.
+		Files which are already gone are ignored if missing_ok is set.
 		"""
         try:
             skip_file = open(self.skip_file_list, 'r')
@@ -651,10 +1060,19 @@ class TransferCpio(object):
             raise TAbort("Failed to access " +
                          self.skip_file_list, TM_E_INVALID_CPIO_ACT_ATTR)
 
-        for line in skip_file:
-            os.unlink(self.dst_mntpt + "/" + line.rstrip())
-			
-        skip_file.close()
+        with self.metrics.stage(STAGE_SKIP) as timer, skip_file:
+            stats = remove_listed(self.dst_mntpt, skip_file,
+                                  nworkers=self.cpio_workers,
+                                  err_msg=self.prerror,
+                                  abort_check=self.cancel.is_cancelled)
+            timer.files = stats.removed
+        self.check_abort()
+        self.info_msg("Skip files: " + str(stats))
+        if stats.failed or (stats.missing and not missing_ok):
+            raise TAbort("Failed to remove " +
+                         str(stats.failed + stats.missing) +
+                         " files listed in " + self.skip_file_list,
+                         TM_E_INVALID_CPIO_ACT_ATTR)
 
     @staticmethod
     def run_command(cmd):
@@ -676,78 +1094,653 @@ class TransferCpio(object):
               contents can be overlaid by contents from the running instance
               """
 		
-        fent_list = self.build_cpio_entire_file_list()
-        self.cpio_transfer_filelist(fent_list, TM_E_CPIO_ENTIRE_FAILED)
-        for fent in fent_list:
-            os.unlink(fent.name)
-            fent.name = ""
+        #
+        # The file lists are built by a separate thread and handed over
+        # through a queue, so the first prefix can be copied while the
+        # next ones are still being scanned.
+        #
+        fent_list = []
+        fent_queue = queue.Queue()
+        self.scan_stop.clear()
+        self.scan_listed.clear()
+        scanner = threading.Thread(target=self.scan_file_lists,
+                                   args=(fent_list, fent_queue))
+        scanner.start()
+        try:
+            self.cpio_transfer_filelist(self.queued_file_lists(fent_queue),
+                                        TM_E_CPIO_ENTIRE_FAILED)
+        finally:
+            self.scan_stop.set()
+            scanner.join()
+            # The scan is over, later stages mustn't see it as stopped
+            self.scan_stop.clear()
+            for fent in fent_list:
+                try:
+                    os.unlink(fent.name)
+                except OSError:
+                    pass
+                fent.name = ""
 
         if self.skip_file_list:
             self.cpio_skip_files()
 
+    def scan_file_lists(self, fent_list, fent_queue):
+        """Thread body building the file lists. Every finished Flist
+		is appended to fent_list and put on fent_queue. None is
+		queued once all the lists are built, the exception is
+		queued instead if the scan fails.
+		"""
+        try:
+            with self.metrics.stage(STAGE_SCAN) as timer:
+                for fent in self.iter_cpio_entire_file_list():
+                    timer.files += fent.nfiles
+                    fent_list.append(fent)
+                    fent_queue.put(fent)
+            fent_queue.put(None)
+        except Exception as err:
+            fent_queue.put(err)
+        finally:
+            self.scan_listed.set()
+
+    @staticmethod
+    def queued_file_lists(fent_queue):
+        """Generate the Flist entries put on fent_queue by
+		scan_file_lists(), re-raising a scan failure in the
+		caller's thread.
+		"""
+        while True:
+            fent = fent_queue.get()
+            if fent is None:
+                return
+            if isinstance(fent, Exception):
+                raise fent
+            yield fent
+
+    def manifest_name(self):
+        """Return the pathname of the transfer manifest. Unless one
+		was given, it's kept next to the destination directory so it
+		doesn't end up in the transferred image.
+		"""
+        if self.manifest:
+            return self.manifest
+        return os.path.normpath(self.dst_mntpt) + ".manifest"
+
+    def scan_manifest_records(self, top, manifest):
+        """Generate the (path, size, mtime, ino, mode) manifest records
+		of everything under top, in manifest order. Each record is
+		also added to the new manifest.
+		"""
+        for entry in walk_tree(top, same_fs=True, need_stat=True,
+                               onerror=self.scan_error, sort_names=True):
+            if entry.is_dir():
+                self.check_abort()
+            rec = (entry.path[len(top):].lstrip("/"), entry.size,
+                   entry.mtime, entry.ino, entry.mode)
+            manifest.add(rec)
+            yield rec
+
+    def remove_dst_entry(self, path):
+        """Remove path, relative to the destination, whatever it is"""
+        dst = os.path.join(self.dst_mntpt, path)
+        try:
+            if st.S_ISDIR(os.lstat(dst).st_mode):
+                shutil.rmtree(dst)
+            else:
+                os.unlink(dst)
+        except OSError as err:
+            if err.errno not in (errno.ENOENT, errno.ENOTDIR):
+                raise
+
+    def cpio_transfer_incremental(self):
+        """Bring the destination up to date with the source, copying
+		only what changed since the last transfer.
+		The source is scanned and compared with the manifest saved
+		by the previous transfer. Pathnames which were added or
+		whose size, mtime, inode number or mode changed are copied,
+		pathnames which disappeared are removed from the destination.
+		Without a usable manifest everything is copied. The new
+		manifest only replaces the old one once every file list was
+		copied without errors, so a failed transfer is retried in
+		full next time.
+		"""
+        self.info_msg("-- Starting incremental transfer process, " +
+                      time.strftime(self.tformat) + " --")
+        self.check_abort()
+
+        if self.src_mntpt != "":
+            top = self.src_mntpt
+        else:
+            top = "/"
+        try:
+            os.stat(top)
+        except OSError:
+            raise TAbort("Failed to access Cpio dir: " +
+                         traceback.format_exc(), TM_E_CPIO_ENTIRE_FAILED)
+
+        tmod.logprogress(0, "Comparing with the transfer manifest")
+        manifest = TransferManifest(self.manifest_name(), top)
+        self.info_msg("Transfer manifest: " + manifest.name)
+
+        fent = Flist()
+        fent.name = "/var/run/flist_incr"
+        fent.chdir_prefix = top
+        fent.cpio_args = self.cpio_args
+        sorter = self.new_sorter()
+        removed = []
+        nchanged = 0
+        nold = [0]
+
+        def old_entries():
+            """The records of the previous manifest, counted"""
+            for rec in manifest.entries():
+                nold[0] += 1
+                yield rec
+        try:
+            try:
+                manifest.create()
+                fent.open()
+                new_recs = self.scan_manifest_records(top, manifest)
+                with self.metrics.stage(STAGE_SCAN) as timer:
+                    for action, old, new in \
+                        manifest_diff(old_entries(), new_recs):
+                        if action == MANIFEST_REMOVED:
+                            removed.append(old[0])
+                            continue
+                        if action == MANIFEST_CHANGED and \
+                            st.S_IFMT(old[4]) != st.S_IFMT(new[4]):
+                            # cpio won't replace a directory with a
+                            # file or the other way round.
+                            removed.append(old[0])
+                        if st.S_ISDIR(new[4]):
+                            sorter.add(new[3], "./" + new[0], 0)
+                        else:
+                            sorter.add(new[3], "./" + new[0], new[1])
+                        nchanged += 1
+                    timer.files = nchanged
+                self.finish_file_list(fent, sorter)
+            except (OSError, IOError):
+                raise TAbort("Failed to compare " + top +
+                             " with the transfer manifest: " +
+                             traceback.format_exc(), TM_E_CPIO_ENTIRE_FAILED)
+
+            self.info_msg(str(nchanged) + " pathnames to copy, " +
+                          str(len(removed)) + " to remove")
+
+            # The checksums of the files left alone are kept from the
+            # previous checksum manifest, unless there was no previous
+            # transfer to go by and everything is copied.
+            if nold[0]:
+                self.checksums_removed = removed
+
+            # Removed pathnames come in manifest order, so going
+            # backwards removes the contents of a directory before
+            # the directory.
+            try:
+                for path in reversed(removed):
+                    self.check_abort()
+                    self.dbg_msg("Remove: " + path)
+                    self.remove_dst_entry(path)
+            except OSError:
+                raise TAbort("Failed to remove from " + self.dst_mntpt +
+                             ": " + traceback.format_exc(),
+                             TM_E_CPIO_ENTIRE_FAILED)
+
+            failed = 0
+            if nchanged:
+                failed = self.cpio_transfer_filelist([fent],
+                                                     TM_E_CPIO_ENTIRE_FAILED)
+
+            if self.skip_file_list:
+                self.cpio_skip_files(missing_ok=True)
+
+            if failed:
+                self.info_msg("WARNING: transfer had errors, keeping the "
+                              "previous transfer manifest")
+            else:
+                manifest.commit()
+        finally:
+            sorter.close()
+            manifest.abandon()
+            if fent.handle is not None:
+                fent.handle.close()
+                fent.handle = None
+            try:
+                os.unlink(fent.name)
+            except OSError:
+                pass
+
+    def checksum_name(self):
+        """Return the pathname of the checksum manifest. Unless one
+		was given, it's kept next to the destination directory, like
+		the transfer manifest.
+		"""
+        if self.checksum_file:
+            return self.checksum_file
+        return os.path.normpath(self.dst_mntpt) + ".checksums"
+
+    def write_checksums(self):
+        """Write the checksums of the files copied to the checksum
+		manifest, leaving out the files removed by the skip file
+		list. After an incremental transfer, the checksums of the
+		files it didn't copy are taken from the existing manifest.
+		"""
+        manifest = ChecksumManifest(self.checksum_name())
+        if self.checksums_removed is not None:
+            self.merge_checksums(manifest)
+        if self.skip_file_list:
+            try:
+                with open(self.skip_file_list, 'r') as skip_file:
+                    for name in skip_file:
+                        name = os.path.normpath(name.strip()).lstrip("/")
+                        self.checksums.pop(name, None)
+            except IOError:
+                raise TAbort("Failed to access " + self.skip_file_list,
+                             TM_E_INVALID_CPIO_ACT_ATTR)
+        try:
+            manifest.write(self.checksums)
+        except (IOError, OSError):
+            raise TAbort("Failed to write the checksum manifest " +
+                         manifest.name, TM_E_INVALID_CPIO_ACT_ATTR)
+        self.info_msg("Checksums of " + str(len(self.checksums)) +
+                      " files written to " + manifest.name)
+
+    def merge_checksums(self, manifest):
+        """Add to self.checksums the checksums of manifest for the
+		pathnames an incremental transfer neither copied nor
+		removed. Without a readable manifest of the current format,
+		only the checksums of the files copied are kept, and the
+		files left alone go unchecked until a full transfer.
+		"""
+        copied = self.checksums
+        removed = set(self.checksums_removed)
+        self.checksums = {}
+        try:
+            for path, checksum, size in manifest.entries():
+                if path not in removed:
+                    self.checksums[path] = (checksum, size)
+        except IOError:
+            pass
+        except ValueError:
+            self.info_msg("WARNING: ignoring the checksum manifest " +
+                          manifest.name + " of an unknown format")
+            self.checksums = {}
+        self.checksums.update(copied)
+
+    def cpio_transfer_verify(self):
+        """Check the files listed in the checksum manifest of an
+		earlier transfer against the destination. Files are read
+		back and hashed by cpio_workers threads. Every file which
+		doesn't match, is missing or can't be read is reported, and
+		fails the verification.
+		"""
+        self.info_msg("-- Starting transfer verification, " +
+                      time.strftime(self.tformat) + " --")
+        self.check_abort()
+        tmod.logprogress(0, "Verifying the transferred files")
+
+        manifest = ChecksumManifest(self.checksum_name())
+        self.info_msg("Checksum manifest: " + manifest.name)
+        try:
+            entries = list(manifest.entries())
+        except (IOError, ValueError):
+            raise TAbort("Unable to read the checksum manifest " +
+                         manifest.name + ": " + str(sys.exc_info()[1]),
+                         TM_E_INVALID_CPIO_ACT_ATTR)
+
+        self.distro_size = sum([entry[2] for entry in entries]) // 1024
+        progress = self.start_progress()
+        progress.expect(len(entries))
+        try:
+            with self.metrics.stage(STAGE_VERIFY) as timer:
+                stats = verify_checksums(self.dst_mntpt, entries,
+                                         nworkers=self.cpio_workers,
+                                         err_msg=self.prerror,
+                                         abort_check=self.cancel.is_cancelled,
+                                         progress=progress.update)
+                timer.files = stats.checked
+                timer.nbytes = stats.nbytes
+        finally:
+            self.stop_progress()
+        self.check_abort()
+
+        self.info_msg("Verification: " + str(stats))
+        if not stats.ok():
+            raise TAbort("Verification of " + self.dst_mntpt + " failed: " +
+                         str(stats), TM_E_CPIO_VERIFY_FAILED)
+
+    def cpio_transfer_plan(self):
+        """Scan the prefixes a TM_CPIO_ENTIRE transfer would copy and
+		write a transfer plan to plan_file instead of copying them.
+		A sample of the files is copied to a scratch directory in the
+		destination to measure the throughput.
+		"""
+        self.info_msg("-- Starting transfer plan, " +
+                      time.strftime(self.tformat) + " --")
+        self.check_abort()
+        tmod.logprogress(0, "Planning the transfer")
+
+        self.use_src_mntpt()
+        if self.src_mntpt != "":
+            plan = TransferPlan(self.src_mntpt)
+        else:
+            plan = TransferPlan("/")
+
+        scan_start = time.time()
+        for cp in self.cpio_prefixes:
+            self.check_abort()
+            top = os.path.normpath(os.path.join(cp.chdir_prefix,
+                                                cp.cpio_dir))
+            plan.start_prefix(top)
+            self.info_msg("Scanning " + top)
+
+            if cp.file_list:
+                try:
+                    image_content = open(cp.file_list, 'r')
+                except IOError:
+                    raise TAbort("Failed to access " + cp.file_list,
+                                 TM_E_INVALID_CPIO_FILELIST_ATTR)
+                with image_content:
+                    for fname in image_content:
+                        path = os.path.join(cp.chdir_prefix,
+                                            fname.rstrip("\n"))
+                        try:
+                            st1 = os.lstat(path)
+                        except OSError:
+                            continue
+                        plan.add(path, st.S_IFMT(st1.st_mode), st1.st_size)
+                continue
+
+            try:
+                os.stat(top)
+            except OSError:
+                raise TAbort("Failed to access Cpio dir: " +
+                             traceback.format_exc(),
+                             TM_E_CPIO_ENTIRE_FAILED)
+
+            # Same filtering as the file list scan
+            patt = cp.match_pattern
+            negate = patt is not None and patt.startswith('!')
+            if negate:
+                patt = patt[1:]
+            if patt is not None:
+                cpatt = re.compile(patt)
+
+            for entry in walk_tree(top, same_fs=True, need_stat=True,
+                                   onerror=self.scan_error):
+                if entry.is_dir():
+                    self.check_abort()
+                    plan.add(entry.path, entry.ftype, 0)
+                    continue
+                if patt is not None and \
+                    (cpatt.match(entry.name) is None) != negate:
+                    continue
+                plan.add(entry.path, entry.ftype, entry.size)
+
+        self.metrics.add(STAGE_SCAN, time.time() - scan_start, plan.files,
+                         plan.nbytes)
+
+        tmod.logprogress(50, "Measuring the copy throughput")
+        try:
+            plan.measure(self.dst_mntpt)
+        except OSError:
+            raise TAbort("Failed to measure the copy throughput in " +
+                         self.dst_mntpt + ": " + traceback.format_exc(),
+                         TM_E_CPIO_ENTIRE_FAILED)
+
+        try:
+            plan.write(self.plan_file)
+        except IOError:
+            raise TAbort("Failed to write the transfer plan " +
+                         self.plan_file, TM_E_INVALID_CPIO_ACT_ATTR)
+
+        self.info_msg("Transfer plan: " + str(plan.files) + " files, " +
+                      str(plan.dirs) + " directories, " +
+                      str(plan.nbytes // 1048576) + " MB, estimated " +
+                      str(plan.estimate(plan.nbytes)) + " seconds")
+
+    def list_file_entry(self):
+        """Return the Flist entry of a TM_CPIO_LIST transfer.
+		If the session kept a scan of the source, or an order was
+		given for the file lists, the list is copied to a file list
+		sorted like the lists of TM_CPIO_ENTIRE. The inode numbers
+		come from the kept scan, pathnames the scan didn't find are
+		stat'ed, as are all of them if the order needs sizes.
+		Otherwise the list is copied in its own order.
+		"""
+        inodes = None
+        if self.scan_cache is not None and not self.flist_order.need_size:
+            inodes = self.scan_cache.inodes(self.src_mntpt or "/")
+
+        fent = Flist()
+        fent.chdir_prefix = self.src_mntpt
+        fent.cpio_args = self.cpio_args
+        if inodes is None and not self.cpio_order:
+            try:
+                with open(self.list_file, 'r') as list_handle:
+                    fent.nfiles = sum(1 for line in list_handle)
+            except:
+                raise TAbort("Unable to open " + self.list_file,
+                             TM_E_INVALID_CPIO_ACT_ATTR)
+            fent.name = self.list_file
+            return fent
+
+        if inodes is None:
+            inodes = {}
+        self.dbg_msg("Sorting " + self.list_file + " by " +
+                     self.flist_order.name)
+        fent.name = "/var/run/flist_list"
+        sorter = self.new_sorter()
+        try:
+            try:
+                list_handle = open(self.list_file, 'r')
+            except IOError:
+                raise TAbort("Unable to open " + self.list_file,
+                             TM_E_INVALID_CPIO_ACT_ATTR)
+            with list_handle:
+                for fname in list_handle:
+                    fname = fname.rstrip("\n")
+                    ino = inodes.get(os.path.normpath(fname))
+                    size = None
+                    if ino is None:
+                        try:
+                            st1 = os.lstat(os.path.join(self.src_mntpt,
+                                                        fname))
+                            ino = st1.st_ino
+                            size = 0
+                            if not st.S_ISDIR(st1.st_mode):
+                                size = st1.st_size
+                        except OSError:
+                            # Left for cpio to report
+                            ino = 0
+                    sorter.add(ino, fname, size)
+            fent.open()
+            self.finish_file_list(fent, sorter)
+        finally:
+            sorter.close()
+            if fent.handle is not None:
+                fent.handle.close()
+                fent.handle = None
+        return fent
+
     def cpio_transfer_filelist(self, fent_list, err_code):
-        """Transfer every file in fent_list"""
+        """Transfer every file in fent_list. fent_list can be any
+		iterable of Flist entries, including one still being
+		filled in by the file list scanner.
+		Returns the number of file lists which had errors.
+		"""
+        if self.cpio_engine == TM_CPIO_ENGINE_NATIVE:
+            return self.native_transfer_filelist(fent_list, err_code)
+
         self.info_msg("Beginning cpio actions")
 
         #
         # Now process each entry in the list. cpio is executed with the
-        # -V option so that it prints a dot for each pathname processed.
-        # This is needed to provide the ability to abort midway.
+        # -V option so that it prints a dot for each pathname processed,
+        # which is used to report progress. A running cpio is terminated
+        # as soon as the transfer is cancelled.
         #
 
         #
-        # Start the disk space monitor thread
+        # Start the progress monitor thread
         #
-        if self.distro_size:
-            pmon = ProgressMon()
-            pmon.startmonitor(self.dst_mntpt, self.distro_size,
-                              "Transferring Contents", PARAMS.percent, 95)
+        progress = self.start_progress()
+        failed = 0
 
         # Walk file lists, cpio'ing each in turn.
-        for fent in fent_list:
-            self.check_abort()
+        try:
+            for fent in fent_list:
+                self.check_abort()
+                progress.expect(fent.nfiles, fent.nbytes)
 
-            if fent.clobber_files == 1:
-                self.do_clobber_files(fent.name)
+                if fent.clobber_files == 1:
+                    self.do_clobber_files(fent.name)
 
-            try:
-                os.chdir(fent.chdir_prefix)
-            except OSError:
-                raise TAbort("Failed to access " +
-                             fent.chdir_prefix, err_code)
-            cmd = TMDefs.CPIO + " -" + fent.cpio_args + "V " + \
-                self.dst_mntpt + " < " + fent.name
-            self.dbg_msg("Executing: " + cmd + " CWD: " +
-                         fent.chdir_prefix)
-            err_file = tempfile.TemporaryFile()
-            if self.log_handler is not None:
-                retval = exec_cmd_outputs_to_log(cmd.split(),
-                                             self.log_handler)
-                if (retval != 0):
-                    self.log_handler.error(cmd +
-                                           " had errors")
-            else:
-                pipe = sp.Popen(cmd, shell=True, stdout=sp.PIPE,
-                             stderr=err_file, close_fds=True)
-                char = True
-                while char:
-                    char = pipe.stdout.read(1)
+                try:
+                    os.chdir(fent.chdir_prefix)
+                except OSError:
+                    raise TAbort("Failed to access " +
+                                 fent.chdir_prefix, err_code)
+                cmd = TMDefs.CPIO + " -" + fent.cpio_args + "V " + \
+                    self.dst_mntpt + " < " + fent.name
+                self.dbg_msg("Executing: " + cmd + " CWD: " +
+                             fent.chdir_prefix)
+                copy_start = time.time()
+                err_file = tempfile.TemporaryFile()
+                if self.log_handler is not None:
+                    retval = exec_cmd_outputs_to_log(cmd.split(),
+                                                 self.log_handler,
+                                                 cancel=self.cancel)
+                    if (retval != 0):
+                        failed += 1
+                        self.log_handler.error(cmd +
+                                               " had errors")
+                else:
+                    with open(fent.name, 'rb') as list_handle:
+                        pipe = sp.Popen([TMDefs.CPIO,
+                                         "-" + fent.cpio_args + "V",
+                                         self.dst_mntpt],
+                                        stdin=list_handle, stdout=sp.PIPE,
+                                        stderr=err_file, close_fds=True)
+                    terminate = self.terminator(pipe)
+                    self.cancel.add_callback(terminate)
+                    try:
+                        out_fd = pipe.stdout.fileno()
+                        while True:
+                            output = os.read(out_fd, 65536)
+                            if not output:
+                                break
+                            # cpio prints a dot for each pathname
+                            progress.update(output.count(b"."))
+                        retval = pipe.wait()
+                    finally:
+                        self.cancel.remove_callback(terminate)
+                        pipe.stdout.close()
                     self.check_abort()
-                retval = pipe.wait()
-
-                if retval != 0 and self.debugflag == 1:
-                    err_file.seek(0)
-                    self.info_msg("WARNING: " + cmd
-                                  + " had errors")
-                    self.info_msg("         "
-                                  + err_file.read())
+                    if retval != 0:
+                        failed += 1
+
+                    if retval != 0 and self.debugflag == 1:
+                        err_file.seek(0)
+                        self.info_msg("WARNING: " + cmd
+                                      + " had errors")
+                        self.info_msg("         "
+                                      + err_file.read())
+
+                    err_file.close()
+                elapsed = time.time() - copy_start
+                self.metrics.command("cpio", elapsed, retval)
+                self.metrics.add(STAGE_COPY, elapsed, fent.nfiles)
+                progress.list_done()
+        finally:
+            self.stop_progress()
+        return failed
 
-                err_file.close()
+    @staticmethod
+    def terminator(pipe):
+        """Return a callable terminating the process of pipe if it's
+		still running, to be registered with the CancelToken.
+		"""
+        def terminate():
+            """Terminate the process"""
+            if pipe.poll() is None:
+                try:
+                    pipe.terminate()
+                except OSError:
+                    pass
+        return terminate
 
+    def start_progress(self):
+        """Set up the counters of the transfer about to start, and
+		start reporting progress if the size of the distribution is
+		known. Returns the TransferProgress to keep up to date.
+		"""
+        PARAMS.progress = TransferProgress(self.distro_size * 1024,
+                                           self.plan_files + self.plan_dirs,
+                                           self.scan_listed)
         if self.distro_size:
-            pmon.done = True
-            pmon.wait()
+            self.pmon = ProgressMon()
+            self.pmon.startmonitor(PARAMS.progress, "Transferring Contents",
+                                   PARAMS.percent, 95)
+        return PARAMS.progress
+
+    def stop_progress(self):
+        """Stop reporting progress"""
+        if self.pmon is not None:
+            self.pmon.stop()
+            self.pmon = None
+
+    def native_transfer_filelist(self, fent_list, err_code):
+        """Transfer every file in fent_list using the native copy
+              engine instead of cpio. The file lists are processed one
+              after the other, the entries of each list are copied
+              by a pool of worker threads.
+              Returns the number of file lists which had errors.
+              """
+        self.info_msg("Beginning native copy actions, " +
+                      str(self.cpio_workers) + " workers")
+
+        progress = self.start_progress()
+        engine = CopyEngine(self.dst_mntpt, self.cpio_workers,
+                            abort_check=self.cancel.is_cancelled,
+                            info_msg=self.info_msg, dbg_msg=self.dbg_msg,
+                            progress=progress, dedup=self.cpio_dedup,
+                            pipeline_depth=self.pipeline_depth,
+                            checksum=self.cpio_checksums)
+        failed = 0
+        try:
+            for fent in fent_list:
+                self.check_abort()
+                progress.expect(fent.nfiles, fent.nbytes)
+
+                if fent.clobber_files == 1:
+                    self.do_clobber_files(fent.name)
 
+                self.dbg_msg("Copying " + fent.name + " from " +
+                             fent.chdir_prefix)
+                bytes_before = progress.bytes_done
+                with self.metrics.stage(STAGE_COPY, fent.nfiles) as timer:
+                    try:
+                        errors = engine.copy_filelist(fent.name,
+                                                      fent.chdir_prefix,
+                                                      fent.cpio_args)
+                    except (OSError, IOError):
+                        raise TAbort("Failed to copy files listed in " +
+                                     fent.name + ": " +
+                                     traceback.format_exc(), err_code)
+                    timer.nbytes = progress.bytes_done - bytes_before
+                self.check_abort()
+                if errors:
+                    failed += 1
+                    self.info_msg("WARNING: copy of " + fent.name +
+                                  " had " + str(errors) + " errors")
+                progress.list_done()
+        finally:
+            self.stop_progress()
+
+        engine.log_stats()
+        if engine.checksums is not None:
+            self.checksums.update(engine.checksums)
+        return failed
 
     def perform_transfer(self, args):
         """Main function for doing the copying of bits"""
@@ -774,6 +1767,48 @@ class TransferCpio(object):
                 self.skip_file_list = val
             elif opt == TM_CPIO_ARGS:
                 self.cpio_args = val
+            elif opt == TM_CPIO_ENGINE:
+                if val not in (TM_CPIO_ENGINE_CPIO, TM_CPIO_ENGINE_NATIVE):
+                    raise TValueError("Invalid copy engine " + str(val),
+                                      TM_E_INVALID_CPIO_ACT_ATTR)
+                self.cpio_engine = val
+            elif opt == TM_CPIO_WORKERS:
+                try:
+                    self.cpio_workers = int(val)
+                except ValueError:
+                    self.cpio_workers = 0
+                if self.cpio_workers < 1:
+                    raise TValueError("Invalid number of copy workers " +
+                                      str(val), TM_E_INVALID_CPIO_ACT_ATTR)
+            elif opt == TM_CPIO_MANIFEST:
+                self.manifest = val
+            elif opt == TM_CPIO_PLAN_FILE:
+                self.plan_file = val
+            elif opt == TM_CPIO_DEDUP:
+                self.cpio_dedup = (val.lower() == "true")
+            elif opt == TM_CPIO_ORDER:
+                if val not in (TM_CPIO_ORDER_INODE, TM_CPIO_ORDER_PATH,
+                               TM_CPIO_ORDER_SIZE, TM_CPIO_ORDER_DIRECTORY,
+                               TM_CPIO_ORDER_SORT_FILE):
+                    raise TValueError("Invalid file list order " + str(val),
+                                      TM_E_INVALID_CPIO_ACT_ATTR)
+                self.cpio_order = val
+            elif opt == TM_CPIO_SORT_FILE:
+                self.sort_file = val
+            elif opt == TM_CPIO_CHECKSUMS:
+                self.cpio_checksums = (val.lower() == "true")
+            elif opt == TM_CPIO_CHECKSUM_FILE:
+                self.checksum_file = val
+            elif opt == TM_CPIO_PIPELINE_DEPTH:
+                try:
+                    self.pipeline_depth = int(val)
+                except ValueError:
+                    self.pipeline_depth = -1
+                if self.pipeline_depth < 0:
+                    raise TValueError("Invalid copy pipeline depth " +
+                                      str(val), TM_E_INVALID_CPIO_ACT_ATTR)
+            elif opt == TM_METRICS_FILE:
+                self.metrics_file = val
             elif opt == TM_PYTHON_LOG_HANDLER:
                 self.log_handler = val
             else:
@@ -785,10 +1820,43 @@ class TransferCpio(object):
             raise TValueError("No list file for List Cpio action",
                               TM_E_INVALID_CPIO_FILELIST_ATTR)
 
+        if self.cpio_action == TM_CPIO_PLAN and self.plan_file == "":
+            raise TValueError("No plan file for Plan Cpio action",
+                              TM_E_INVALID_CPIO_ACT_ATTR)
+
         if self.dst_mntpt == "":
             raise TValueError("Target mountpoint not set",
                               TM_E_INVALID_CPIO_ACT_ATTR)
 
+        if self.cpio_dedup and self.cpio_engine != TM_CPIO_ENGINE_NATIVE:
+            raise TValueError("Deduplication needs the native copy engine",
+                              TM_E_INVALID_CPIO_ACT_ATTR)
+
+        if self.cpio_checksums and self.cpio_engine != TM_CPIO_ENGINE_NATIVE:
+            raise TValueError("Checksums need the native copy engine",
+                              TM_E_INVALID_CPIO_ACT_ATTR)
+
+        if self.pipeline_depth and self.cpio_engine != TM_CPIO_ENGINE_NATIVE:
+            raise TValueError("Copy pipelines need the native copy engine",
+                              TM_E_INVALID_CPIO_ACT_ATTR)
+
+        # A sort file alone orders the file lists
+        if self.sort_file and not self.cpio_order:
+            self.cpio_order = TM_CPIO_ORDER_SORT_FILE
+        if self.cpio_order == TM_CPIO_ORDER_SORT_FILE and not self.sort_file:
+            raise TValueError("No sort file for the sortfile order",
+                              TM_E_INVALID_CPIO_ACT_ATTR)
+        if self.cpio_order:
+            try:
+                self.flist_order = flist_order(self.cpio_order,
+                                               self.sort_file)
+            except (IOError, ValueError):
+                raise TAbort("Unable to read the sort file " +
+                             self.sort_file + ": " +
+                             str(sys.exc_info()[1]),
+                             TM_E_INVALID_CPIO_ACT_ATTR)
+            self.info_msg("File list order: " + self.cpio_order)
+
         if self.cpio_action == TM_CPIO_ENTIRE and self.image_info == "":
             self.image_info = "/.cdrom/.image_info"
 
@@ -830,6 +1898,20 @@ class TransferCpio(object):
                              "IMAGE_SIZE in " + self.image_info,
                              TM_E_INVALID_CPIO_ACT_ATTR)
 
+        #
+        # A transfer plan made beforehand knows the actual size of the
+        # transfer, prefer it to the image_info estimate.
+        #
+        if self.plan_file and self.cpio_action != TM_CPIO_PLAN:
+            try:
+                plan = read_plan(self.plan_file)
+            except (IOError, ValueError):
+                raise TAbort("Unable to read the transfer plan " +
+                             self.plan_file, TM_E_INVALID_CPIO_ACT_ATTR)
+            self.distro_size = plan["bytes"] // 1024
+            self.plan_files = plan["files"]
+            self.plan_dirs = plan["directories"]
+
         try:
             os.putenv('TMPDIR', '/tmp')
         except OSError:
@@ -837,24 +1919,30 @@ class TransferCpio(object):
 
         if self.cpio_action == TM_CPIO_ENTIRE:
             self.cpio_transfer_entire_directory()
+        elif self.cpio_action == TM_CPIO_INCREMENTAL:
+            self.cpio_transfer_incremental()
+        elif self.cpio_action == TM_CPIO_PLAN:
+            self.cpio_transfer_plan()
+        elif self.cpio_action == TM_CPIO_VERIFY:
+            self.cpio_transfer_verify()
         elif self.cpio_action == TM_CPIO_LIST:
+            fent = self.list_file_entry()
             try:
-                open(self.list_file, 'r')
-            except:
-                raise TAbort("Unable to open " + self.list_file,
-                             TM_E_INVALID_CPIO_ACT_ATTR)
-            fent_list = []
-            fent = Flist()
-            fent_list.append(fent)
-            fent.name = self.list_file
-            fent.chdir_prefix = self.src_mntpt
-            fent.cpio_args = self.cpio_args
-            self.cpio_transfer_filelist(fent_list,
-                                        TM_E_CPIO_LIST_FAILED)
+                self.cpio_transfer_filelist([fent], TM_E_CPIO_LIST_FAILED)
+            finally:
+                if fent.name != self.list_file:
+                    try:
+                        os.unlink(fent.name)
+                    except OSError:
+                        pass
         else:
             raise TAbort("Invalid CPIO action",
                          TM_E_INVALID_CPIO_ACT_ATTR)
 
+        if self.cpio_checksums and self.cpio_action in (TM_CPIO_ENTIRE,
+            TM_CPIO_LIST, TM_CPIO_INCREMENTAL):
+            self.write_checksums()
+
         tmod.logprogress(100, "Completing transfer process")
         self.info_msg("-- Completed transfer process, " +
                       time.strftime(self.tformat) + " --")
@@ -884,6 +1972,16 @@ class TransferIps(object):
         self._log_handler = None
         self._verbose_mode = ""
         self._init_retry_timeout = 0
+        self._publisher_spec = ""
+        self._publisher_results = ""
+        self._catalog_cache = ""
+        self._retry_attempts = ""
+        self._retry_log = None
+        self._install_batch = 0
+        self.retry = RetryPolicy()
+        self.cancel = CancelToken()
+        self.metrics = TransferMetrics("ips", None)
+        self.metrics_file = ""
 		
     @staticmethod
     def prerror(msg):
@@ -893,6 +1991,49 @@ class TransferIps(object):
         sys.stderr.write(msg1)
         sys.stderr.flush()
 
+    def metrics_name(self):
+        """Return the pathname of the metrics file of the transfer"""
+        return self.metrics_file or default_metrics_file(self._log_handler)
+
+    @staticmethod
+    def pkg_subcommand(cmd):
+        """Return the pkg subcommand run by the command list cmd"""
+        args = cmd[1:]
+        idx = 0
+        while idx < len(args):
+            if args[idx] == "-R":
+                idx += 2
+            elif args[idx].startswith("-"):
+                idx += 1
+            else:
+                return args[idx]
+        return cmd[0]
+
+    def run_pkg(self, cmd, retryable=RetryPolicy.RETRY_LOCKED,
+                max_attempts=None, max_wait=None):
+        """Run a pkg command, logging its output. The command is
+		terminated if the transfer is cancelled. It's run again,
+		following the retry policy, while its exit status is one
+		of retryable. max_attempts and max_wait override the
+		limits of the policy.
+		Returns the exit status of the last attempt.
+		Raises TAbort if the transfer was cancelled.
+		"""
+        name = self.pkg_subcommand(cmd)
+
+        def attempt():
+            """Run the command once"""
+            self.cancel.check()
+            start = time.time()
+            status = exec_cmd_outputs_to_log(cmd, self._log_handler,
+                                             cancel=self.cancel)
+            self.metrics.command("pkg " + name, time.time() - start, status)
+            self.cancel.check()
+            return status
+
+        return self.retry.run(attempt, name, retryable, self.cancel,
+                              max_attempts, max_wait)
+
     def perform_ips_init(self):
         """Perform an IPS image-create call.
 		Raises TAbort if unable to create the IPS image
@@ -916,38 +2057,42 @@ class TransferIps(object):
         else: 
             retry_timeout = 0
 
-        while True:
-                try:
-                        status = exec_cmd_outputs_to_log(cmd.split(),
-                                             self._log_handler)
-                        if status == 0:
-                            break
-                        elif status == 1:
-                                logsvc.write_log(TRANSFER_ID,
-                                    "Unable to reach " + self._pkg_url + "\n")
-                                if retry_timeout > 0:
-                                    logsvc.write_log(TRANSFER_ID,
-                                        "Retrying in 10 seconds.\n")
-                                    time.sleep(10)
-                                    retry_timeout -= 10
-                                else:
-                                    raise TAbort("Giving up. Unable to "
-                                        "initialize the pkg image area at "
-                                        + self._init_mntpt, 
-                                        TM_E_IPS_INIT_FAILED)
-                        elif status:
-                            raise TAbort("Unable to "
-                                 "initialize the pkg image area at "
-                                 + self._init_mntpt,
-                                 TM_E_IPS_INIT_FAILED)
-                except OSError:
-                        raise TAbort("Unable to initialize the pkg "
-                            "image area at " + self._init_mntpt,
-                             TM_E_IPS_INIT_FAILED)
+        # With a retry timeout, an unreachable repository is retried
+        # for as long as the waits fit in it, whatever the number of
+        # attempts.
+        if retry_timeout > 0:
+            max_attempts = 0
+            max_wait = retry_timeout
+        else:
+            max_attempts = None
+            max_wait = None
+
+        try:
+            status = self.run_pkg(cmd.split(), RetryPolicy.RETRY_ERRORS,
+                                  max_attempts, max_wait)
+        except OSError:
+            raise TAbort("Unable to initialize the pkg "
+                         "image area at " + self._init_mntpt,
+                         TM_E_IPS_INIT_FAILED)
+        if status == TMDefs.PKG_EXIT_ERROR:
+            logsvc.write_log(TRANSFER_ID,
+                             "Unable to reach " + self._pkg_url + "\n")
+            raise TAbort("Giving up. Unable to "
+                         "initialize the pkg image area at "
+                         + self._init_mntpt, 
+                         TM_E_IPS_INIT_FAILED)
+        elif status:
+            raise TAbort("Unable to "
+                         "initialize the pkg image area at "
+                         + self._init_mntpt,
+                         TM_E_IPS_INIT_FAILED)
 
     def perform_ips_repo_contents_ver(self):
         """Verify the packages specified by the user are actually
 		contained in the repository they specify.
+		If TM_IPS_CATALOG_CACHE names a cache directory, packages
+		already found in the same catalogs by an earlier build
+		aren't looked up again.
 		Raises TAbort if unable to verify the IPS repository
 		"""
         # Verifying that needed packages are in the repository...
@@ -980,14 +2125,26 @@ class TransferIps(object):
 
         # For each package in our pkgs file, see if it's in the
         # IPS repository.
-        pkglist = ""
+        pkglist = []
         for line in pkgfile:
-            pkglist += " " + line.rstrip()
+            pkglist.extend(line.split())
         pkgfile.close()
-        cmd = TMDefs.PKG + " -R %s list %s -a %s" % \
-            (self._init_mntpt, self._verbose_mode, pkglist)
+
+        cache = None
+        if self._catalog_cache != "":
+            cache = CatalogCache(self._catalog_cache, self._init_mntpt)
+            pkglist = cache.unverified(pkglist)
+            if not pkglist:
+                logsvc.write_log(TRANSFER_ID, "All packages were found "
+                                 "in the catalog cache\n")
+                return
+
+        cmd = [TMDefs.PKG, "-R", self._init_mntpt, "list"]
+        if self._verbose_mode:
+            cmd.append(self._verbose_mode)
+        cmd.append("-a")
         try:
-            status = exec_cmd_outputs_to_log(cmd.split(), self._log_handler)
+            status = self.run_pkg(cmd + pkglist)
 
             if status:
                 raise TIPSPkgmissing(TM_E_IPS_PKG_MISSING)
@@ -996,6 +2153,15 @@ class TransferIps(object):
                          " the IPS repository",
                          TM_E_IPS_REPO_CONTENTS_VERIFY_FAILED)
 
+        if cache is not None:
+            try:
+                cache.add_verified(pkglist)
+            except (OSError, IOError) as err:
+                # The packages were verified, only the next build
+                # will be slower.
+                logsvc.write_log(TRANSFER_ID, "Unable to update the "
+                                 "catalog cache: " + str(err) + "\n")
+
 
     def perform_ips_set_prop(self):
         """Perform an IPS set-property of the property
@@ -1028,8 +2194,7 @@ class TransferIps(object):
             (self._init_mntpt, self._prop_name, self._prop_value)
 
         try:
-            status = exec_cmd_outputs_to_log(cmd.split(),
-                                             self._log_handler)
+            status = self.run_pkg(cmd.split())
             if status:
                 raise TAbort("Unable to set property", \
                              TM_E_IPS_SET_PROP_FAILED)
@@ -1082,9 +2247,14 @@ class TransferIps(object):
                 " -R %s set-publisher %s -O %s %s %s" % \
                 (self._init_mntpt, self._pref_flag, self._alt_url,
                  self._refresh_flag, self._alt_auth)
+
+        # Only a refresh talks to the repository
+        if self._refresh_flag == "":
+            retryable = RetryPolicy.RETRY_ERRORS
+        else:
+            retryable = RetryPolicy.RETRY_LOCKED
         try:
-            status = exec_cmd_outputs_to_log(cmd.split(),
-                                             self._log_handler)
+            status = self.run_pkg(cmd.split(), retryable)
             if status:
                 raise TAbort("Unable to set an additional " \
                              "publisher", TM_E_IPS_SET_AUTH_FAILED)
@@ -1093,6 +2263,96 @@ class TransferIps(object):
                          TM_E_IPS_SET_AUTH_FAILED)
 		
 
+    def perform_ips_set_publishers(self):
+        """Configure all the publishers, origins and mirrors listed
+		in the TM_IPS_PUBLISHER_SPEC file. Each publisher is set
+		with a single pkg set-publisher which doesn't refresh the
+		catalog. If TM_IPS_REFRESH_CATALOG=true, the catalogs of the
+		publishers that were set are then refreshed by a single
+		pkg refresh. Only when that fails is each publisher
+		refreshed on its own, to find out which ones failed.
+		The status of each publisher is logged, and written to
+		the TM_IPS_PUBLISHER_RESULTS file if one is specified.
+		Raises: TAbort if any publisher couldn't be set or refreshed.
+		"""
+
+        if self._publisher_spec == "":
+            raise TValueError("IPS publisher spec file not set",
+                              TM_E_INVALID_IPS_ACT_ATTR)
+
+        # Check that the init_mntpt really exists. If not, error.
+        try:
+            mst = os.lstat(self._init_mntpt)
+            if not st.S_ISDIR(mst.st_mode):
+                raise TValueError("Specified IPS image area "
+                                  "doesn't exist", 
+                                  TM_E_INVALID_IPS_ACT_ATTR)
+        except OSError:
+            raise TValueError("Specified IPS image area is "
+                              "inaccessible", TM_E_INVALID_IPS_ACT_ATTR)
+
+        try:
+            configs = read_publisher_spec(self._publisher_spec)
+        except (IOError, ValueError) as err:
+            raise TValueError("Unable to read the IPS publisher spec: " +
+                              str(err), TM_E_INVALID_IPS_ACT_ATTR)
+
+        results = []
+        for config in configs:
+            try:
+                status = self.run_pkg(config.command(TMDefs.PKG,
+                                                     self._init_mntpt))
+            except OSError:
+                status = -1
+            if status:
+                results.append((config.name, TM_E_IPS_SET_AUTH_FAILED))
+            else:
+                results.append((config.name, TM_E_SUCCESS))
+
+        refresh = [pub for pub, status in results if status == TM_E_SUCCESS]
+        if self._refresh_flag == "" and refresh:
+            cmd = [TMDefs.PKG, "-R", self._init_mntpt, "refresh"]
+            try:
+                status = self.run_pkg(cmd + refresh,
+                                      RetryPolicy.RETRY_ERRORS)
+            except OSError:
+                status = -1
+            if status:
+                for idx, (pub, status) in enumerate(results):
+                    if status != TM_E_SUCCESS:
+                        continue
+                    try:
+                        status = self.run_pkg(cmd + [pub])
+                    except OSError:
+                        status = -1
+                    if status:
+                        results[idx] = (pub, TM_E_IPS_REFRESH_FAILED)
+
+        failed = []
+        for pub, status in results:
+            if status == TM_E_SUCCESS:
+                logsvc.write_log(TRANSFER_ID,
+                                 "Publisher " + pub + " configured\n")
+            else:
+                if status == TM_E_IPS_REFRESH_FAILED:
+                    self.prerror("Unable to refresh publisher " + pub)
+                else:
+                    self.prerror("Unable to set publisher " + pub)
+                failed.append((pub, status))
+
+        if self._publisher_results != "":
+            try:
+                write_publisher_results(self._publisher_results, results)
+            except IOError:
+                raise TAbort("Unable to write the IPS publisher results "
+                             "to " + self._publisher_results,
+                             TM_E_IPS_SET_AUTH_FAILED)
+
+        if failed:
+            raise TAbort("Unable to configure publishers " +
+                         " ".join([pub for pub, status in failed]),
+                         failed[0][1])
+
     def perform_ips_refresh(self):
         """Perform an IPS refresh if the image area
 		Raises: TAbort if unable to refresh the IPS image 
@@ -1112,8 +2372,7 @@ class TransferIps(object):
 
         cmd = TMDefs.PKG + " -R %s refresh" % self._init_mntpt
         try:
-            status = exec_cmd_outputs_to_log(cmd.split(),
-                                             self._log_handler)
+            status = self.run_pkg(cmd.split(), RetryPolicy.RETRY_ERRORS)
             if status:
                 raise TAbort("Unable to refresh the IPS image",
                              TM_E_IPS_REFRESH_FAILED)
@@ -1146,8 +2405,7 @@ class TransferIps(object):
         cmd = TMDefs.PKG + " -R %s unset-publisher %s" % \
             (self._init_mntpt, self._alt_auth)
         try:
-            status = exec_cmd_outputs_to_log(cmd.split(),
-                                             self._log_handler)
+            status = self.run_pkg(cmd.split())
             if status:
                 raise TAbort("Unable to unset-publisher",
                              TM_E_IPS_UNSET_AUTH_FAILED)
@@ -1206,9 +2464,14 @@ class TransferIps(object):
             # Package list is passed in a file; read it all in, append to
             # command list and then execute one pkg operation for performance
             with open(self._pkgs_file, 'r') as pkgfile:
-                cmd.extend(pkgfile.read().splitlines())
-                
-            status = exec_cmd_outputs_to_log(cmd, self._log_handler)
+                pkgs = pkgfile.read().splitlines()
+
+            if action_str == "install" and self._install_batch:
+                self.install_batches(cmd, pkgs)
+                return
+            cmd.extend(pkgs)
+
+            status = self.run_pkg(cmd, RetryPolicy.RETRY_LOCKED)
             # pkg install/uninstall returns
             # PKG_EXIT_SUCCESS: install/uninstall was successful
             # PKG_EXIT_NOP: nothing to do, desired state already exists
@@ -1230,6 +2493,52 @@ class TransferIps(object):
             raise TAbort("Failed executing %s" % ((" ".join(cmd))),
                         TM_E_IPS_RETRIEVE_FAILED)
 
+    def install_batches(self, cmd, pkgs):
+        """Install the packages pkgs in batches of TM_IPS_INSTALL_BATCH
+		packages, running the pkg install command cmd once per
+		batch. The batches that finished are recorded in a state
+		file in the image, and skipped when the same install is
+		run again after a failure.
+		Raises: TIPSPkgmissing if a batch fails to install.
+		"""
+        batches = split_batches(pkgs, self._install_batch)
+        state = BatchState(self._init_mntpt, batches)
+        first = state.load()
+        if first:
+            logsvc.write_log(TRANSFER_ID, "Resuming the install at batch "
+                             "%d of %d\n" % (first + 1, len(batches)))
+
+        for idx in range(first, len(batches)):
+            if idx in state.done:
+                continue
+            start = time.time()
+            status = self.run_pkg(cmd + batches[idx],
+                                  RetryPolicy.RETRY_LOCKED)
+            seconds = time.time() - start
+            if status not in [TMDefs.PKG_EXIT_SUCCESS,
+                              TMDefs.PKG_EXIT_NOP]:
+                err_str = "Failed installing batch %d of %d: %s" % \
+                    (idx + 1, len(batches), " ".join(batches[idx]))
+                if self._log_handler is not None:
+                    self._log_handler.error(err_str)
+                else:
+                    logsvc.write_dbg(TRANSFER_ID, logsvc.LS_DBGLVL_ERR,
+                                     err_str + "\n")
+                raise TIPSPkgmissing(TM_E_IPS_PKG_MISSING)
+
+            logsvc.write_log(TRANSFER_ID, "Installed batch %d of %d "
+                             "(%d packages) in %.1f seconds\n" %
+                             (idx + 1, len(batches), len(batches[idx]),
+                              seconds))
+            try:
+                state.finish(idx, seconds)
+            except (IOError, OSError) as err:
+                # Only resuming after a failure is lost
+                logsvc.write_dbg(TRANSFER_ID, logsvc.LS_DBGLVL_ERR,
+                                 "Unable to record the install progress: "
+                                 "%s\n" % err)
+        state.remove()
+
     def perform_ips_purge_hist(self):
         """Perform an IPS pkg purge-history.
 		Raises: TAbort if unable to purge the history.
@@ -1249,8 +2558,7 @@ class TransferIps(object):
         cmd = TMDefs.PKG + " -R %s purge-history" % \
             (self._init_mntpt)
         try:
-            status = exec_cmd_outputs_to_log(cmd.split(),
-                                             self._log_handler)
+            status = self.run_pkg(cmd.split())
             if status:
                 raise TAbort("Unable to pkg purge-history "
                              " the IPS image at " + self._init_mntpt)
@@ -1263,7 +2571,8 @@ class TransferIps(object):
         """Perform a transfer using IPS.
 		Input: args - specifies what IPS action to
 		    perform, init, contents verify, retrieve/install,
-		    set-publisher, refresh, or unset-publisher.
+		    set-publisher, refresh, unset-publisher, or the
+		    configuration of a set of publishers.
 		Raises: TAbort
 		"""	
 
@@ -1305,7 +2614,8 @@ class TransferIps(object):
                     self._no_index_flag = "--no-index"
             elif opt == TM_IPS_REFRESH_CATALOG:
                 # This is only used for set-publisher
-                if (self._action != TM_IPS_SET_AUTH):
+                if self._action not in (TM_IPS_SET_AUTH,
+                                        TM_IPS_SET_PUBLISHERS):
                     raise TValueError("Attribute "
                                       + str(opt) + "is only used " \
                                       "for set-publisher",
@@ -1328,6 +2638,26 @@ class TransferIps(object):
                                       " can be specified per call.",
                                       TM_E_INVALID_IPS_ACT_ATTR)
                 self._prop_value = val
+            elif opt == TM_IPS_PUBLISHER_SPEC:
+                self._publisher_spec = val
+            elif opt == TM_IPS_PUBLISHER_RESULTS:
+                self._publisher_results = val
+            elif opt == TM_IPS_CATALOG_CACHE:
+                self._catalog_cache = val
+            elif opt == TM_IPS_RETRY_ATTEMPTS:
+                self._retry_attempts = val
+            elif opt == TM_IPS_RETRY_LOG:
+                self._retry_log = val
+            elif opt == TM_IPS_INSTALL_BATCH:
+                try:
+                    self._install_batch = int(val)
+                    if self._install_batch < 0:
+                        raise ValueError
+                except ValueError:
+                    raise TValueError("Invalid TM_IPS_INSTALL_BATCH " +
+                                      val, TM_E_INVALID_IPS_ACT_ATTR)
+            elif opt == TM_METRICS_FILE:
+                self.metrics_file = val
             elif opt == TM_PYTHON_LOG_HANDLER:
                 self._log_handler = val
             elif opt == "dbgflag":
@@ -1344,79 +2674,150 @@ class TransferIps(object):
             raise TValueError("Image mountpoint not set",
                               TM_E_INVALID_IPS_ACT_ATTR)
 
+        max_attempts = None
+        if self._retry_attempts != "":
+            try:
+                max_attempts = int(self._retry_attempts)
+                if max_attempts < 1:
+                    raise ValueError
+            except ValueError:
+                raise TValueError("Invalid TM_IPS_RETRY_ATTEMPTS " +
+                                  self._retry_attempts,
+                                  TM_E_INVALID_IPS_ACT_ATTR)
+        self.retry = RetryPolicy(max_attempts=max_attempts,
+                                 log_file=self._retry_log)
+
         if self._action == "":
             raise TValueError("TM_IPS_ACTION not set",
                               TM_E_INVALID_IPS_ACT_ATTR)
-        elif self._action == TM_IPS_INIT:
-            self.perform_ips_init()
-        elif self._action == TM_IPS_REPO_CONTENTS_VERIFY:
-            self.perform_ips_repo_contents_ver()
-        elif self._action == TM_IPS_RETRIEVE:
-            self.perform_ips_pkg_op("install")
-        elif self._action == TM_IPS_SET_AUTH:
-            self.perform_ips_set_auth()
-        elif self._action == TM_IPS_REFRESH:
-            self.perform_ips_refresh()
-        elif self._action == TM_IPS_UNSET_AUTH:
-            self.perform_ips_unset_auth()
-        elif self._action == TM_IPS_PURGE_HIST:
-            self.perform_ips_purge_hist()
-        elif self._action == TM_IPS_UNINSTALL:
-            self.perform_ips_pkg_op("uninstall")
-        elif self._action == TM_IPS_SET_PROP:
-            self.perform_ips_set_prop()
-        else:
-            raise TValueError("Invalid TM_IPS_ACTION",
-                              TM_E_INVALID_IPS_ACT_ATTR)
 
-def tm_perform_transfer(args, callback=None):
-    """Transfer data via cpio or IPS from a specified source to
-	destination. The cpio transfer can be either an entire directory
-	or a list of files. The IPS functionality that is supported is
-	image-create, content verification, set-publisher, refresh,
-	unset-publisher, and retrieval.
-	Arguments: nvlist specifying the transfer characteristics
-		callback function for logging.
-	Returns: TM_E_SUCCESS
-		 TM_E_IPS_PKG_MISSING
-		 TM_E_IPS_RETRIEVE_FAILED
-		 TM_E_IPS_SET_AUTH_FAILED
-		 TM_E_IPS_UNSET_AUTH_FAILED
-		 TM_E_IPS_REFRESH_FAILED
-		 TM_E_IPS_REPO_CONTENTS_VERIFY_FAILED
-		 TM_E_IPS_INIT_FAILED
-		 TM_E_INVALID_CPIO_ACT_ATTR
-		 TM_E_INVALID_CPIO_FILELIST_ATTR
+        with self.metrics.stage(IPS_ACTION_NAMES.get(self._action,
+                                                     "ips")):
+            if self._action == TM_IPS_INIT:
+                self.perform_ips_init()
+            elif self._action == TM_IPS_REPO_CONTENTS_VERIFY:
+                self.perform_ips_repo_contents_ver()
+            elif self._action == TM_IPS_RETRIEVE:
+                self.perform_ips_pkg_op("install")
+            elif self._action == TM_IPS_SET_AUTH:
+                self.perform_ips_set_auth()
+            elif self._action == TM_IPS_REFRESH:
+                self.perform_ips_refresh()
+            elif self._action == TM_IPS_UNSET_AUTH:
+                self.perform_ips_unset_auth()
+            elif self._action == TM_IPS_PURGE_HIST:
+                self.perform_ips_purge_hist()
+            elif self._action == TM_IPS_UNINSTALL:
+                self.perform_ips_pkg_op("uninstall")
+            elif self._action == TM_IPS_SET_PROP:
+                self.perform_ips_set_prop()
+            elif self._action == TM_IPS_SET_PUBLISHERS:
+                self.perform_ips_set_publishers()
+            else:
+                raise TValueError("Invalid TM_IPS_ACTION",
+                                  TM_E_INVALID_IPS_ACT_ATTR)
+
+class TransferSession(object):
+    """State kept across a series of transfers.
+
+	tm_perform_transfer() runs each transfer on its own. A session
+	runs the transfers given to perform() one after the other and
+	keeps what they learned about their source for the next ones:
+	the scans of the source trees, along with the directory handles
+	used to check that the trees didn't change (see ScanCache). A
+	TM_CPIO_ENTIRE transfer from a tree scanned earlier in the
+	session doesn't read its directories again, and a TM_CPIO_LIST
+	transfer gets the inode numbers used to sort its list from the
+	scan instead of stat'ing every file.
+	The metrics of every transfer are kept in the metrics list and
+	added to its metrics file, TM_METRICS_FILE or the one next to
+	the install log (see transfer_metrics).
+	The session must be closed once done with, which is done on
+	exit when it's used as a context manager.
+	Arguments: callback and cancel, as for tm_perform_transfer(),
+		used for every transfer of the session.
+		keep_scans - when False, nothing is kept, which saves
+		    holding the scans in memory for a single transfer.
 	"""
 
-    # lock, so there isn't more than 1 transfer running at a time
-    PARAMS.tm_lock = threading.Lock()
+    def __init__(self, callback=None, cancel=None, keep_scans=True):
+        self.callback = callback
+        self.cancel = cancel
+        # TransferMetrics of each transfer performed
+        self.metrics = []
+        self.scan_cache = None
+        if keep_scans:
+            self.scan_cache = ScanCache()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.close()
+
+    def close(self):
+        """Forget the kept scans and close the directory handles"""
+        if self.scan_cache is not None:
+            self.scan_cache.close()
+
+    def perform(self, args):
+        """Perform the transfer described by args, as
+		tm_perform_transfer() does.
+		Returns: the return codes of tm_perform_transfer()
+		"""
 
-    try:
-        PARAMS.tm_lock.acquire()
+        # lock, so there isn't more than 1 transfer running at a time
+        with PARAMS.tm_lock:
+            return self.perform_locked(args)
 
+    def perform_all(self, args_list):
+        """Perform the transfers of args_list one after the other, as
+		one pipeline: no other transfer runs in between, and the
+		transfers after one which failed aren't performed.
+		Returns: TM_E_SUCCESS if every transfer succeeded, the
+		return code of the one which failed otherwise.
+		"""
+        with PARAMS.tm_lock:
+            for args in args_list:
+                retval = self.perform_locked(args)
+                if retval != TM_E_SUCCESS:
+                    return retval
+        return TM_E_SUCCESS
+
+    def perform_locked(self, args):
+        """Body of perform(), called with PARAMS.tm_lock held"""
         retval = TM_E_SUCCESS
 
         # If the callback is specified, set the python
         # callback function in the associated transfer mod
         # C code.
-        tmod.set_py_callback(callback)
+        tmod.set_py_callback(self.callback)
 
         action = ""
+        name = None
         for opt, val in args:
             if opt == TM_ATTR_MECHANISM:
                 action = val
-                break
+            elif opt == TM_CPIO_ACTION:
+                name = CPIO_ACTION_NAMES.get(val)
+            elif opt == TM_IPS_ACTION:
+                name = IPS_ACTION_NAMES.get(val)
 
         if action == TM_PERFORM_IPS:
             tobj = TransferIps()
         elif action == TM_PERFORM_CPIO:
             tobj = TransferCpio()
+            tobj.scan_cache = self.scan_cache
         else:
-            if PARAMS.tm_lock.locked():
-                PARAMS.tm_lock.release()
             retval = TM_E_INVALID_TRANSFER_TYPE_ATTR
             return retval
+        tobj.metrics = TransferMetrics(tobj.metrics.mechanism, name)
+
+        cancel = self.cancel
+        if cancel is None:
+            cancel = CancelToken()
+        tobj.cancel = cancel
+        PARAMS.cancel = cancel
 
         try:
             tobj.perform_transfer(args)
@@ -1440,11 +2841,54 @@ def tm_perform_transfer(args, callback=None):
             tobj.prerror(traceback.format_exc())
             retval = TM_E_PYTHON_ERROR
 
-    finally:
-        if PARAMS.tm_lock.locked():
-            PARAMS.tm_lock.release()
+        finally:
+            PARAMS.cancel = None
+
+        self.record_metrics(tobj, retval)
+        return retval
+
+    def record_metrics(self, tobj, retval):
+        """Add the metrics of the transfer tobj, which returned
+		retval, to its metrics file. Failing to write them doesn't
+		fail the transfer.
+		"""
+        tobj.metrics.finish(retval)
+        self.metrics.append(tobj.metrics)
+        name = tobj.metrics_name()
+        try:
+            write_metrics(name, tobj.metrics)
+        except (IOError, OSError) as err:
+            logsvc.write_dbg(TRANSFER_ID, logsvc.LS_DBGLVL_INFO,
+                             "Unable to write the transfer metrics to " +
+                             name + ": " + str(err) + "\n")
 
-    return retval
+def tm_perform_transfer(args, callback=None, cancel=None):
+    """Transfer data via cpio or IPS from a specified source to
+	destination. The cpio transfer can be either an entire directory
+	or a list of files. The IPS functionality that is supported is
+	image-create, content verification, set-publisher, refresh,
+	unset-publisher, and retrieval.
+	Use a TransferSession to run several transfers which share
+	their source.
+	Arguments: nvlist specifying the transfer characteristics
+		callback function for logging.
+		cancel - CancelToken the caller can use to stop the
+		    transfer. tm_abort_transfer() cancels the token of
+		    the running transfer, one is created if none is given.
+	Returns: TM_E_SUCCESS
+		 TM_E_IPS_PKG_MISSING
+		 TM_E_IPS_RETRIEVE_FAILED
+		 TM_E_IPS_SET_AUTH_FAILED
+		 TM_E_IPS_UNSET_AUTH_FAILED
+		 TM_E_IPS_REFRESH_FAILED
+		 TM_E_IPS_REPO_CONTENTS_VERIFY_FAILED
+		 TM_E_IPS_INIT_FAILED
+		 TM_E_INVALID_CPIO_ACT_ATTR
+		 TM_E_INVALID_CPIO_FILELIST_ATTR
+		 errno.EINTR if the transfer was cancelled
+	"""
+    with TransferSession(callback, cancel, keep_scans=False) as session:
+        return session.perform(args)
 
 # global parameters 
 PARAMS = TMDefs()
@@ -0,0 +1,211 @@
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+# Copyright (c) 2010, Oracle and/or its affiliates. All rights reserved.
+#
+""" Transfer plans for the Slim Install Transfer Module
+
+    A plan describes what a cpio transfer would copy without copying it:
+    the number of files and bytes, the cost of each prefix, the largest
+    directories, and an estimate of the copy time based on the throughput
+    measured by copying a small sample of the files.  Plans are written
+    as JSON, so they can be read back to size targets and report real
+    progress, or kept to compare images over time.
+    """
+import heapq
+import json
+import os
+import shutil
+import stat as st
+import tempfile
+import time
+
+from osol_install.transfer_copy import CopyEngine
+
+# Version of the plan format
+PLAN_VERSION = 1
+
+# Number of directories listed as the largest ones
+LARGEST_DIRS = 20
+
+# Maximum number of bytes, and of files, copied to measure the throughput
+SAMPLE_BYTES = 32 * 1024 * 1024
+SAMPLE_FILES = 2000
+
+
+class PlanPrefix(object):
+    """Counters of one source prefix of a plan"""
+    def __init__(self, path):
+        self.path = path
+        self.files = 0
+        self.dirs = 0
+        self.nbytes = 0
+
+    def to_dict(self, plan):
+        """Return the counters as a dictionary for the JSON plan"""
+        return {"path": self.path,
+                "files": self.files,
+                "directories": self.dirs,
+                "bytes": self.nbytes,
+                "estimated_seconds": plan.estimate(self.nbytes)}
+
+
+class TransferPlan(object):
+    """Accumulate the pathnames a transfer would copy.
+
+       start_prefix() starts counting a new source prefix, add() accounts
+       for one pathname of it.  The first regular files found, up to
+       SAMPLE_BYTES and SAMPLE_FILES, are kept as the sample copied by
+       measure() to estimate the copy time.
+       """
+
+    def __init__(self, source):
+        self.source = source
+        self.prefixes = []
+        self.sample = []
+        self.sample_bytes = 0
+        self.throughput = 0.0
+        self.measured_bytes = 0
+        self.measured_seconds = 0.0
+        # Bytes and files held directly by each directory
+        self._dir_sizes = {}
+        self._current = None
+
+    def start_prefix(self, path):
+        """Start counting the pathnames found under path"""
+        self._current = PlanPrefix(path)
+        self.prefixes.append(self._current)
+
+    def add(self, path, ftype, size):
+        """Account for the pathname path, of file type ftype (as
+           returned by stat.S_IFMT()) and size bytes.
+           """
+        prefix = self._current
+        if st.S_ISDIR(ftype):
+            prefix.dirs += 1
+            return
+        prefix.files += 1
+        prefix.nbytes += size
+        parent = os.path.dirname(path)
+        counts = self._dir_sizes.get(parent)
+        if counts is None:
+            counts = self._dir_sizes[parent] = [0, 0]
+        counts[0] += size
+        counts[1] += 1
+        if st.S_ISREG(ftype) and size and \
+            len(self.sample) < SAMPLE_FILES and \
+            self.sample_bytes + size <= SAMPLE_BYTES:
+            self.sample.append(path)
+            self.sample_bytes += size
+
+    @property
+    def files(self):
+        """Total number of files, directories excluded"""
+        return sum([prefix.files for prefix in self.prefixes])
+
+    @property
+    def dirs(self):
+        """Total number of directories"""
+        return sum([prefix.dirs for prefix in self.prefixes])
+
+    @property
+    def nbytes(self):
+        """Total number of bytes"""
+        return sum([prefix.nbytes for prefix in self.prefixes])
+
+    def measure(self, dst_dir):
+        """Copy the sample files into a scratch directory created in
+           dst_dir, and record the throughput.  The data is synced so
+           the time includes writing it out.
+           """
+        scratch = tempfile.mkdtemp(prefix=".tm_plan", dir=dst_dir)
+        engine = CopyEngine(scratch, 1)
+        try:
+            start = time.time()
+            nbytes = 0
+            for i, src in enumerate(self.sample):
+                dst = os.path.join(scratch, str(i))
+                try:
+                    nbytes += engine.copy_file(src, dst, os.lstat(src))
+                except (OSError, IOError):
+                    continue
+                dst_fd = os.open(dst, os.O_RDONLY)
+                try:
+                    os.fsync(dst_fd)
+                finally:
+                    os.close(dst_fd)
+            self.measured_seconds = time.time() - start
+            self.measured_bytes = nbytes
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+        if self.measured_seconds > 0 and nbytes:
+            self.throughput = nbytes / self.measured_seconds
+
+    def estimate(self, nbytes):
+        """Return the estimated number of seconds needed to copy
+           nbytes, None if the throughput wasn't measured.
+           """
+        if not self.throughput:
+            return None
+        return round(nbytes / self.throughput, 1)
+
+    def largest_dirs(self):
+        """Return the LARGEST_DIRS directories holding the most bytes
+           directly, as (path, bytes, files) tuples.
+           """
+        largest = heapq.nlargest(LARGEST_DIRS, self._dir_sizes.items(),
+                                 key=lambda item: (item[1][0], item[0]))
+        return [(path, counts[0], counts[1]) for path, counts in largest]
+
+    def to_dict(self):
+        """Return the plan as a dictionary for the JSON plan"""
+        return {"version": PLAN_VERSION,
+                "source": self.source,
+                "files": self.files,
+                "directories": self.dirs,
+                "bytes": self.nbytes,
+                "prefixes": [prefix.to_dict(self)
+                             for prefix in self.prefixes],
+                "largest_directories": [{"path": path, "bytes": nbytes,
+                                         "files": files}
+                                        for path, nbytes, files in
+                                        self.largest_dirs()],
+                "throughput": {"bytes": self.measured_bytes,
+                               "seconds": round(self.measured_seconds, 3),
+                               "bytes_per_second": int(self.throughput)},
+                "estimated_seconds": self.estimate(self.nbytes)}
+
+    def write(self, name):
+        """Write the plan as JSON to the file name"""
+        with open(name, 'w') as handle:
+            json.dump(self.to_dict(), handle, indent=1, sort_keys=True)
+            handle.write("\n")
+
+
+def read_plan(name):
+    """Read a plan written by TransferPlan.write().  Returns it as a
+       dictionary.  Raises IOError or ValueError if the file can't be
+       read or isn't a plan of a known version.
+       """
+    with open(name, 'r') as handle:
+        plan = json.load(handle)
+    if not isinstance(plan, dict) or plan.get("version") != PLAN_VERSION:
+        raise ValueError("Unknown transfer plan version in " + name)
+    return plan
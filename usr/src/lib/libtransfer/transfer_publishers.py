@@ -0,0 +1,150 @@
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+# Copyright (c) 2010, Oracle and/or its affiliates. All rights reserved.
+#
+""" Publisher configuration for the Slim Install Transfer Module
+
+    The TM_IPS_SET_PUBLISHERS action configures every publisher of an
+    image in one call.  The publishers are described by a spec file,
+    one setting per line:
+        <publisher> origin <url>
+        <publisher> mirror <url>
+        <publisher> unset-mirror <url>
+        <publisher> preferred
+    Blank lines and lines starting with # are ignored.  All the settings
+    of a publisher are applied by a single pkg set-publisher.
+
+    The result of each publisher is written to a results file, one line
+    per publisher, in the order of the spec file:
+        <publisher> <tm_errno_t value>
+    """
+from osol_install.transfer_defs import TM_IPS_PREFERRED_AUTH, \
+    TM_IPS_SET_MIRROR, TM_IPS_UNSET_MIRROR
+
+# Keywords of the spec file
+PUB_ORIGIN = "origin"
+PUB_MIRROR = "mirror"
+PUB_UNSET_MIRROR = "unset-mirror"
+PUB_PREFERRED = "preferred"
+
+
+class PublisherConfig(object):
+    """Settings of one publisher of a spec file"""
+
+    def __init__(self, name):
+        self.name = name
+        self.origins = []
+        self.mirrors = []
+        self.unset_mirrors = []
+        self.preferred = False
+
+    def command(self, pkg, mntpt):
+        """Return the pkg set-publisher command applying the settings
+           to the image at mntpt.  Catalogs are never refreshed by it.
+           """
+        cmd = [pkg, "-R", mntpt, "set-publisher", "--no-refresh"]
+        if self.preferred:
+            cmd.append(TM_IPS_PREFERRED_AUTH)
+        # -O replaces the origins, as TM_IPS_SET_AUTH does.  It can't
+        # be combined with -g, which is used to set several of them.
+        if len(self.origins) == 1:
+            cmd.extend(["-O", self.origins[0]])
+        else:
+            for url in self.origins:
+                cmd.extend(["-g", url])
+        for url in self.unset_mirrors:
+            cmd.extend([TM_IPS_UNSET_MIRROR, url])
+        for url in self.mirrors:
+            cmd.extend([TM_IPS_SET_MIRROR, url])
+        cmd.append(self.name)
+        return cmd
+
+
+def read_publisher_spec(name):
+    """Read a publisher spec file.  Returns the list of PublisherConfig,
+       in the order the publishers first appear in the file.
+       Raises IOError if the file can't be read, ValueError if it is
+       badly formatted.
+       """
+    configs = []
+    by_name = {}
+    with open(name, 'r') as handle:
+        for lineno, line in enumerate(handle, 1):
+            fields = line.split()
+            if not fields or fields[0].startswith("#"):
+                continue
+            if len(fields) == 2 and fields[1] == PUB_PREFERRED:
+                url = None
+            elif len(fields) == 3 and fields[1] in (PUB_ORIGIN, PUB_MIRROR,
+                                                    PUB_UNSET_MIRROR):
+                url = fields[2]
+            else:
+                raise ValueError("%s:%d: invalid publisher setting" %
+                                 (name, lineno))
+            config = by_name.get(fields[0])
+            if config is None:
+                config = by_name[fields[0]] = PublisherConfig(fields[0])
+                configs.append(config)
+            if fields[1] == PUB_PREFERRED:
+                config.preferred = True
+            elif fields[1] == PUB_ORIGIN:
+                config.origins.append(url)
+            elif fields[1] == PUB_MIRROR:
+                config.mirrors.append(url)
+            else:
+                config.unset_mirrors.append(url)
+
+    if len([config for config in configs if config.preferred]) > 1:
+        raise ValueError(name + ": more than one preferred publisher")
+    return configs
+
+
+def write_publisher_spec(name, settings):
+    """Write a publisher spec file from an iterable of
+       (publisher, keyword, url) tuples, url being None for
+       PUB_PREFERRED.
+       """
+    with open(name, 'w') as handle:
+        for pub, keyword, url in settings:
+            if url is None:
+                handle.write("%s %s\n" % (pub, keyword))
+            else:
+                handle.write("%s %s %s\n" % (pub, keyword, url))
+
+
+def write_publisher_results(name, results):
+    """Write the (publisher, status) pairs of results to the file name"""
+    with open(name, 'w') as handle:
+        for pub, status in results:
+            handle.write("%s %d\n" % (pub, status))
+
+
+def read_publisher_results(name):
+    """Read a results file written by TM_IPS_SET_PUBLISHERS.  Returns
+       a list of (publisher, status) pairs.
+       Raises IOError if the file can't be read.
+       """
+    results = []
+    with open(name, 'r') as handle:
+        for line in handle:
+            pub, status = line.split()
+            results.append((pub, int(status)))
+    return results
@@ -0,0 +1,198 @@
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+# Copyright (c) 2010, Oracle and/or its affiliates. All rights reserved.
+#
+""" Source scan cache for the Slim Install Transfer Module
+
+    A transfer session runs several transfers from the same source
+    trees.  The scan of a tree made by one transfer is kept, so the next
+    transfers from that tree don't read every directory of it again.
+
+    A kept scan is only used while the tree still holds what was
+    scanned.  The top directory must still be the one scanned, which is
+    checked against a handle kept open on it, and no directory of the
+    tree may have been modified since, which is checked against the
+    modification time of each directory recorded by the scan.  Adding,
+    removing or renaming an entry modifies its directory.  Stat'ing the
+    directories of a tree costs a fraction of reading them all.
+    """
+import os
+
+from osol_install.install_utils import WalkEntry, walk_tree
+
+# Maximum number of entries kept by a cache.  A scan which doesn't fit
+# in what is left isn't kept.
+MAX_ENTRIES = 1000000
+
+
+class TreeScan(object):
+    """Entries found by the complete scan of the tree under top.
+
+       Entries are kept as (path, name, ino, ftype, dev, mtime) tuples,
+       which take much less memory than WalkEntry objects.  Sizes and
+       modes are not kept.  top_fd is a handle open on top since before
+       the scan.
+       """
+
+    def __init__(self, top, top_fd, top_stat, entries):
+        self.top = top
+        self.top_fd = top_fd
+        self.top_stat = top_stat
+        self.entries = entries
+        self._inodes = None
+
+    def is_current(self):
+        """Return True if the tree wasn't modified since the scan"""
+        try:
+            held = os.fstat(self.top_fd)
+            now = os.stat(self.top)
+        except OSError:
+            return False
+        if (now.st_dev, now.st_ino) != (held.st_dev, held.st_ino) or \
+            held.st_mtime_ns != self.top_stat.st_mtime_ns:
+            return False
+        for path, name, ino, ftype, dev, mtime in self.entries:
+            if mtime is None:
+                continue
+            try:
+                if os.lstat(path).st_mtime_ns != mtime:
+                    return False
+            except OSError:
+                return False
+        return True
+
+    def walk(self):
+        """Generate the WalkEntry objects of the scan, in scan order"""
+        for path, name, ino, ftype, dev, mtime in self.entries:
+            yield WalkEntry(path, name, ino, ftype, dev=dev, mtime=mtime)
+
+    def inodes(self):
+        """Return a dictionary of the inode number of each entry, by
+           pathname relative to top and normalized.
+           """
+        if self._inodes is None:
+            skip = len(os.path.normpath(self.top)) + 1
+            self._inodes = dict([(os.path.normpath(path)[skip:], ino)
+                                 for path, name, ino, ftype, dev, mtime in
+                                 self.entries])
+        return self._inodes
+
+    def close(self):
+        """Close the handle on top"""
+        if self.top_fd is not None:
+            os.close(self.top_fd)
+            self.top_fd = None
+
+
+class ScanCache(object):
+    """Scans of the source trees of the transfers of a session.
+
+       walk() is used in place of walk_tree(top, same_fs=True).  A scan
+       is kept once it went through the whole tree without errors, as
+       long as the cache holds less than max_entries entries.  Each kept
+       scan holds a directory handle until the cache is closed.
+       """
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._scans = {}
+        self._nentries = 0
+
+    def walk(self, top, onerror=None):
+        """Generate the WalkEntry objects of the tree under top, as
+           walk_tree(top, same_fs=True, onerror=onerror) does.  They
+           come from the kept scan of top if it is still current.
+           Raises OSError if top can't be opened.
+           """
+        scan = self._scans.get(top)
+        if scan is not None:
+            if scan.is_current():
+                self.hits += 1
+                for entry in scan.walk():
+                    yield entry
+                return
+            self.forget(top)
+        self.misses += 1
+
+        # The scan of a tree with unreadable entries is incomplete
+        errors = []
+
+        def scan_error(err):
+            """Record the error and report it"""
+            errors.append(err)
+            if onerror is not None:
+                onerror(err)
+
+        top_fd = os.open(top, os.O_RDONLY)
+        kept = False
+        try:
+            top_stat = os.fstat(top_fd)
+            room = self.max_entries - self._nentries
+            entries = []
+            for entry in walk_tree(top, same_fs=True, onerror=scan_error):
+                if entries is not None:
+                    if len(entries) == room:
+                        entries = None
+                    else:
+                        entries.append((entry.path, entry.name, entry.ino,
+                                        entry.ftype, entry.dev,
+                                        entry.mtime))
+                yield entry
+            if entries is not None and not errors:
+                self._scans[top] = TreeScan(top, top_fd, top_stat, entries)
+                self._nentries += len(entries)
+                kept = True
+        finally:
+            if not kept:
+                os.close(top_fd)
+
+    def inodes(self, top):
+        """Return the dictionary of inode numbers, by normalized
+           pathname relative to top, of the kept scan of top if it is
+           still current.  Returns None if there is none.
+           """
+        top = os.path.normpath(top)
+        for scan in list(self._scans.values()):
+            if os.path.normpath(scan.top) != top:
+                continue
+            if scan.is_current():
+                self.hits += 1
+                return scan.inodes()
+            self.forget(scan.top)
+        return None
+
+    def forget(self, top=None):
+        """Drop the kept scan of top, every kept scan if top is None"""
+        if top is None:
+            tops = list(self._scans.keys())
+        else:
+            tops = [top]
+        for name in tops:
+            scan = self._scans.pop(name, None)
+            if scan is not None:
+                self._nentries -= len(scan.entries)
+                scan.close()
+
+    def close(self):
+        """Drop every kept scan and close the directory handles"""
+        self.forget()
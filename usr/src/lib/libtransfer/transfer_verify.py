@@ -0,0 +1,228 @@
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+# Copyright (c) 2010, Oracle and/or its affiliates. All rights reserved.
+#
+""" Checksums of transferred files for the Slim Install Transfer Module
+
+    The native copy engine can hash the data of each regular file while
+    it copies it, as the data goes through its buffers anyway.  The
+    checksums are saved in a checksum manifest, and a later verification
+    only has to read the destination back once and compare.
+    """
+import errno
+import hashlib
+import os
+import queue
+import threading
+
+# Version of the checksum manifest format, part of the header line
+CHECKSUM_VERSION = "1"
+
+# hashlib algorithm of the checksums
+CHECKSUM_ALGORITHM = "sha256"
+
+# Size of the reads of the verification
+READ_SIZE = 1024 * 1024
+
+# Maximum number of files queued up in front of the verification threads
+QUEUE_DEPTH = 4096
+
+# Zeroes standing for the holes of sparse files
+ZEROES = bytes(READ_SIZE)
+
+
+def new_digest():
+    """Return a new hash object for a checksum"""
+    return hashlib.new(CHECKSUM_ALGORITHM)
+
+
+def hash_zeroes(digest, count):
+    """Add count zero bytes, a hole of a sparse file, to digest"""
+    while count > 0:
+        chunk = min(count, len(ZEROES))
+        digest.update(memoryview(ZEROES)[:chunk])
+        count -= chunk
+
+
+def file_checksum(path):
+    """Return the checksum of the contents of path, as a hex string,
+       and the number of bytes read.
+       """
+    digest = new_digest()
+    nbytes = 0
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        while True:
+            data = os.read(fd, READ_SIZE)
+            if not data:
+                break
+            digest.update(data)
+            nbytes += len(data)
+    finally:
+        os.close(fd)
+    return digest.hexdigest(), nbytes
+
+
+class ChecksumManifest(object):
+    """Checksums of the regular files of a destination directory.
+
+       The manifest is a text file.  The header line names the format
+       version and the hash algorithm.  Each other line gives the
+       checksum and the size of a file, followed by its pathname
+       relative to the destination:
+           <checksum> <size> <path>
+       The manifest is written to a temporary file which then replaces
+       the existing one.
+       """
+
+    def __init__(self, name):
+        self.name = name
+
+    @staticmethod
+    def header():
+        """Return the header line of checksum manifests"""
+        return "# transfer checksums %s %s\n" % (CHECKSUM_VERSION,
+                                                 CHECKSUM_ALGORITHM)
+
+    def write(self, checksums):
+        """Write the manifest of checksums, a dictionary of
+           (checksum, size) by pathname.  Raises IOError or OSError if
+           the manifest can't be written.
+           """
+        handle = open(self.name + ".new", 'w', errors="surrogateescape")
+        with handle:
+            handle.write(self.header())
+            for path in sorted(checksums):
+                checksum, size = checksums[path]
+                handle.write("%s %d %s\n" % (checksum, size, path))
+        os.rename(self.name + ".new", self.name)
+
+    def entries(self):
+        """Generate the (path, checksum, size) records of the manifest.
+           Raises IOError if it can't be read, ValueError if it isn't a
+           checksum manifest of a known version.
+           """
+        with open(self.name, 'r', errors="surrogateescape") as handle:
+            if handle.readline() != self.header():
+                raise ValueError("Unknown checksum manifest format in " +
+                                 self.name)
+            for line in handle:
+                checksum, size, path = line[:-1].split(" ", 2)
+                yield (path, checksum, int(size))
+
+
+class VerifyStats(object):
+    """Counters of a verification"""
+    def __init__(self):
+        self.checked = 0
+        self.nbytes = 0
+        self.mismatched = 0
+        self.missing = 0
+        self.failed = 0
+
+    def add(self, other):
+        """Add the counters of other to these"""
+        self.checked += other.checked
+        self.nbytes += other.nbytes
+        self.mismatched += other.mismatched
+        self.missing += other.missing
+        self.failed += other.failed
+
+    def ok(self):
+        """Return True if every file matched its checksum"""
+        return not (self.mismatched or self.missing or self.failed)
+
+    def __str__(self):
+        return "%d files checked, %.1f MB, %d mismatched, %d missing, " \
+            "%d failed" % (self.checked, self.nbytes / 1048576.0,
+                           self.mismatched, self.missing, self.failed)
+
+
+def _verify_entry(root, entry, stats, err_msg):
+    """Check one (path, checksum, size) record against the file under
+       root.  Returns the number of bytes read.
+       """
+    path, checksum, size = entry
+    try:
+        actual, nbytes = file_checksum(os.path.join(root, path))
+    except OSError as err:
+        if err.errno == errno.ENOENT:
+            stats.missing += 1
+            err_msg("Missing: " + path)
+        else:
+            stats.failed += 1
+            err_msg("Unable to read " + path + ": " + str(err))
+        return 0
+    stats.checked += 1
+    stats.nbytes += nbytes
+    if nbytes != size or actual != checksum:
+        stats.mismatched += 1
+        err_msg("Checksum mismatch: " + path)
+    return nbytes
+
+
+def verify_checksums(root, entries, nworkers=1, err_msg=None,
+                     abort_check=None, progress=None):
+    """Hash the files listed by the (path, checksum, size) records of
+       entries, relative to root, with nworkers threads, and compare
+       them with the records.  Every mismatched, missing or unreadable
+       file is reported to err_msg.  Verification stops early once
+       abort_check returns True.  progress, if given, is called with
+       the number of files and bytes checked as they are.
+       Returns a VerifyStats with the counts of the files checked,
+       mismatched, missing and failed.
+       """
+    err_msg = err_msg or (lambda msg: None)
+    abort_check = abort_check or (lambda: False)
+    entry_queue = queue.Queue(QUEUE_DEPTH)
+
+    def worker(stats):
+        """Worker thread: verify the records taken from the queue"""
+        while True:
+            entry = entry_queue.get()
+            if entry is None:
+                return
+            if abort_check():
+                continue
+            nbytes = _verify_entry(root, entry, stats, err_msg)
+            if progress is not None:
+                progress(1, nbytes)
+
+    workers = []
+    for i in range(max(1, int(nworkers))):
+        stats = VerifyStats()
+        thr = threading.Thread(target=worker, args=(stats,))
+        thr.daemon = True
+        workers.append((thr, stats))
+        thr.start()
+    total = VerifyStats()
+    try:
+        for entry in entries:
+            if abort_check():
+                break
+            entry_queue.put(entry)
+    finally:
+        for thr, stats in workers:
+            entry_queue.put(None)
+        for thr, stats in workers:
+            thr.join()
+            total.add(stats)
+    return total
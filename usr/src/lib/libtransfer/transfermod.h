@@ -71,11 +71,38 @@ extern "C" {
 #define	TM_IPS_PROP_NAME		"TM_IPS_PROP_NAME"
 #define	TM_IPS_PROP_VALUE		"TM_IPS_PROP_VALUE"
 #define	TM_IPS_VERBOSE_MODE		"TM_IPS_VERBOSE_MODE"
+#define	TM_CPIO_ENGINE			"TM_CPIO_ENGINE"
+#define	TM_CPIO_ENGINE_CPIO		"cpio"
+#define	TM_CPIO_ENGINE_NATIVE		"native"
+#define	TM_CPIO_WORKERS			"TM_CPIO_WORKERS"
+#define	TM_CPIO_MANIFEST		"TM_CPIO_MANIFEST"
+#define	TM_CPIO_DEDUP			"TM_CPIO_DEDUP"
+#define	TM_CPIO_PLAN_FILE		"TM_CPIO_PLAN_FILE"
+#define	TM_CPIO_ORDER			"TM_CPIO_ORDER"
+#define	TM_CPIO_ORDER_INODE		"inode"
+#define	TM_CPIO_ORDER_PATH		"path"
+#define	TM_CPIO_ORDER_SIZE		"size"
+#define	TM_CPIO_ORDER_DIRECTORY		"directory"
+#define	TM_CPIO_ORDER_SORT_FILE		"sortfile"
+#define	TM_CPIO_SORT_FILE		"TM_CPIO_SORT_FILE"
+#define	TM_CPIO_PIPELINE_DEPTH		"TM_CPIO_PIPELINE_DEPTH"
+#define	TM_CPIO_CHECKSUMS		"TM_CPIO_CHECKSUMS"
+#define	TM_CPIO_CHECKSUM_FILE		"TM_CPIO_CHECKSUM_FILE"
+#define	TM_IPS_PUBLISHER_SPEC		"TM_IPS_PUBLISHER_SPEC"
+#define	TM_IPS_PUBLISHER_RESULTS	"TM_IPS_PUBLISHER_RESULTS"
+#define	TM_IPS_CATALOG_CACHE		"TM_IPS_CATALOG_CACHE"
+#define	TM_IPS_RETRY_ATTEMPTS		"TM_IPS_RETRY_ATTEMPTS"
+#define	TM_IPS_RETRY_LOG		"TM_IPS_RETRY_LOG"
+#define	TM_IPS_INSTALL_BATCH		"TM_IPS_INSTALL_BATCH"
+#define	TM_METRICS_FILE			"TM_METRICS_FILE"
 
 #define	TM_PERFORM_CPIO		0
 #define	TM_PERFORM_IPS		1
 #define	TM_CPIO_ENTIRE		0
 #define	TM_CPIO_LIST		1
+#define	TM_CPIO_INCREMENTAL	2
+#define	TM_CPIO_PLAN		3
+#define	TM_CPIO_VERIFY		4
 #define	TM_IPS_INIT		0
 #define	TM_IPS_REPO_CONTENTS_VERIFY	1
 #define	TM_IPS_RETRIEVE		2
@@ -85,6 +112,7 @@ extern "C" {
 #define	TM_IPS_PURGE_HIST	6
 #define	TM_IPS_UNINSTALL	7
 #define	TM_IPS_SET_PROP		8
+#define	TM_IPS_SET_PUBLISHERS	9
 
 typedef enum {
 	TM_E_SUCCESS = 0,		/* command succeeded */
@@ -109,7 +137,8 @@ typedef enum {
 	TM_E_IPS_SET_AUTH_FAILED,	/* ips set-auth failed */
 	TM_E_IPS_UNSET_AUTH_FAILED,	/* ips unset-auth failed */
 	TM_E_IPS_SET_PROP_FAILED,	/* ips set-property failed */
-	TM_E_PYTHON_ERROR		/* General Python error */
+	TM_E_PYTHON_ERROR,		/* General Python error */
+	TM_E_CPIO_VERIFY_FAILED		/* cpio verification failed */
 } tm_errno_t;
 
 typedef void (*tm_callback_t)(const int percentage,